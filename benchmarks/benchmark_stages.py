@@ -0,0 +1,192 @@
+#!/usr/bin/env python
+# `benchmark_stages.py`
+####-----
+'''
+Benchmarks for `improved_Fasta2Structure.py` on synthetic data big enough to
+show how it scales, because the example datasets are too small for that.
+
+It makes a set of aligned FASTA files, one per locus, with the number of
+samples, alignment length, density of variable sites, rate of gaps & `?`,
+number of loci & the fraction of individuals missing from each locus all set
+by the options. Then it runs the conversion on them one stage at a time and
+reports the time & peak memory of each stage:
+
+parse               reading the FASTA files into matrices of bases
+collapse_haplotypes collapsing records with identical sequences into one
+get_variable_sites  finding the variable sites of each locus
+encode              turning the bases of the variable sites into codes
+pad                 gathering the loci into the table of genotypes, which is
+                    where individuals missing from loci get sorted out
+write               making the text of the rows, with the padding, and
+                    writing the STRUCTURE file
+
+Peak memory is what `tracemalloc` sees allocated by Python & NumPy during the
+stage, over what was allocated when the stage started.
+
+Use `--results` to add the results, along with the settings used, as a line of
+JSON to a file so runs can be compared over time.
+
+Run like:
+python benchmarks/benchmark_stages.py --samples 2000 --length 20000 --loci 20
+'''
+####-----
+import sys
+import os
+import time
+import json
+import argparse
+import tempfile
+import tracemalloc
+import numpy as np
+
+# make the script importable when run from the repo root or from here
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from improved_Fasta2Structure import (read_fasta_alignment, collapse_haplotypes, get_variable_sites_numpy,
+                                      encode_variable_sites, make_genotype_table, add_locus, write_structure_file)
+
+stages = ('parse', 'collapse_haplotypes', 'get_variable_sites', 'encode', 'pad', 'write')
+
+
+
+###---------------------------HELPER FUNCTIONS-------------------------------###
+
+def generate_synthetic_alignments(output_dir, samples=100, length=1000, variable_site_density=0.05, gap_rate=0.01,
+                                  loci=3, missing_fraction=0.0, line_width=60, seed=0, haplotypes=None):
+    '''
+    Writes `loci` aligned FASTA files to `output_dir` and returns the list of
+    their paths.
+
+    Each locus starts as a random sequence of `length` bases shared by all the
+    samples. About `variable_site_density` of the sites then get a random base
+    for each sample, and about `gap_rate` of all the bases get changed to a gap
+    or a `?`. About `missing_fraction` of the samples are left out of each
+    locus. The sequences are wrapped at `line_width` like most FASTA files.
+    `seed` makes the same data get made each time. If `haplotypes` is given,
+    that many distinct sequences get made this way for each locus and each
+    sample gets one of them at random, like with real population samples.
+    '''
+    rng = np.random.default_rng(seed)
+    bases = np.frombuffer(b"ATCG", dtype=np.uint8)
+    missing_data = np.frombuffer(b"-?", dtype=np.uint8)
+    sample_ids = [f"sample{i + 1}" for i in range(samples)]
+    filepaths = []
+    for locus_number in range(loci):
+        distinct = haplotypes or samples
+        matrix = np.tile(rng.choice(bases, size=length), (distinct, 1))
+        variable_columns = np.flatnonzero(rng.random(length) < variable_site_density)
+        matrix[:, variable_columns] = rng.choice(bases, size=(distinct, len(variable_columns)))
+        gaps = rng.random((distinct, length)) < gap_rate
+        matrix[gaps] = rng.choice(missing_data, size=int(gaps.sum()))
+        if haplotypes:
+            matrix = matrix[rng.integers(haplotypes, size=samples)]
+        kept = np.flatnonzero(rng.random(samples) >= missing_fraction)
+        filepath = os.path.join(output_dir, f"locus{locus_number + 1}.fas")
+        with open(filepath, "w") as fasta_file:
+            for row in kept:
+                sequence = matrix[row].tobytes().decode("ascii")
+                fasta_file.write(f">{sample_ids[row]}\n")
+                fasta_file.write("\n".join(sequence[start:start + line_width]
+                                           for start in range(0, length, line_width)) + "\n")
+        filepaths.append(filepath)
+    return filepaths
+
+
+def run_stage(stage_results, stage, function, *args):
+    '''
+    Runs `function(*args)`, adding the time it takes & the peak memory above
+    what was allocated when it started to the totals for `stage`. Returns what
+    `function` returns.
+    '''
+    allocated_at_start = tracemalloc.get_traced_memory()[0]
+    tracemalloc.reset_peak()
+    start = time.perf_counter()
+    result = function(*args)
+    stage_results[stage]['seconds'] += time.perf_counter() - start
+    stage_results[stage]['peak_bytes'] = max(stage_results[stage]['peak_bytes'],
+                                             tracemalloc.get_traced_memory()[1] - allocated_at_start)
+    return result
+
+
+def benchmark_stages(filepaths, output_filename, spacing="legacy", threads=1):
+    '''
+    Converts the FASTA files at `filepaths` to the STRUCTURE file
+    `output_filename` the way `improved_Fasta2Structure.py` does with the
+    'numpy' engine & 'native' reader, but a stage at a time, using `threads`
+    threads within each file like `--threads`. Returns a dictionary with the
+    seconds & peak bytes of memory for each stage.
+    '''
+    stage_results = {stage: {'seconds': 0.0, 'peak_bytes': 0} for stage in stages}
+    genotypes = make_genotype_table()
+    tracemalloc.start()
+    try:
+        for filepath in filepaths:
+            record_ids, matrix = run_stage(stage_results, 'parse', read_fasta_alignment, filepath)
+            haplotypes, haplotype_of_record = run_stage(stage_results, 'collapse_haplotypes', collapse_haplotypes, matrix,
+                                                        threads)
+            del matrix
+            variable_sites = run_stage(stage_results, 'get_variable_sites', get_variable_sites_numpy, haplotypes, 1024,
+                                       threads)
+            codes = run_stage(stage_results, 'encode',
+                              lambda: encode_variable_sites(haplotypes, variable_sites, threads)[haplotype_of_record])
+            del haplotypes
+            run_stage(stage_results, 'pad', add_locus, genotypes, filepath, (record_ids, codes, variable_sites))
+        run_stage(stage_results, 'write', write_structure_file, output_filename, genotypes, spacing)
+    finally:
+        tracemalloc.stop()
+    return stage_results
+
+
+def format_stage_results(stage_results):
+    '''
+    Returns the results from `benchmark_stages()` as a table to print.
+    '''
+    lines = [f"{'stage':<20}{'seconds':>12}{'peak MiB':>12}"]
+    for stage, result in stage_results.items():
+        lines.append(f"{stage:<20}{result['seconds']:>12.3f}{result['peak_bytes'] / 1024 ** 2:>12.1f}")
+    lines.append(f"{'total':<20}{sum(result['seconds'] for result in stage_results.values()):>12.3f}")
+    return "\n".join(lines)
+
+###--------------------------END OF HELPER FUNCTIONS--------------------------###
+
+
+
+parser = argparse.ArgumentParser(prog='benchmark_stages.py',
+    description="Times each stage of `improved_Fasta2Structure.py` & records its peak memory, on synthetic aligned FASTA files.")
+parser.add_argument("--samples", type=int, default=500, help="Number of samples (individuals).")
+parser.add_argument("--length", type=int, default=5000, help="Length of each alignment.")
+parser.add_argument("--variable-site-density", type=float, default=0.05, help="Fraction of sites that are made variable.")
+parser.add_argument("--gap-rate", type=float, default=0.01, help="Fraction of bases changed to a gap or `?`.")
+parser.add_argument("--loci", type=int, default=5, help="Number of loci (FASTA files).")
+parser.add_argument("--missing-fraction", type=float, default=0.1, help="Fraction of individuals left out of each locus.")
+parser.add_argument("--haplotypes", type=int, help="Number of distinct sequences per locus the samples are drawn \
+    from. By default every sample gets its own.")
+parser.add_argument("--seed", type=int, default=0, help="Seed for making the synthetic data.")
+parser.add_argument("--spacing", choices=('legacy', 'compact'), default="legacy", help="Spacing of the output to write.")
+parser.add_argument("--threads", type=int, default=1, help="Number of threads to use within each locus.")
+parser.add_argument("--results", help="File to add the results to, as a line of JSON.")
+
+
+def main(args=None):
+    args = parser.parse_args(args)
+    settings = {name: getattr(args, name) for name in ('samples', 'length', 'variable_site_density', 'gap_rate',
+                                                        'loci', 'missing_fraction', 'haplotypes', 'seed', 'spacing',
+                                                        'threads')}
+    with tempfile.TemporaryDirectory() as working_dir:
+        filepaths = generate_synthetic_alignments(working_dir, samples=args.samples, length=args.length,
+                                                  variable_site_density=args.variable_site_density,
+                                                  gap_rate=args.gap_rate, loci=args.loci,
+                                                  missing_fraction=args.missing_fraction, seed=args.seed,
+                                                  haplotypes=args.haplotypes)
+        input_bytes = sum(os.path.getsize(filepath) for filepath in filepaths)
+        stage_results = benchmark_stages(filepaths, os.path.join(working_dir, "Structure.str"), args.spacing, args.threads)
+    print(f"{args.loci} loci of {args.samples} samples x {args.length} sites ({input_bytes / 1024 ** 2:.1f} MiB of FASTA)")
+    print(format_stage_results(stage_results))
+    if args.results:
+        with open(args.results, "a") as results_file:
+            results_file.write(json.dumps({'time': time.strftime("%Y-%m-%dT%H:%M:%S"), 'settings': settings,
+                                           'input_bytes': input_bytes, 'stages': stage_results}) + "\n")
+    return stage_results
+
+
+if __name__ == "__main__":
+    main()
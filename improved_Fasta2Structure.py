@@ -12,18 +12,25 @@ Otherwise, it runs the existing non-GUI code to process the provided FASTA files
 
 ##########################################################################################
 ###------------ Top of improved mainly comes from start and functions defined in unimproved
+# Tkinter, Biopython & the process pool are only imported on the code paths that
+# need them, so a run with arguments (such as from a workflow calling the script
+# thousands of times) doesn't pay to load the GUI or probe for a display.
 import sys
-import tkinter as tk
-from tkinter import ttk
-from tkinter import filedialog
-from tkinter.scrolledtext import ScrolledText
-from Bio import AlignIO
+import numpy as np
 import os
+import mmap
+import hashlib
 import threading
+from itertools import repeat
 import traceback
 import logging
-
-logging.basicConfig(filename='log.log', filemode='w', format='%(name)s - %(levelname)s - %(message)s', level=logging.INFO)
+import time
+import json
+import contextlib
+try:
+    import resource
+except ImportError: # not available on Windows, where peak RSS just won't be reported
+    resource = None
 
 
 def convert_to_binary(sequence):
@@ -31,6 +38,69 @@ def convert_to_binary(sequence):
     return ' '.join([binary_mapping.get(base, '-9') for base in sequence])
 
 
+# STRUCTURE codes the bases get converted to. Gaps and `?` get the missing data
+# code. Anything else is written as missing data too, but is kept apart with a
+# code of its own because `convert_to_binary()` doesn't put a space after those
+# and the 'legacy' spacing has to match that exactly.
+base_codes = {'A': 0, 'T': 1, 'C': 2, 'G': 3, '-': -9, '?': -9}
+unrecognized_base_code = -10
+encoding_lookup_table = np.full(256, unrecognized_base_code, dtype=np.int8)
+encoding_lookup_table[[ord(base) for base in base_codes]] = list(base_codes.values())
+# What gets written for each code, indexed by the code plus `code_offset`. The
+# 'legacy' tokens are what `convert_to_binary()` gives & 'compact' ones are for
+# single spaces between all the genotype calls.
+# The codes from -8 to -5 never come from a base; they are used when the rows
+# are put together to stand for the padding of individuals missing from a
+# locus, which is '-9' separated by single spaces with a space after the last
+# one, & for the loci without variable sites, which are an empty segment of
+# the row (or a space, if the individual is missing from that locus too).
+code_offset = -unrecognized_base_code
+missing_individual_code = -8
+missing_individual_last_code = -7
+empty_locus_code = -6
+empty_locus_missing_individual_code = -5
+genotype_tokens = {
+    'legacy': np.array(['-9', '-9 ', '-9', '-9 ', '', ' '] + [''] * 4 + ['0 ', '1 ', '2 ', '3 '], dtype=object),
+    'compact': np.array(['-9'] * 4 + [''] * 6 + ['0', '1', '2', '3'], dtype=object),
+}
+spacing_modes = tuple(genotype_tokens)
+# The same tokens each with the space that comes after it in a row, as bytes
+# padded out with zero bytes to the same width, so a whole block of rows can
+# be turned into text at once by dropping the zero bytes.
+genotype_token_bytes = {spacing: np.array([(token + ' ').encode('ascii') for token in tokens], dtype='S4')
+                        for spacing, tokens in genotype_tokens.items()}
+
+
+def encode_sequences(sequences):
+    '''
+    Takes a sequence as a string or bytes, or a whole 2-D matrix of bases like
+    `alignment_to_matrix()` makes, and returns the STRUCTURE codes for all the
+    bases at once as an array of 8-bit integers with the same shape, using the
+    256-entry lookup table instead of going base by base.
+    '''
+    if isinstance(sequences, str):
+        sequences = sequences.encode('latin-1')
+    if isinstance(sequences, (bytes, bytearray)):
+        sequences = np.frombuffer(sequences, dtype=np.uint8)
+    return encoding_lookup_table[sequences]
+
+
+def format_genotypes(codes, spacing="legacy"):
+    '''
+    Takes one row of codes from `encode_sequences()` and returns the text for
+    it. With 'legacy' spacing the text is exactly what `convert_to_binary()`
+    gives (two spaces after each base and one after the missing data codes) so
+    `Structure.str` files still match; 'compact' puts a single space between
+    every genotype call.
+
+    The script itself no longer writes rows this way (see
+    `fill_genotype_block()`, which does whole blocks of rows at once); this is
+    kept as the plain reference for what one locus of a row should be, which
+    the tests check the faster writing against.
+    '''
+    return ' '.join(genotype_tokens[spacing][codes.astype(np.intp) + code_offset].tolist())
+
+
 def get_variable_sites(alignment):
     variable_sites = []
     for i in range(alignment.get_alignment_length()):
@@ -40,51 +110,1698 @@ def get_variable_sites(alignment):
     return variable_sites
 
 
-def process_fasta_file(filepath, sequence_dict, file_index, progress_callback):
+def alignment_to_matrix(alignment):
+    '''
+    Takes an alignment read in by Biopython and returns a 2-D NumPy array of
+    unsigned bytes holding the bases, with one row per record and one column
+    per site of the alignment. That way the alignment only gets turned into
+    something the vectorized engine can act on once.
+    '''
+    return np.frombuffer(b''.join([bytes(record.seq) for record in alignment]),
+                         dtype=np.uint8).reshape(len(alignment), alignment.get_alignment_length())
+
+
+def map_in_threads(function, items, threads=1):
+    '''
+    Returns `list(map(function, items))`, with the calls spread over `threads`
+    threads if that is above 1. Only worth it for functions that spend their
+    time in NumPy operations (or hashing) on big arrays, which let go of the
+    GIL while they run, so the threads really do run at the same time on one
+    big alignment.
+    '''
+    items = list(items)
+    if threads <= 1 or len(items) <= 1:
+        return list(map(function, items))
+    from concurrent.futures import ThreadPoolExecutor
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        return list(executor.map(function, items))
+
+
+def split_into_blocks(count, threads, minimum_block=1):
+    '''
+    Returns the size of the blocks to split `count` rows or columns into so
+    that `threads` threads each get a few blocks to work on, which evens out
+    blocks that take longer than others. With one thread it's all one block.
+    '''
+    if threads <= 1:
+        return max(1, count)
+    return max(1, minimum_block, -(-count // (threads * 4)))
+
+
+def get_variable_sites_numpy(matrix, rows_per_block=1024, threads=1):
+    '''
+    Vectorized version of `get_variable_sites()` that acts on the matrix made
+    by `alignment_to_matrix()`. A column is variable if any record differs from
+    the first record at that site, which is the same as the set of characters
+    in the column having more than one member. Just like the original, gaps and
+    `?` count as a state of their own. The rows are compared a block at a time
+    so the temporary comparison array stays small for alignments of many
+    thousands of samples.
+
+    With `threads` above 1 the columns are split into blocks that are checked
+    at the same time in that many threads, for single alignments too long for
+    one core, and the variable sites of the blocks are put back together in
+    order.
+
+    Returns a list of Python integers so that the log matches what the original
+    gives.
+    '''
+    if matrix.shape[0] == 0:
+        return []
+    first_record = matrix[0]
+    columns_per_block = split_into_blocks(matrix.shape[1], threads, minimum_block=64 * 1024)
+
+    def find_variable_columns(first_column):
+        columns = slice(first_column, first_column + columns_per_block)
+        variable = np.zeros(len(first_record[columns]), dtype=bool)
+        for start in range(1, matrix.shape[0], rows_per_block):
+            variable |= (matrix[start:start + rows_per_block, columns] != first_record[columns]).any(axis=0)
+        return np.flatnonzero(variable) + first_column
+
+    blocks = map_in_threads(find_variable_columns, range(0, matrix.shape[1], columns_per_block), threads)
+    return np.concatenate([np.zeros(0, dtype=np.intp)] + blocks).tolist()
+
+
+def encode_variable_sites(matrix, variable_sites, threads=1):
+    '''
+    Returns `encode_sequences(matrix[:, variable_sites])`, the codes of the
+    variable sites of every record. With `threads` above 1 the records, and
+    the sites too if there are fewer records than threads, are split into
+    blocks that are copied out & encoded at the same time in that many
+    threads, each into its own part of the result.
+    '''
+    if threads <= 1:
+        return encode_sequences(matrix[:, variable_sites])
+    variable_sites = np.asarray(variable_sites, dtype=np.intp)
+    codes = np.empty((matrix.shape[0], len(variable_sites)), dtype=np.int8)
+    rows_per_block = split_into_blocks(matrix.shape[0], threads)
+    row_blocks = range(0, matrix.shape[0], rows_per_block)
+    sites_per_block = split_into_blocks(len(variable_sites), max(1, threads // len(row_blocks)) if row_blocks else 1)
+
+    def encode_block(first):
+        rows, sites = slice(first[0], first[0] + rows_per_block), slice(first[1], first[1] + sites_per_block)
+        codes[rows, sites] = encode_sequences(matrix[rows][:, variable_sites[sites]])
+
+    map_in_threads(encode_block, [(row, site) for row in row_blocks for site in range(0, len(variable_sites), sites_per_block)],
+                   threads)
+    return codes
+
+
+def collapse_haplotypes(matrix, threads=1):
+    '''
+    Collapses the records of the matrix made by `alignment_to_matrix()` that
+    have identical sequences into one representative each. Each record is
+    hashed in place with SHA-256, so this is a single pass over the matrix
+    that doesn't copy it, and the records don't need sorting. Alignments of
+    many samples often only have a handful of distinct haplotypes, and a site
+    is variable among the distinct haplotypes exactly when it's variable among
+    all the records, so finding the variable sites & encoding can be done on
+    the representatives alone.
+
+    With `threads` above 1 blocks of records are hashed at the same time in
+    that many threads.
+
+    Returns the matrix of the representatives in the order first seen, and for
+    each record the index of its representative, so that
+    `representatives[haplotype_of_record]` gives back the whole matrix.
+    '''
+    rows_per_block = split_into_blocks(matrix.shape[0], threads)
+
+    def hash_rows(start):
+        return [hashlib.sha256(row).digest() for row in matrix[start:start + rows_per_block]]
+
+    haplotype_index = {}
+    haplotype_of_record = np.empty(matrix.shape[0], dtype=np.intp)
+    keys = (key for block in map_in_threads(hash_rows, range(0, matrix.shape[0], rows_per_block), threads) for key in block)
+    for row_index, key in enumerate(keys):
+        haplotype_of_record[row_index] = haplotype_index.setdefault(key, len(haplotype_index))
+    if len(haplotype_index) == matrix.shape[0]:
+        return matrix, haplotype_of_record
+    first_rows = np.zeros(len(haplotype_index), dtype=np.intp)
+    # assigning in reverse leaves the first record of each haplotype in place
+    first_rows[haplotype_of_record[::-1]] = np.arange(matrix.shape[0] - 1, -1, -1)
+    return matrix[first_rows], haplotype_of_record
+
+
+# Compressed files are recognized by their extension and decompressed as they
+# are read, so they never have to be decompressed to disk first. bgzip files
+# are gzip files made of many members, which `gzip` reads just the same.
+compression_extensions = {'.gz': 'gzip', '.bgz': 'gzip', '.xz': 'xz', '.zst': 'zstd'}
+compression_formats = ('gzip', 'xz', 'zstd')
+compression_format_extensions = {'gzip': '.gz', 'xz': '.xz', 'zstd': '.zst'}
+
+
+def get_compression(filepath):
+    '''
+    Returns the compression format of a file going by its extension ('gzip',
+    'xz' or 'zstd'), or None for an uncompressed file.
+    '''
+    return compression_extensions.get(os.path.splitext(str(filepath))[1].lower())
+
+
+def strip_compression_extension(filepath):
+    '''
+    Returns the path without the extension of the compression format, if it
+    has one, so 'ITS.fas.gz' gives 'ITS.fas'.
+    '''
+    filepath = str(filepath)
+    return os.path.splitext(filepath)[0] if get_compression(filepath) else filepath
+
+
+def open_compressed(filepath, mode='rb', compression=None):
+    '''
+    Opens a file in binary mode ('rb' or 'wb'), compressing or decompressing
+    it as it is written or read if `compression` is given. zstd needs the
+    optional `zstandard` package, and compresses with all the CPU cores.
+    (gzip & xz in the standard library only use one.)
+    '''
+    if compression == 'gzip':
+        import gzip
+        return gzip.open(filepath, mode)
+    if compression == 'xz':
+        import lzma
+        return lzma.open(filepath, mode)
+    if compression == 'zstd':
+        try:
+            import zstandard
+        except ImportError:
+            raise ValueError(f"The `zstandard` package is needed for zstd files like {filepath}; install it with "
+                             "`pip install zstandard`.") from None
+        if 'r' in mode:
+            return zstandard.open(filepath, 'rb')
+        return zstandard.open(filepath, 'wb', cctx=zstandard.ZstdCompressor(threads=-1))
+    return open(filepath, mode)
+
+
+def open_input(filepath):
+    '''
+    Opens a FASTA file, compressed or not, for reading in binary mode.
+    '''
+    return open_compressed(filepath, 'rb', get_compression(filepath))
+
+
+def open_text_input(filepath):
+    '''
+    Opens a FASTA file, compressed or not, for reading as text, like Biopython
+    would open it.
+    '''
+    import io
+    compression = get_compression(filepath)
+    if compression is None:
+        return open(filepath)
+    return io.TextIOWrapper(open_compressed(filepath, 'rb', compression))
+
+
+def open_output(output_filename, buffer_size=1024 * 1024, compression=None):
+    '''
+    Opens an output file for writing text, compressed if `compression` is
+    given.
+    '''
+    import io
+    if compression is None:
+        return open(output_filename, "w", buffering=buffer_size)
+    return io.TextIOWrapper(io.BufferedWriter(open_compressed(output_filename, 'wb', compression), buffer_size))
+
+
+def iterate_fasta_records(handle, block_size=8 * 1024 * 1024):
+    '''
+    Minimal FASTA parser that skips making Biopython objects for every record.
+    Reads the file opened in binary mode in large blocks & strips the line
+    endings and other whitespace out of the sequences at the level of whole
+    blocks, yielding the ID and the sequence (as bytes) of one record at a
+    time. IDs are the first word of the header line, same as `record.id` from
+    Biopython, and the same error is raised for anything before the first
+    header line.
+    '''
+    current_title = None
+    current_pieces = []
+
+    def finish_record():
+        title = current_title.decode().rstrip()
+        record = (title.split(None, 1)[0] if title else "", b''.join(current_pieces))
+        current_pieces.clear()
+        return record
+
+    pending = b'' # header line not yet read to its end
+    at_line_start = True
+    while True:
+        block = handle.read(block_size)
+        if not block:
+            break
+        # Same as reading in text mode with universal newlines, where a 
+        # `\r` by itself ends a line too. (Any `\r\n` split between blocks
+        # just makes an extra blank line.)
+        data = pending + block.replace(b'\r', b'\n')
+        pending = b''
+        position = 0
+        if not at_line_start:
+            # rest of a sequence line carried over from the last block
+            position = data.find(b'\n') + 1 or len(data)
+            current_pieces.append(data[:position].translate(None, b' \t\n'))
+        while position < len(data):
+            if data[position] == ord('>'):
+                end_of_header = data.find(b'\n', position)
+                if end_of_header == -1:
+                    pending = data[position:]
+                    break
+                if current_title is not None:
+                    yield finish_record()
+                current_title = data[position + 1:end_of_header]
+                position = end_of_header + 1
+            else:
+                if current_title is None:
+                    raise ValueError("This FASTA file contains comments at the beginning of the file, which are not allowed by the 'fasta' parser.")
+                next_header = data.find(b'\n>', position)
+                end_of_piece = len(data) if next_header == -1 else next_header + 1
+                current_pieces.append(data[position:end_of_piece].translate(None, b' \t\n'))
+                position = end_of_piece
+        at_line_start = bool(pending) or data.endswith(b'\n')
+    if pending:
+        if current_title is not None:
+            yield finish_record()
+        current_title = pending[1:]
+    if current_title is not None:
+        yield finish_record()
+
+
+def read_fasta_alignment(filepath, block_size=8 * 1024 * 1024):
+    '''
+    Reads a FASTA alignment with `iterate_fasta_records()` straight into a
+    matrix of unsigned bytes like `alignment_to_matrix()` makes, one row per
+    record.
+
+    Returns the list of record IDs and the matrix. The same errors Biopython
+    gives are raised for sequences of different lengths and for empty files.
+    '''
+    record_ids = []
+    matrix = None
+    file_size = os.path.getsize(filepath)
+    with open_input(filepath) as handle:
+        for record_id, sequence in iterate_fasta_records(handle, block_size):
+            if matrix is None:
+                # Each record takes up at least its length in bytes of the file, 
+                # so the file size gives the most rows there can be (unless
+                # the file is compressed, in which case the matrix grows).
+                capacity = file_size // max(1, len(sequence)) + 1
+                matrix = np.empty((capacity, len(sequence)), dtype=np.uint8)
+            elif len(sequence) != matrix.shape[1]:
+                raise ValueError("Sequences must all be the same length")
+            if len(record_ids) == matrix.shape[0]:
+                matrix = np.concatenate((matrix, np.empty_like(matrix)))
+            matrix[len(record_ids)] = np.frombuffer(sequence, dtype=np.uint8)
+            record_ids.append(record_id)
+
+    if not record_ids:
+        raise ValueError("No records found in handle")
+    return record_ids, matrix[:len(record_ids)]
+
+
+def read_locus_streaming(filepath, block_size=8 * 1024 * 1024):
+    '''
+    Like `read_locus()` with the 'numpy' engine but for alignments of so many
+    samples they don't fit in memory. Reads the file twice, one record at a
+    time. The first pass only keeps the first record's base at each site and
+    whether each site is variable yet (two bytes per site), and the second
+    pass copies out & encodes only the variable sites of each record. So the
+    memory used is bounded by the alignment length & the encoded variable
+    sites, and not by the number of samples times the length. Records with
+    the same sequence as an earlier one are recognized by the hash of their
+    sequence, so only distinct haplotypes get compared in the first pass and
+    encoded in the second, and the rest reuse their encoded row.
+
+    Returns the same as `read_locus()`.
+    '''
+    record_ids = []
+    haplotype_of_record = []
+    haplotype_index = {}
+    first_seen = variable = None
+    with open_input(filepath) as handle:
+        for record_id, sequence in iterate_fasta_records(handle, block_size):
+            record_ids.append(record_id)
+            key = hashlib.sha256(sequence).digest()
+            if key in haplotype_index:
+                haplotype_of_record.append(haplotype_index[key])
+                continue
+            haplotype_of_record.append(haplotype_index.setdefault(key, len(haplotype_index)))
+            row = np.frombuffer(sequence, dtype=np.uint8)
+            if first_seen is None:
+                first_seen = row
+                variable = np.zeros(len(row), dtype=bool)
+            elif len(row) != len(first_seen):
+                raise ValueError("Sequences must all be the same length")
+            else:
+                variable |= row != first_seen
+    if not record_ids:
+        raise ValueError("No records found in handle")
+    variable_sites = np.flatnonzero(variable)
+
+    haplotype_codes = np.empty((len(haplotype_index), len(variable_sites)), dtype=np.int8)
+    encoded = 0
+    with open_input(filepath) as handle:
+        for row_index, (record_id, sequence) in enumerate(iterate_fasta_records(handle, block_size)):
+            # haplotypes are numbered in the order first seen, so the next
+            # one not yet encoded is always the one to look out for
+            if haplotype_of_record[row_index] == encoded:
+                haplotype_codes[encoded] = encode_sequences(np.frombuffer(sequence, dtype=np.uint8)[variable_sites])
+                encoded += 1
+                if encoded == len(haplotype_codes):
+                    break
+    codes = haplotype_codes[np.array(haplotype_of_record, dtype=np.intp)]
+    return record_ids, codes, variable_sites.tolist()
+
+
+# bytes that Biopython strips out of sequences; finding any of these inside the
+# lines of a memory-mapped file means the bases can't be found by offsets alone
+whitespace_lookup_table = np.zeros(256, dtype=bool)
+whitespace_lookup_table[list(b' \t\r\n')] = True
+
+
+def index_memory_mapped_fasta(mapped, buffer):
+    '''
+    Goes through the memory-mapped FASTA file once to get the record IDs,
+    where the sequence of each record starts, the length of the sequences, the
+    line width and how many bytes end each line (2 for `\r\n`). Every record
+    has to be wrapped at the same width as the first one for the position of
+    any base to be calculated from those; if that isn't so, or there are
+    blank lines among or after the sequence lines, returns None. Records that
+    seem to be of different lengths also give None, as that can come from
+    lines laid out in a way not checked for here, so the 'native' reader gets
+    to decide if the file is really ragged.
+    '''
+    if mapped[0:1] != b'>':
+        raise ValueError("This FASTA file contains comments at the beginning of the file, which are not allowed by the 'fasta' parser.")
+    record_ids = []
+    sequence_starts = []
+    sequence_length = None
+    line_width = newline_length = None
+    size = len(mapped)
+    start = 0
+    while start < size:
+        header_end = mapped.find(b'\n', start)
+        if header_end == -1:
+            header_end = size
+        title = mapped[start + 1:header_end].decode().rstrip()
+        if '\r' in title:
+            return None # lone `\r` line endings
+        record_ids.append(title.split(None, 1)[0] if title else "")
+        sequence_start = header_end + 1
+        next_header = mapped.find(b'\n>', header_end)
+        end = size if next_header == -1 else next_header + 1
+        region_length = max(0, end - sequence_start)
+
+        if line_width is None and region_length:
+            first_newline = mapped.find(b'\n', sequence_start, end)
+            if first_newline == -1:
+                line_width, newline_length = region_length, 1
+            elif first_newline > sequence_start and mapped[first_newline - 1] == ord('\r'):
+                line_width, newline_length = first_newline - sequence_start - 1, 2
+            else:
+                line_width, newline_length = first_newline - sequence_start, 1
+            if line_width == 0:
+                return None # blank line
+        # Work out the length of the sequence from the space it takes up in 
+        # the file & then check the line endings are all where they should be.
+        length = 0
+        if region_length:
+            terminated = mapped[end - 1] == ord('\n')
+            body_length = region_length - newline_length if terminated else region_length
+            full_lines, last_line_width = divmod(body_length, line_width + newline_length)
+            if body_length < 0 or last_line_width > line_width or (last_line_width == 0 and full_lines):
+                return None
+            length = full_lines * line_width + last_line_width
+            newline_positions = sequence_start + line_width + np.arange(full_lines) * (line_width + newline_length)
+            # the last line has to hold bases only, so a blank line after it
+            # isn't taken for part of it
+            last_line_start = sequence_start + full_lines * (line_width + newline_length)
+            if (mapped.find(b'\n', last_line_start, last_line_start + last_line_width) != -1
+                    or mapped.find(b'\r', last_line_start, last_line_start + last_line_width) != -1):
+                return None
+            if terminated:
+                newline_positions = np.append(newline_positions, end - newline_length)
+            if newline_length == 2:
+                if not ((buffer[newline_positions] == ord('\r')).all() and (buffer[newline_positions + 1] == ord('\n')).all()):
+                    return None
+            elif not (buffer[newline_positions] == ord('\n')).all():
+                return None
+        if sequence_length is None:
+            sequence_length = length
+        elif length != sequence_length:
+            return None
+        sequence_starts.append(sequence_start)
+        start = end
+    return record_ids, np.array(sequence_starts, dtype=np.int64), sequence_length, line_width or 1, newline_length or 1
+
+
+def read_locus_memory_mapped(filepath, columns_per_block=1024 * 1024, bytes_per_tile=4 * 1024 * 1024, threads=1):
+    '''
+    Like `read_locus()` with the 'numpy' engine but for very large files. The
+    file is memory-mapped instead of read in, the record starts & line width
+    are indexed once, and the bases of any site are then read straight from the
+    mapped file by computing their byte offsets. The variable sites are found
+    a tile of records & columns at a time, and then only the variable-site
+    columns get copied out and encoded, so the memory used is proportional to
+    the number of variable sites and not to the size of the file. With
+    `threads` above 1, blocks of columns are checked, and then tiles of
+    records encoded, at the same time in that many threads.
+
+    Returns the same as `read_locus()`, or None if the file isn't laid out
+    regularly enough (different line widths among records, spaces or blank
+    lines in the sequences) for offsets to work, or is compressed, so that
+    another reader can be used instead.
+    '''
+    if get_compression(filepath):
+        return None
+    with open(filepath, 'rb') as handle:
+        if os.fstat(handle.fileno()).st_size == 0:
+            raise ValueError("No records found in handle")
+        error = None
+        with mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            buffer = np.frombuffer(mapped, dtype=np.uint8)
+            try:
+                layout = index_memory_mapped_fasta(mapped, buffer)
+                if layout is None:
+                    return None
+                record_ids, sequence_starts, sequence_length, line_width, newline_length = layout
+
+                def offsets_of(columns):
+                    return columns + (columns // line_width) * (newline_length)
+
+                if threads > 1:
+                    # enough blocks of columns for all the threads to have some
+                    columns_per_block = min(columns_per_block, split_into_blocks(sequence_length, threads, 64 * 1024))
+
+                def find_variable_columns(first_column):
+                    offsets = offsets_of(np.arange(first_column, min(first_column + columns_per_block, sequence_length)))
+                    first_record = buffer[sequence_starts[0] + offsets]
+                    variable = np.zeros(len(offsets), dtype=bool)
+                    rows_per_tile = max(1, bytes_per_tile // len(offsets))
+                    for first_row in range(0, len(sequence_starts), rows_per_tile):
+                        tile = buffer[sequence_starts[first_row:first_row + rows_per_tile, None] + offsets]
+                        if whitespace_lookup_table[tile].any():
+                            return None
+                        variable |= (tile != first_record).any(axis=0)
+                    return np.flatnonzero(variable) + first_column
+
+                blocks = map_in_threads(find_variable_columns, range(0, sequence_length, columns_per_block), threads)
+                if any(block is None for block in blocks):
+                    return None
+                variable_sites = np.concatenate([np.zeros(0, dtype=np.int64)] + blocks).tolist()
+
+                variable_offsets = offsets_of(np.array(variable_sites, dtype=np.int64))
+                codes = np.empty((len(sequence_starts), len(variable_sites)), dtype=np.int8)
+                rows_per_tile = max(1, bytes_per_tile // max(1, len(variable_sites)))
+
+                def encode_tile(first_row):
+                    codes[first_row:first_row + rows_per_tile] = encode_sequences(
+                        buffer[sequence_starts[first_row:first_row + rows_per_tile, None] + variable_offsets])
+
+                map_in_threads(encode_tile, range(0, len(sequence_starts), rows_per_tile), threads)
+            except Exception as e:
+                # The traceback keeps views of the mapping alive, so hold on to 
+                # the error without it until the mapping is closed.
+                error = e.with_traceback(None)
+            finally:
+                # the mapping can't be closed while any view of it is left
+                del buffer
+        if error is not None:
+            raise error
+    return record_ids, codes, variable_sites
+
+
+# Bump this if what gets stored in the cache of loci changes, so older entries
+# stop matching.
+locus_cache_format_version = b"1"
+
+
+def make_locus_cache_key(filepath, chunk_size=1024 * 1024):
+    '''
+    Returns the key for a FASTA file in the cache of loci, a hash of the
+    contents of the file together with the encoding used for the bases. So an
+    edited file or different encoding gets a new entry, while a renamed or
+    moved file keeps its old one.
+    '''
+    file_hash = hashlib.sha256(locus_cache_format_version + encoding_lookup_table.tobytes())
+    with open(filepath, 'rb') as handle:
+        for chunk in iter(lambda: handle.read(chunk_size), b''):
+            file_hash.update(chunk)
+    return file_hash.hexdigest()
+
+
+def load_cached_locus(cache_path):
+    '''
+    Returns the locus stored at `cache_path` in the same form `read_locus()`
+    gives, or None if it isn't there or can't be read. Marks the entry as
+    recently used so it is the last to be evicted.
+    '''
+    try:
+        with np.load(cache_path) as cached:
+            locus = (cached['record_ids'].tolist(), cached['codes'], cached['variable_sites'].tolist())
+    except (OSError, ValueError, KeyError):
+        return None
+    os.utime(cache_path)
+    return locus
+
+
+def store_cached_locus(cache_path, locus):
+    '''
+    Saves what `read_locus()` gave for a file to `cache_path`. Written to a
+    temporary file first & then moved into place so other processes using
+    the same cache never see a partly written entry.
+    '''
+    record_ids, codes, variable_sites = locus
+    os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+    temporary_path = f"{cache_path}.{os.getpid()}.tmp"
+    with open(temporary_path, 'wb') as handle:
+        np.savez(handle, record_ids=np.array(record_ids, dtype=str), codes=codes,
+                 variable_sites=np.array(variable_sites, dtype=np.int64))
+    os.replace(temporary_path, cache_path)
+
+
+def trim_locus_cache(cache_dir, max_bytes):
+    '''
+    Deletes the least recently used entries in the cache of loci until what is
+    left takes up no more than `max_bytes`.
+    '''
+    if not os.path.isdir(cache_dir):
+        return
+    entries = []
+    for entry in os.scandir(cache_dir):
+        if entry.name.endswith('.npz') and entry.is_file():
+            stat = entry.stat()
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+    total_bytes = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total_bytes <= max_bytes:
+            break
+        os.remove(path)
+        total_bytes -= size
+
+
+# Loci kept in memory by a long-running service (see `serve()`), under the same
+# keys as in the cache of loci on disk, with the most recently used last. Each
+# worker process of the service has one of its own.
+locus_memory_cache = {'max_bytes': 0, 'bytes': 0, 'loci': {}}
+
+
+def configure_locus_memory_cache(max_bytes):
+    '''
+    Sets how many bytes of loci `read_locus_remembered()` keeps in memory, and
+    empties what it kept. 0 (the default) keeps none.
+    '''
+    locus_memory_cache.update(max_bytes=max_bytes, bytes=0, loci={})
+
+
+def get_locus_size(locus):
+    '''
+    Returns roughly how many bytes of memory the locus `read_locus()` gave
+    takes up.
+    '''
+    record_ids, codes, variable_sites = locus
+    return codes.nbytes + sum(len(record_id) for record_id in record_ids) + 8 * len(variable_sites)
+
+
+def read_locus_remembered(filepath, engine="numpy", reader="native", cache_dir=None, stages=None, locus_dir=None, threads=1):
+    '''
+    Like `read_locus()`, but if `configure_locus_memory_cache()` has been used
+    the locus is looked for in memory first, by a hash of the file contents,
+    and kept there if it had to be read. The least recently used loci are
+    dropped to keep under the size set. Locus files & loci being saved to
+    `locus_dir` always go straight to `read_locus()`.
+    '''
+    if (not locus_memory_cache['max_bytes'] or locus_dir is not None
+            or str(filepath).endswith(locus_file_extension)):
+        return read_locus(filepath, engine, reader, cache_dir, stages=stages, locus_dir=locus_dir, threads=threads)
+    with profile_stage(stages, 'cache_lookup'):
+        key = make_locus_cache_key(filepath)
+        locus = locus_memory_cache['loci'].pop(key, None)
+    if locus is None:
+        locus = read_locus(filepath, engine, reader, cache_dir, stages=stages, threads=threads)
+        locus_memory_cache['bytes'] += get_locus_size(locus)
+    locus_memory_cache['loci'][key] = locus
+    while locus_memory_cache['bytes'] > locus_memory_cache['max_bytes']:
+        oldest_key = next(iter(locus_memory_cache['loci']))
+        locus_memory_cache['bytes'] -= get_locus_size(locus_memory_cache['loci'].pop(oldest_key))
+    return locus
+
+
+locus_file_extension = ".f2sl"
+locus_file_magic = b"F2SLOCUS"
+locus_file_format_version = 1
+locus_file_alignment = 64
+
+
+def hash_file_contents(filepath, chunk_size=1024 * 1024):
+    '''
+    Returns the SHA-256 hash of the contents of the file at `filepath` as text.
+    '''
+    file_hash = hashlib.sha256()
+    with open(filepath, 'rb') as handle:
+        for chunk in iter(lambda: handle.read(chunk_size), b''):
+            file_hash.update(chunk)
+    return file_hash.hexdigest()
+
+
+def write_locus_file(locus_path, locus, source=None):
+    '''
+    Saves what `read_locus()` gave for a file as a locus file, a compact
+    binary form of the locus that can be converted again later without
+    reading the FASTA file. The file starts with `locus_file_magic`, the
+    format version & the length of a JSON header (as little-endian 32-bit
+    integers), then the header itself, holding the record IDs, the counts, the
+    FASTA file it came from & the SHA-256 hash of that file. After that come
+    the positions of the variable sites in the alignment (64-bit integers) and
+    then the matrix of codes (8-bit integers, one row per record). The arrays
+    start on 64-byte boundaries so they can be memory-mapped in place by
+    `read_locus_file()`.
+    '''
+    record_ids, codes, variable_sites = locus
+    variable_sites = np.asarray(variable_sites, dtype='<i8')
+    codes = np.ascontiguousarray(codes, dtype=np.int8)
+    header = {'record_ids': list(record_ids), 'records': codes.shape[0], 'variable_sites': len(variable_sites)}
+    if source is not None:
+        header['source'] = str(source)
+        header['source_sha256'] = hash_file_contents(source)
+    # the header is padded with spaces so the arrays after it are aligned,
+    # leaving room for the offsets of the arrays to be added to it
+    header_text = json.dumps(header).encode('utf-8')
+    prefix_size = len(locus_file_magic) + 8
+    data_offset = -(-(prefix_size + len(header_text) + 128) // locus_file_alignment) * locus_file_alignment
+    codes_offset = data_offset + -(-variable_sites.nbytes // locus_file_alignment) * locus_file_alignment
+    header['variable_sites_offset'] = data_offset
+    header['codes_offset'] = codes_offset
+    header_text = json.dumps(header).encode('utf-8').ljust(data_offset - prefix_size)
+    os.makedirs(os.path.dirname(locus_path) or ".", exist_ok=True)
+    temporary_path = f"{locus_path}.{os.getpid()}.tmp"
+    with open(temporary_path, 'wb') as handle:
+        handle.write(locus_file_magic)
+        handle.write(np.array([locus_file_format_version, len(header_text)], dtype='<u4').tobytes())
+        handle.write(header_text)
+        handle.write(variable_sites.tobytes())
+        handle.write(b"\0" * (codes_offset - data_offset - variable_sites.nbytes))
+        handle.write(codes.tobytes())
+    os.replace(temporary_path, locus_path)
+
+
+def read_locus_file_header(locus_path):
+    '''
+    Returns the header of the locus file at `locus_path` as a dictionary (see
+    `write_locus_file()`), which has the source FASTA file & its hash if those
+    were saved.
+    '''
+    with open(locus_path, 'rb') as handle:
+        prefix = handle.read(len(locus_file_magic) + 8)
+        if not prefix.startswith(locus_file_magic):
+            raise ValueError(f"{locus_path} is not a locus file")
+        version, header_size = np.frombuffer(prefix[len(locus_file_magic):], dtype='<u4').tolist()
+        if version != locus_file_format_version:
+            raise ValueError(f"{locus_path} is a version {version} locus file, which this script can't read")
+        return json.loads(handle.read(header_size).decode('utf-8'))
+
+
+def read_locus_file(locus_path):
+    '''
+    Loads a locus file made by `write_locus_file()` and returns the locus in
+    the same form `read_locus()` gives. The matrix of codes is memory-mapped
+    from the file rather than read in, so only the rows used get read from
+    disk.
+    '''
+    header = read_locus_file_header(locus_path)
+    shape = (header['records'], header['variable_sites'])
+    if header['variable_sites']:
+        variable_sites = np.fromfile(locus_path, dtype='<i8', count=header['variable_sites'],
+                                     offset=header['variable_sites_offset']).tolist()
+    else:
+        variable_sites = []
+    if shape[0] and shape[1]:
+        codes = np.memmap(locus_path, dtype=np.int8, mode='r', offset=header['codes_offset'], shape=shape)
+    else:
+        codes = np.zeros(shape, dtype=np.int8)
+    return header['record_ids'], codes, variable_sites
+
+
+def subset_locus(locus, individual_ids):
+    '''
+    Returns the locus with only the records for the individuals in
+    `individual_ids`, keeping the order of the locus. The variable sites stay
+    the same, so the columns still line up with the full locus.
+    '''
+    record_ids, codes, variable_sites = locus
+    keep = set(individual_ids)
+    rows = [row for row, record_id in enumerate(record_ids) if record_id in keep]
+    return [record_ids[row] for row in rows], codes[rows], variable_sites
+
+
+def get_peak_rss(who="self"):
+    '''
+    Returns the peak resident set size in bytes of this process so far (or of
+    its finished child processes, with `who="children"`), or None where the
+    `resource` module isn't available.
+    '''
+    if resource is None:
+        return None
+    usage = resource.getrusage(resource.RUSAGE_SELF if who == "self" else resource.RUSAGE_CHILDREN)
+    return usage.ru_maxrss * (1 if sys.platform == "darwin" else 1024) # macOS reports bytes, Linux KiB
+
+
+@contextlib.contextmanager
+def profile_stage(stages, stage):
+    '''
+    Records the wall time, CPU time & peak RSS when done of the code run inside
+    it under `stage` in the dictionary `stages`, adding to what is there if
+    the stage is run more than once. Does nothing if `stages` is None, so the
+    code being profiled doesn't have to check whether profiling is on.
+    '''
+    if stages is None:
+        yield
+        return
+    wall_start = time.perf_counter()
+    cpu_start = time.process_time()
     try:
-        alignment = AlignIO.read(filepath, "fasta")
+        yield
+    finally:
+        stage_profile = stages.setdefault(stage, {'wall_seconds': 0.0, 'cpu_seconds': 0.0})
+        stage_profile['wall_seconds'] += time.perf_counter() - wall_start
+        stage_profile['cpu_seconds'] += time.process_time() - cpu_start
+        stage_profile['peak_rss_bytes'] = get_peak_rss()
+
+
+def make_profile():
+    '''
+    Returns a new profile for a run, which `--profile` fills in with what each
+    stage of each locus took and then writes out with `write_profile_report()`.
+    '''
+    return {'started': time.perf_counter(), 'cpu_started': time.process_time(), 'loci': [], 'stages': {}}
+
+
+def add_locus_to_profile(profile, filepath, stages, locus=None, error=None):
+    '''
+    Adds the stages of one locus to `profile` along with the bytes read, the
+    records parsed & the variable sites found. Does nothing if `profile` is
+    None.
+    '''
+    if profile is None:
+        return
+    locus_profile = {'filepath': filepath, 'stages': stages or {}}
+    try:
+        locus_profile['bytes_read'] = os.path.getsize(filepath)
+    except OSError:
+        locus_profile['bytes_read'] = 0
+    if locus is not None:
+        locus_profile['records'] = len(locus[0])
+        locus_profile['variable_sites'] = len(locus[2])
+    if error is not None:
+        locus_profile['error'] = error
+    profile['loci'].append(locus_profile)
+
+
+def write_profile_report(profile_path, profile, slowest_count=10):
+    '''
+    Works out the totals for all the loci in `profile` and writes the report
+    as JSON to `profile_path`. The `slowest_count` loci that took the most
+    wall time are listed first to make them easy to spot.
+    '''
+    loci = profile['loci']
+    aggregate_stages = {}
+    for stages in [locus_profile['stages'] for locus_profile in loci] + [profile['stages']]:
+        for stage, stage_profile in stages.items():
+            totals = aggregate_stages.setdefault(stage, {'wall_seconds': 0.0, 'cpu_seconds': 0.0, 'peak_rss_bytes': None})
+            totals['wall_seconds'] += stage_profile['wall_seconds']
+            totals['cpu_seconds'] += stage_profile['cpu_seconds']
+            if stage_profile['peak_rss_bytes'] is not None:
+                totals['peak_rss_bytes'] = max(totals['peak_rss_bytes'] or 0, stage_profile['peak_rss_bytes'])
+    locus_wall_seconds = [sum(stage_profile['wall_seconds'] for stage_profile in locus_profile['stages'].values())
+                          for locus_profile in loci]
+    slowest = sorted(range(len(loci)), key=lambda i: locus_wall_seconds[i], reverse=True)[:slowest_count]
+    report = {
+        'aggregate': {
+            'wall_seconds': time.perf_counter() - profile['started'],
+            'cpu_seconds': time.process_time() - profile['cpu_started'],
+            'loci': len(loci),
+            'failed_loci': sum('error' in locus_profile for locus_profile in loci),
+            'bytes_read': sum(locus_profile['bytes_read'] for locus_profile in loci),
+            'records': sum(locus_profile.get('records', 0) for locus_profile in loci),
+            'variable_sites': sum(locus_profile.get('variable_sites', 0) for locus_profile in loci),
+            'peak_rss_bytes': get_peak_rss(),
+            'peak_rss_bytes_of_workers': get_peak_rss("children"),
+            'stages': aggregate_stages,
+        },
+        'slowest_loci': [{'filepath': loci[i]['filepath'], 'wall_seconds': locus_wall_seconds[i]} for i in slowest],
+        'loci': loci,
+    }
+    with open(profile_path, "w") as report_file:
+        json.dump(report, report_file, indent=2)
+
+
+def make_locus_file_name(filepath):
+    '''
+    Returns the name the locus file for the FASTA file at `filepath` gets,
+    the name of the FASTA file without its extensions & ending in
+    `locus_file_extension`.
+    '''
+    return os.path.splitext(os.path.basename(strip_compression_extension(filepath)))[0] + locus_file_extension
+
+
+def get_locus_dirs(filepaths, locus_dir):
+    '''
+    Returns the directory to save each FASTA file's locus file in when saving
+    them to `locus_dir`, in the order of `filepaths` (or all None when
+    `locus_dir` is None). Locus files are named after the FASTA file, so
+    FASTA files with the same name in different directories, like
+    'd/chr1/locus.fas' & 'd/chr2/locus.fas', would overwrite each other's;
+    those get put in subdirectories of `locus_dir` following where they are
+    relative to the directory they are all in, like 'chr1/locus.f2sl' &
+    'chr2/locus.f2sl'. Everything else goes straight in `locus_dir`, same
+    as always. Raises ValueError if two different files would still end up
+    at the same locus file, such as 'locus.fas' & 'locus.fas.gz' side by side.
+    '''
+    if locus_dir is None:
+        return [None] * len(filepaths)
+    names = [make_locus_file_name(filepath) for filepath in filepaths]
+    name_counts = {}
+    for name in names:
+        name_counts[name] = name_counts.get(name, 0) + 1
+    clashing_dirs = [os.path.dirname(os.path.abspath(filepath)) for filepath, name in zip(filepaths, names)
+                     if name_counts[name] > 1]
+    common_dir = os.path.commonpath(clashing_dirs) if clashing_dirs else None
+    locus_dirs = []
+    saved_from = {}
+    for filepath, name in zip(filepaths, names):
+        if name_counts[name] > 1:
+            relative_dir = os.path.relpath(os.path.dirname(os.path.abspath(filepath)), common_dir)
+            locus_dirs.append(os.path.normpath(os.path.join(locus_dir, relative_dir)))
+        else:
+            locus_dirs.append(locus_dir)
+        locus_path = os.path.join(locus_dirs[-1], name)
+        source = os.path.abspath(filepath)
+        if saved_from.setdefault(locus_path, source) != source:
+            raise ValueError(f"'{saved_from[locus_path]}' & '{source}' would both be saved as the locus file "
+                             f"'{locus_path}'. Rename one of them or leave out `--write-loci`.")
+    return locus_dirs
+
+
+def read_locus(filepath, engine="numpy", reader="native", cache_dir=None, stages=None, locus_dir=None, threads=1):
+    '''
+    Reads one FASTA alignment and returns what the rest of the conversion
+    needs from it: the list of record IDs, the STRUCTURE codes of the variable
+    sites for every record (one row per record) and the list of variable sites.
+    Nothing here touches shared state so it can be run in a worker process.
+
+    `reader` only matters for the 'numpy' engine; the 'python' engine always
+    works on the alignment object from Biopython, like the original does. With
+    the 'mmap' reader, files with irregular line wrapping, and compressed
+    files, are read with the 'native' reader instead. Files compressed with
+    gzip, xz or zstd are decompressed as they are read (see `open_input()`).
+
+    If `cache_dir` is given, the result is looked for in that cache of loci
+    first, and saved there if it has to be worked out.
+
+    If a dictionary is given as `stages`, what each stage takes gets recorded
+    in it with `profile_stage()`. The 'mmap' & 'stream' readers find the
+    variable sites as they read, so for those parsing, finding the variable
+    sites & encoding are all recorded together as 'read_variable_sites'.
+
+    A locus file (see `write_locus_file()`) is loaded as is instead of being
+    read as FASTA. If `locus_dir` is given, each FASTA file's locus is also
+    saved as a locus file there, named after the FASTA file (see
+    `make_locus_file_name()`; `get_locus_dirs()` gives the directory for each
+    of several files so none overwrite each other).
+
+    With `threads` above 1, the 'numpy' engine splits the one alignment into
+    blocks worked on at the same time in that many threads when collapsing
+    haplotypes, finding the variable sites & encoding (and the 'mmap' reader
+    does too), for single alignments too big for one core. The 'stream'
+    reader & the 'python' engine always use one.
+    '''
+    if str(filepath).endswith(locus_file_extension):
+        with profile_stage(stages, 'read_locus_file'):
+            return read_locus_file(filepath)
+    if locus_dir is not None:
+        locus = read_locus(filepath, engine, reader, cache_dir, stages=stages, threads=threads)
+        locus_path = os.path.join(locus_dir, make_locus_file_name(filepath))
+        with profile_stage(stages, 'write_locus_file'):
+            write_locus_file(locus_path, locus, source=filepath)
+        return locus
+    if cache_dir is not None:
+        cache_path = os.path.join(cache_dir, make_locus_cache_key(filepath) + ".npz")
+        with profile_stage(stages, 'cache_lookup'):
+            locus = load_cached_locus(cache_path)
+        if locus is None:
+            locus = read_locus(filepath, engine, reader, stages=stages, threads=threads)
+            with profile_stage(stages, 'cache_store'):
+                store_cached_locus(cache_path, locus)
+        return locus
+    if engine == "numpy":
+        if reader == "stream":
+            with profile_stage(stages, 'read_variable_sites'):
+                return read_locus_streaming(filepath)
+        if reader == "mmap":
+            with profile_stage(stages, 'read_variable_sites'):
+                locus = read_locus_memory_mapped(filepath, threads=threads)
+            if locus is not None:
+                return locus
+        with profile_stage(stages, 'parse'):
+            if reader in ("native", "mmap"):
+                record_ids, matrix = read_fasta_alignment(filepath)
+            else:
+                from Bio import AlignIO
+                with open_text_input(filepath) as handle:
+                    alignment = AlignIO.read(handle, "fasta")
+                record_ids = [record.id for record in alignment]
+                matrix = alignment_to_matrix(alignment)
+        with profile_stage(stages, 'collapse_haplotypes'):
+            haplotypes, haplotype_of_record = collapse_haplotypes(matrix, threads=threads)
+            del matrix
+        with profile_stage(stages, 'get_variable_sites'):
+            variable_sites = get_variable_sites_numpy(haplotypes, threads=threads)
+        # encode all the variable sites of the distinct haplotypes in one go,
+        # and then fan the encoded rows back out to every record
+        with profile_stage(stages, 'encode'):
+            codes = encode_variable_sites(haplotypes, variable_sites, threads=threads)[haplotype_of_record]
+        return record_ids, codes, variable_sites
+    from Bio import AlignIO
+    with profile_stage(stages, 'parse'):
+        with open_text_input(filepath) as handle:
+            alignment = AlignIO.read(handle, "fasta")
+    with profile_stage(stages, 'get_variable_sites'):
         variable_sites = get_variable_sites(alignment)
+    with profile_stage(stages, 'encode'):
+        codes = np.zeros((len(alignment), len(variable_sites)), dtype=np.int8)
+        for row_index, record in enumerate(alignment):
+            codes[row_index] = encode_sequences(''.join([record.seq[i] for i in variable_sites]))
+    return [record.id for record in alignment], codes, variable_sites
 
+
+# How the variable sites of each locus get logged; set with
+# `configure_variable_sites_log()`.
+variable_sites_log_settings = {'legacy': False, 'sites_file': None, 'max_runs': 20}
+
+
+def configure_variable_sites_log(legacy=False, sites_file=None, max_runs=20):
+    '''
+    Sets how `log_variable_sites()` logs. With `legacy`, the whole list of
+    variable sites is logged like the original does. Otherwise only a summary
+    is, showing at most `max_runs` runs of consecutive sites. If `sites_file`
+    is given, the full list for each locus is also written there, gzipped,
+    as a line with the file path, a tab & the sites separated by spaces; the
+    file is emptied here to start with.
+    '''
+    variable_sites_log_settings.update(legacy=legacy, sites_file=sites_file, max_runs=max_runs)
+    if sites_file is not None:
+        import gzip
+        gzip.open(sites_file, 'wt').close()
+
+
+def summarize_variable_sites(variable_sites, max_runs=20):
+    '''
+    Returns a short summary of a list of variable sites: how many, the first
+    & last, and the runs of consecutive sites (like '3-7,12,20-21'), with only
+    the first `max_runs` runs listed.
+
+    Specific example
+    ================
+    Calling function with
+        ([3, 4, 5, 9, 12, 13])
+    returns
+        "6 sites, range 3-13, runs 3-5,9,12-13"
+    '''
+    if not len(variable_sites):
+        return "0 sites"
+    sites = np.asarray(variable_sites)
+    run_starts = np.flatnonzero(np.diff(sites, prepend=sites[0] - 2) != 1)
+    run_ends = np.append(run_starts[1:], len(sites)) - 1
+    runs = [f"{sites[start]}" if start == end else f"{sites[start]}-{sites[end]}"
+            for start, end in zip(run_starts[:max_runs].tolist(), run_ends[:max_runs].tolist())]
+    more = f" ... ({len(run_starts) - max_runs} more runs)" if len(run_starts) > max_runs else ""
+    return f"{len(sites)} sites, range {sites[0]}-{sites[-1]}, runs {','.join(runs)}{more}"
+
+
+def log_variable_sites(filepath, variable_sites):
+    '''
+    Logs the variable sites of a locus the way set by
+    `configure_variable_sites_log()`, and adds them to the file of full site
+    lists if there is one.
+    '''
+    if variable_sites_log_settings['legacy']:
         logging.info(f'Variable sites for {filepath}: {variable_sites}')
+    else:
+        logging.info(f'Variable sites for {filepath}: '
+                     f'{summarize_variable_sites(variable_sites, variable_sites_log_settings["max_runs"])}')
+    if variable_sites_log_settings['sites_file'] is not None:
+        import gzip
+        with gzip.open(variable_sites_log_settings['sites_file'], 'at') as sites_file:
+            sites_file.write(f"{filepath}\t{' '.join(map(str, variable_sites))}\n")
 
-        for record in alignment:
-            variable_site_sequence = ''.join([record.seq[i] for i in variable_sites])
-            binary_sequence = convert_to_binary(variable_site_sequence)
-            if record.id in sequence_dict:
-                sequence_dict[record.id][file_index] = binary_sequence
-            else:
-                sequence_dict[record.id] = {file_index: binary_sequence}
 
-        variable_sites_count = len(variable_sites)
+def make_genotype_table(individual_ids=()):
+    '''
+    Returns a new, empty table of genotypes, which is what the loci get
+    gathered into before being written out. It holds the IDs of all the
+    individuals in the order first seen, an index of those IDs and, for each
+    locus in order, the 8-bit integer codes for its variable sites (one row per
+    individual in it) along with the index of the individual each row is for.
+    Individuals missing from a locus just don't have a row there; the padding
+    for them only gets made when the output is written.
+
+    `individual_ids` can give individuals already known about, such as those
+    of an output being added to, so they keep their order.
+    '''
+    individual_ids = list(individual_ids)
+    return {'individual_ids': individual_ids,
+            'individual_index': {individual_id: index for index, individual_id in enumerate(individual_ids)},
+            'loci': []}
+
+
+def add_locus(genotypes, filepath, locus, log=True):
+    '''
+    Takes what `read_locus()` returns for a file, logs the variable sites and
+    adds the locus to the table of genotypes. Returns the number of variable
+    sites. With `log=False` nothing gets logged, for when the table is made
+    through `convert()`.
+    '''
+    record_ids, codes, variable_sites = locus
+    if log:
+        log_variable_sites(filepath, variable_sites)
+
+    individual_ids = genotypes['individual_ids']
+    individual_index = genotypes['individual_index']
+    rows_by_individual = {}
+    for row, record_id in enumerate(record_ids):
+        if record_id not in individual_index:
+            individual_index[record_id] = len(individual_ids)
+            individual_ids.append(record_id)
+        # an ID repeated in a file keeps its last record, like the original
+        rows_by_individual[individual_index[record_id]] = row
+    if len(rows_by_individual) < len(record_ids):
+        codes = codes[list(rows_by_individual.values())]
+    genotypes['loci'].append({
+        'filepath': filepath,
+        'variable_sites': variable_sites,
+        'codes': codes,
+        'individuals': np.fromiter(rows_by_individual, dtype=np.int64, count=len(rows_by_individual)),
+    })
+    return len(variable_sites)
+
+
+def add_failed_locus(genotypes, filepath):
+    '''
+    Adds an empty locus for a file that couldn't be processed, so the loci
+    after it stay in order. Like the original, it has no variable sites & all
+    individuals are missing from it.
+    '''
+    genotypes['loci'].append({'filepath': filepath, 'variable_sites': [], 'codes': np.zeros((0, 0), dtype=np.int8),
+                              'individuals': np.zeros(0, dtype=np.int64)})
+
+
+def process_fasta_file(filepath, genotypes, progress_callback, engine="numpy", reader="native", cache_dir=None, profile=None,
+                       locus_dir=None, threads=1):
+    stages = None if profile is None else {}
+    try:
+        locus = read_locus_remembered(filepath, engine, reader, cache_dir, stages=stages, locus_dir=locus_dir, threads=threads)
+        with profile_stage(stages, 'add_locus'):
+            variable_sites_count = add_locus(genotypes, filepath, locus)
+        add_locus_to_profile(profile, filepath, stages, locus)
         progress_callback(variable_sites_count)
         return variable_sites_count
     except Exception as e:
         logging.error(f'An error occurred: {e}')
         traceback.print_exc()
+        add_failed_locus(genotypes, filepath)
+        add_locus_to_profile(profile, filepath, stages, error=str(e))
         progress_callback(0)
         return 0
 
 
-def pad_missing_sequences(sequence_dict, variable_sites_per_file):
-    for seq_id, sequences in sequence_dict.items():
-        padded_sequences = []
-        for i in range(len(variable_sites_per_file)):
-            if i in sequences:
-                padded_sequences.append(sequences[i])
-            else:
-                pad_string = " ".join(["-9"] * variable_sites_per_file[i]) + " "
-                padded_sequences.append(pad_string)
-        sequence_dict[seq_id] = ' '.join(padded_sequences)
+# A pool of worker processes kept running by `serve()` for all the jobs it runs,
+# with what it was started with so it can be started again if it breaks.
+shared_process_pool = {'executor': None, 'jobs': 1, 'memory_cache_size': 0}
 
 
-def concatenate_results(sequence_dict):
-    concatenated_results = []
-    for seq_id, binary_sequence in sequence_dict.items():
-        concatenated_results.append(f"{seq_id} {binary_sequence}\n")
-    return ''.join(concatenated_results)
+def start_shared_process_pool(jobs, memory_cache_size):
+    '''
+    Starts the pool of `jobs` worker processes that `process_pool()` gives
+    out, each keeping up to `memory_cache_size` bytes of loci in memory.
+    '''
+    from concurrent.futures import ProcessPoolExecutor
+    shared_process_pool.update(executor=ProcessPoolExecutor(max_workers=jobs, initializer=configure_locus_memory_cache,
+                                                            initargs=(memory_cache_size,)),
+                               jobs=jobs, memory_cache_size=memory_cache_size)
+
+
+def restart_shared_process_pool():
+    '''
+    Replaces the kept pool of worker processes with a new one started the same
+    way. A pool is broken for good once one of its workers dies (such as when
+    killed for running out of memory), so this is the only way back.
+    '''
+    shared_process_pool['executor'].shutdown(wait=False, cancel_futures=True)
+    start_shared_process_pool(shared_process_pool['jobs'], shared_process_pool['memory_cache_size'])
+
+
+def check_shared_process_pool():
+    '''
+    Starts the kept pool of worker processes again if any of its workers has
+    died since it was last used, by handing it a trivial task.
+    '''
+    from concurrent.futures.process import BrokenProcessPool
+    if shared_process_pool['executor'] is None:
+        return
+    try:
+        shared_process_pool['executor'].submit(os.getpid).result()
+    except BrokenProcessPool:
+        restart_shared_process_pool()
+
+
+@contextlib.contextmanager
+def process_pool(jobs):
+    '''
+    Gives the pool of worker processes kept running by `serve()` if there is
+    one, and otherwise a new pool of `jobs` workers that gets shut down at the
+    end. The workers of the kept pool may have been started from another
+    directory, so the work handed to them has to say which directory its
+    paths are relative to (see `read_locus_in_worker()`).
+    '''
+    if shared_process_pool['executor'] is not None:
+        yield shared_process_pool['executor']
+        return
+    from concurrent.futures import ProcessPoolExecutor
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        yield executor
+
+
+def read_locus_in_worker(filepath, engine="numpy", reader="native", cache_dir=None, profile=False, locus_dir=None,
+                         directory=None, threads=1):
+    '''
+    Runs `read_locus()` in a worker process. Errors are caught and sent back
+    as text, along with the traceback, so the main process can report them in
+    order the same way `process_fasta_file()` does. If `profile` is True, what
+    each stage took in the worker is sent back too (otherwise None is).
+    Relative paths are taken to be inside `directory`, if it is given.
+    '''
+    stages = {} if profile else None
+    try:
+        if directory is not None and directory != os.getcwd():
+            os.chdir(directory)
+        locus = read_locus_remembered(filepath, engine, reader, cache_dir, stages=stages, locus_dir=locus_dir, threads=threads)
+        if isinstance(locus[1], np.memmap):
+            # send back the codes themselves, not a map of a file
+            locus = (locus[0], np.array(locus[1]), locus[2])
+        return locus, None, None, stages
+    except Exception as e:
+        return None, str(e), traceback.format_exc(), stages
+
+
+def add_locus_from_worker(genotypes, filepath, locus, error, error_traceback, stages=None, profile=None):
+    '''
+    Adds what `read_locus_in_worker()` sent back for a file to the table of
+    genotypes, reporting the error the same way `process_fasta_file()` does
+    if there was one.
+    '''
+    if error is not None:
+        logging.error(f'An error occurred: {error}')
+        sys.stderr.write(error_traceback)
+        add_failed_locus(genotypes, filepath)
+        add_locus_to_profile(profile, filepath, stages, error=error)
+        return
+    with profile_stage(stages, 'add_locus'):
+        add_locus(genotypes, filepath, locus)
+    add_locus_to_profile(profile, filepath, stages, locus)
+
+
+def make_pad_strings(variable_sites_per_file, spacing="legacy"):
+    '''
+    Returns the string of missing data codes to use for each file for the
+    individuals not in that file. Made once per file and then shared among
+    all the individuals missing from it.
+    '''
+    if spacing == "legacy":
+        return [" ".join(["-9"] * count) + " " for count in variable_sites_per_file]
+    return [" ".join(["-9"] * count) for count in variable_sites_per_file]
+
+
+def join_locus_segments(segments, spacing="legacy"):
+    '''
+    Joins the text for each locus of one individual into the text for the row.
+    '''
+    if spacing == "legacy":
+        return ' '.join(segments)
+    # leave out loci without variable sites so no doubled spaces
+    return ' '.join([segment for segment in segments if segment])
+
+
+def make_row_layout(genotypes, spacing="legacy"):
+    '''
+    Works out where the columns of each locus go in the matrix of codes for the
+    whole rows that `fill_genotype_block()` fills, with an index of which rows
+    of each locus are for which individuals. Made once for the whole table so
+    each block of rows can get its rows of each locus by a binary search.
+
+    With 'legacy' spacing a locus without variable sites still gets one
+    column, for the empty segment it leaves in the row; with 'compact' it gets
+    none, as it leaves nothing.
+    '''
+    loci_layout = []
+    column = 0
+    for locus in genotypes['loci']:
+        sites = len(locus['variable_sites'])
+        width = sites if sites or spacing != "legacy" else 1
+        order = np.argsort(locus['individuals'], kind='stable')
+        loci_layout.append((column, width, sites, locus['individuals'][order], order))
+        column += width
+    return {'columns': column, 'loci': loci_layout}
+
+
+def fill_genotype_block(genotypes, layout, start, stop):
+    '''
+    Returns the matrix of codes for the whole rows of the individuals from
+    index `start` up to `stop`. It is made already filled with the code for
+    missing individuals and then the rows of each locus are put in by the
+    index of their individual, so the padding doesn't need any work of its
+    own.
+    '''
+    block = np.full((stop - start, layout['columns']), missing_individual_code, dtype=np.int8)
+    for locus, (column, width, sites, sorted_individuals, order) in zip(genotypes['loci'], layout['loci']):
+        if not width:
+            continue
+        block[:, column + width - 1] = missing_individual_last_code if sites else empty_locus_missing_individual_code
+        low, high = np.searchsorted(sorted_individuals, [start, stop])
+        rows = order[low:high]
+        block_rows = sorted_individuals[low:high] - start
+        if sites:
+            block[block_rows, column:column + sites] = locus['codes'][rows]
+        else:
+            block[block_rows, column] = empty_locus_code
+    return block
+
+
+def make_genotype_matrix(genotypes):
+    '''
+    Returns the whole table of genotypes as one matrix of 8-bit integer codes,
+    a row per individual in the order of `genotypes['individual_ids']` and a
+    column per variable site of each locus in order, with the codes STRUCTURE
+    gets: 0 to 3 for A, T, C & G and -9 for everything else, including the
+    sites of loci an individual is missing from. Also returns, for each locus,
+    the first column of its sites & the column after its last one.
+    '''
+    layout = make_row_layout(genotypes, spacing="compact")
+    matrix = fill_genotype_block(genotypes, layout, 0, len(genotypes['individual_ids']))
+    # gaps, unrecognized characters & the padding all become missing data
+    matrix[matrix < 0] = base_codes['-']
+    return matrix, [(column, column + width) for column, width, *_ in layout['loci']]
+
+
+def format_row_bodies(genotypes, layout, start, stop, spacing="legacy"):
+    '''
+    Returns the text of the rows, after the IDs, for the individuals from
+    index `start` up to `stop`, joining all the genotype calls of each row at
+    once. Gives the same text as joining the text of each locus like the
+    original does.
+    '''
+    if not layout['columns']:
+        return [''] * (stop - start)
+    return format_block_rows(fill_genotype_block(genotypes, layout, start, stop), spacing)
+
+
+def format_block_rows(block, spacing="legacy"):
+    '''
+    Returns the text of the rows, after the IDs, for a matrix of codes made
+    by `fill_genotype_block()` (with at least one column).
+    '''
+    token_bytes = genotype_token_bytes[spacing][block.astype(np.intp) + code_offset].view(np.uint8).reshape(len(block), -1)
+    kept = token_bytes != 0
+    text = token_bytes[kept].tobytes().decode('ascii')
+    row_ends = np.cumsum(kept.sum(axis=1)).tolist()
+    # each row ends with the space after its last token, which isn't wanted
+    return [text[row_start:row_end - 1] for row_start, row_end in zip([0] + row_ends[:-1], row_ends)]
+
+
+def iterate_row_blocks(genotypes, layout, cells_per_block=4 * 1024 * 1024):
+    '''
+    Yields the `(start, stop)` ranges of individuals to make the rows for a
+    block at a time, with blocks of about `cells_per_block` genotype calls so
+    the matrix of codes for a block (and the text tokens for it) stays small.
+    '''
+    rows_per_block = max(1, cells_per_block // max(1, layout['columns']))
+    individual_count = len(genotypes['individual_ids'])
+    for start in range(0, individual_count, rows_per_block):
+        yield start, min(start + rows_per_block, individual_count)
+
+
+def iterate_structure_rows(genotypes, spacing="legacy", cells_per_block=4 * 1024 * 1024):
+    '''
+    Yields the text of each row of the STRUCTURE file from the table of
+    genotypes, one individual at a time, turning the codes into text only
+    now. Individuals missing from a locus get the padding for that locus.
+    '''
+    layout = make_row_layout(genotypes, spacing)
+    individual_ids = genotypes['individual_ids']
+    for start, stop in iterate_row_blocks(genotypes, layout, cells_per_block):
+        for individual_id, body in zip(individual_ids[start:stop], format_row_bodies(genotypes, layout, start, stop, spacing)):
+            yield f"{individual_id} {body}\n"
+
+
+def format_row_block_in_worker(individual_ids, block, spacing="legacy"):
+    '''
+    Returns the text of the rows, IDs and all, for the individuals
+    `individual_ids` from their matrix of codes `block` (see
+    `fill_genotype_block()`), in a worker process used by
+    `write_structure_file()`. Only the block is sent to the worker, not the
+    whole table of genotypes.
+    '''
+    bodies = format_block_rows(block, spacing)
+    return ''.join([f"{individual_id} {body}\n" for individual_id, body in zip(individual_ids, bodies)])
+
+
+def write_structure_file(output_filename, genotypes, spacing="legacy", buffer_size=1024 * 1024, jobs=1,
+                         cells_per_block=4 * 1024 * 1024, compression=None):
+    '''
+    Streams each individual's row to the output file as soon as it is made, so
+    the whole text of the output never has to be held in memory at once.
+    `buffer_size` is the size in bytes of the buffer used for writing.
+
+    With `jobs` above 1 and more than one block of rows, the text of the
+    blocks of rows is made by that many worker processes and written in order
+    as it comes back. Each worker is sent just the codes of its block, and
+    only about two blocks per worker are handed out ahead of the one being
+    written, so the text waiting to be written stays small even when writing
+    (such as compressing with xz) is slower than making it.
+    `cells_per_block` sets the size of the blocks (see
+    `iterate_row_blocks()`). The output is compressed if `compression` is
+    given (see `open_compressed()`).
+    '''
+    layout = make_row_layout(genotypes, spacing)
+    blocks = list(iterate_row_blocks(genotypes, layout, cells_per_block))
+    with open_output(output_filename, buffer_size, compression) as output_file:
+        if jobs > 1 and len(blocks) > 1 and layout['columns']:
+            from collections import deque
+            individual_ids = genotypes['individual_ids']
+            with process_pool(jobs) as executor:
+                pending = deque()
+                for start, stop in blocks:
+                    pending.append(executor.submit(format_row_block_in_worker, individual_ids[start:stop],
+                                                   fill_genotype_block(genotypes, layout, start, stop), spacing))
+                    if len(pending) >= 2 * jobs:
+                        output_file.write(pending.popleft().result())
+                while pending:
+                    output_file.write(pending.popleft().result())
+        else:
+            for row_text in iterate_structure_rows(genotypes, spacing, cells_per_block):
+                output_file.write(row_text)
+
+
+sidecar_format_version = 1
+
+
+def make_sidecar_filename(output_filename):
+    '''
+    Returns the path of the sidecar file that goes with a STRUCTURE file.
+    '''
+    return output_filename + ".loci.json"
+
+
+def write_structure_sidecar(output_filename, genotypes, spacing="legacy", previous_loci=()):
+    '''
+    Writes the small sidecar file that lets loci be added to the STRUCTURE
+    file `output_filename` later on without processing the earlier loci again:
+    the spacing used, the IDs of the individuals in the order of the rows and
+    the file & number of variable sites (columns) of each locus. The loci of
+    `genotypes` come after any `previous_loci` already in the file.
+    '''
+    sidecar = {
+        'format_version': sidecar_format_version,
+        'spacing': spacing,
+        'individual_ids': genotypes['individual_ids'],
+        'loci': list(previous_loci) + [{'filepath': str(locus['filepath']), 'variable_sites': len(locus['variable_sites'])}
+                                       for locus in genotypes['loci']],
+    }
+    sidecar_filename = make_sidecar_filename(output_filename)
+    with open(sidecar_filename + ".tmp", "w") as sidecar_file:
+        json.dump(sidecar, sidecar_file)
+    os.replace(sidecar_filename + ".tmp", sidecar_filename)
+
+
+def append_loci_to_structure_file(output_filename, filepaths, engine="numpy", reader="native", cache_dir=None,
+                                  buffer_size=1024 * 1024, threads=1):
+    '''
+    Adds the loci in the FASTA files at `filepaths` to the end of the existing
+    STRUCTURE file `output_filename`, using its sidecar file (see
+    `write_structure_sidecar()`) instead of processing the earlier loci again.
+    Each existing row has the new loci added to the end, with padding for the
+    individuals missing from them, and individuals new to the project get rows
+    at the bottom with padding for all the earlier loci. The result is the
+    same as converting all the loci together. Only the new loci are read in;
+    the existing rows are streamed through to the new version of the file one
+    at a time, and the file & its sidecar are only replaced at the end.
+    Returns the number of variable sites added.
+    '''
+    with open(make_sidecar_filename(output_filename)) as sidecar_file:
+        sidecar = json.load(sidecar_file)
+    if sidecar.get('format_version') != sidecar_format_version:
+        raise ValueError(f"The sidecar for {output_filename} is not a version this script can use.")
+    spacing = sidecar['spacing']
+    previous_count = len(sidecar['individual_ids'])
+    genotypes = make_genotype_table(sidecar['individual_ids'])
+    variable_sites_added = 0
+    for filepath in filepaths:
+        variable_sites_added += process_fasta_file(filepath, genotypes, lambda x: None, engine=engine, reader=reader,
+                                                   cache_dir=cache_dir, threads=threads)
+    previous_pad_strings = make_pad_strings([locus['variable_sites'] for locus in sidecar['loci']], spacing)
+
+    temporary_filename = output_filename + ".tmp"
+    compression = get_compression(output_filename)
+    with open_text_input(output_filename) as existing_file, \
+            open_output(temporary_filename, buffer_size, compression) as output_file:
+        layout = make_row_layout(genotypes, spacing)
+        individual_ids = genotypes['individual_ids']
+        for start, stop in iterate_row_blocks(genotypes, layout):
+            for index, body in enumerate(format_row_bodies(genotypes, layout, start, stop, spacing), start=start):
+                individual_id = individual_ids[index]
+                if index < previous_count:
+                    existing_row = existing_file.readline()
+                    if not existing_row.startswith(f"{individual_id} "):
+                        raise ValueError(f"{output_filename} doesn't match its sidecar at the row for {individual_id}.")
+                    # joining the existing text for the earlier loci with the
+                    # new ones gives just what joining all of them at once would
+                    segments = [existing_row[len(individual_id) + 1:].rstrip("\n"), body]
+                else:
+                    segments = previous_pad_strings + [body]
+                output_file.write(f"{individual_id} {join_locus_segments(segments, spacing)}\n")
+    os.replace(temporary_filename, output_filename)
+    write_structure_sidecar(output_filename, genotypes, spacing, previous_loci=sidecar['loci'])
+    return variable_sites_added
+
+
+# A shard file holds the loci of one shard of a project split across separate
+# jobs (such as on the nodes of a cluster), for putting together with the
+# others with `merge_shard_files()`.
+shard_file_extension = ".f2ss"
+shard_format_version = 1
+
+
+def select_shard_loci(locus_count, shard_index, shard_count):
+    '''
+    Returns the indexes of the loci, out of `locus_count` in order, that go in
+    shard `shard_index` (counting from 1) of `shard_count`. The loci are dealt
+    out in turn, so each shard gets a share from all along the list.
+    '''
+    return list(range(shard_index - 1, locus_count, shard_count))
+
+
+def read_loci(filepaths, engine="numpy", reader="native", jobs=1, cache_dir=None, threads=1):
+    '''
+    Yields what `read_locus_in_worker()` gives for each of the FASTA files at
+    `filepaths`, in order, reading them in worker processes if `jobs` is
+    above 1.
+    '''
+    if jobs > 1 and len(filepaths) > 1:
+        with process_pool(jobs) as executor:
+            yield from executor.map(read_locus_in_worker, filepaths, repeat(engine), repeat(reader), repeat(cache_dir),
+                                    repeat(False), repeat(None), repeat(os.getcwd()), repeat(threads),
+                                    chunksize=max(1, len(filepaths) // (jobs * 4)))
+    else:
+        for filepath in filepaths:
+            yield read_locus_in_worker(filepath, engine, reader, cache_dir, threads=threads)
+
+
+def write_shard_file(shard_path, filepaths, shard_index, shard_count, engine="numpy", reader="native", jobs=1,
+                     cache_dir=None, threads=1):
+    '''
+    Reads the loci of shard `shard_index` of `shard_count` (see
+    `select_shard_loci()`) out of the FASTA files at `filepaths`, which has to
+    be the same list in the same order for every shard, and saves them to the
+    shard file `shard_path` for `merge_shard_files()`. A file that can't be
+    processed is reported the same way `process_fasta_file()` does and saved
+    as failed, so the merge still leaves it empty in its place. Returns the
+    number of loci in the shard.
+
+    The shard file is a NumPy `.npz` file with a JSON 'header' giving the
+    position in the whole list, path, record IDs, number of variable sites
+    & any error of each locus, along with the 'codes' & 'variable_sites' of
+    all the loci one after another.
+    '''
+    selected = select_shard_loci(len(filepaths), shard_index, shard_count)
+    loci = []
+    codes = [np.zeros(0, dtype=np.int8)]
+    variable_sites = [np.zeros(0, dtype=np.int64)]
+    for locus_index, (locus, error, error_traceback, _) in zip(selected, read_loci([filepaths[index] for index in selected],
+                                                                                   engine, reader, jobs, cache_dir, threads)):
+        entry = {'index': locus_index, 'filepath': str(filepaths[locus_index]), 'error': error, 'record_ids': [], 'sites': 0}
+        if error is not None:
+            logging.error(f'An error occurred: {error}')
+            sys.stderr.write(error_traceback)
+        else:
+            record_ids, locus_codes, locus_sites = locus
+            entry.update(record_ids=list(record_ids), sites=len(locus_sites))
+            codes.append(np.ascontiguousarray(locus_codes, dtype=np.int8).ravel())
+            variable_sites.append(np.asarray(locus_sites, dtype=np.int64))
+        loci.append(entry)
+    header = {'format_version': shard_format_version, 'shard_index': shard_index, 'shard_count': shard_count,
+              'locus_count': len(filepaths), 'loci': loci}
+    # written to a temporary file first so a merge never sees a partly written shard
+    temporary_path = f"{shard_path}.{os.getpid()}.tmp"
+    with open(temporary_path, 'wb') as handle:
+        np.savez(handle, header=np.frombuffer(json.dumps(header).encode(), dtype=np.uint8),
+                 codes=np.concatenate(codes), variable_sites=np.concatenate(variable_sites))
+    os.replace(temporary_path, shard_path)
+    return len(selected)
+
+
+def read_shard_file(shard_path):
+    '''
+    Returns the header of the shard file at `shard_path` (see
+    `write_shard_file()`) and, for each locus in it, what `read_locus()` gave
+    for it, or None if it failed.
+    '''
+    with np.load(shard_path) as shard:
+        header = json.loads(shard['header'].tobytes())
+        if header.get('format_version') != shard_format_version:
+            raise ValueError(f"{shard_path} is not a shard file version this script can use.")
+        codes, variable_sites = shard['codes'], shard['variable_sites']
+    loci = []
+    codes_start = sites_start = 0
+    for entry in header['loci']:
+        if entry['error'] is not None:
+            loci.append(None)
+            continue
+        rows, sites = len(entry['record_ids']), entry['sites']
+        loci.append((entry['record_ids'], codes[codes_start:codes_start + rows * sites].reshape(rows, sites),
+                     variable_sites[sites_start:sites_start + sites].tolist()))
+        codes_start += rows * sites
+        sites_start += sites
+    return header, loci
+
+
+def merge_shard_files(shard_paths, output_filename="Structure.str", spacing="legacy", buffer_size=1024 * 1024, jobs=1,
+                      compression=None, sidecar=False):
+    '''
+    Puts the shard files at `shard_paths`, made by `write_shard_file()` for
+    every shard of one project, together into the STRUCTURE file
+    `output_filename`. The loci go back in their original order, so the
+    output & log are the same as converting all the FASTA files in one go,
+    with the individuals in the order first seen & padding for those missing
+    from loci. The shards can be given in any order, but they all have to be
+    there. Returns the number of loci.
+    '''
+    locus_count = shard_count = None
+    loci_by_index = {}
+    for shard_path in shard_paths:
+        header, loci = read_shard_file(shard_path)
+        if locus_count is None:
+            locus_count, shard_count = header['locus_count'], header['shard_count']
+        elif (header['locus_count'], header['shard_count']) != (locus_count, shard_count):
+            raise ValueError(f"{shard_path} is from a different split of loci than {shard_paths[0]}.")
+        for entry, locus in zip(header['loci'], loci):
+            if entry['index'] in loci_by_index:
+                raise ValueError(f"Shard {header['shard_index']} of {shard_count} is given more than once.")
+            loci_by_index[entry['index']] = (entry['filepath'], locus, entry['error'])
+    if locus_count is None:
+        raise ValueError("No shard files given to merge.")
+    missing_shards = sorted({index % shard_count + 1 for index in range(locus_count) if index not in loci_by_index})
+    if missing_shards:
+        raise ValueError(f"Shards {', '.join(map(str, missing_shards))} of {shard_count} are missing.")
+
+    logging.info(f'{locus_count} FASTA files selected.')
+    genotypes = make_genotype_table()
+    for index in range(locus_count):
+        filepath, locus, error = loci_by_index[index]
+        if error is None:
+            add_locus(genotypes, filepath, locus)
+        else:
+            logging.error(f'An error occurred: {error}')
+            add_failed_locus(genotypes, filepath)
+    write_structure_file(output_filename, genotypes, spacing=spacing, buffer_size=buffer_size, jobs=jobs,
+                         compression=compression)
+    if sidecar:
+        write_structure_sidecar(output_filename, genotypes, spacing)
+    return locus_count
+
+
+preview_max_rows = 50
+preview_max_characters = 200
+
+
+def make_structure_preview(genotypes, spacing="legacy", max_rows=preview_max_rows, max_characters=preview_max_characters):
+    '''
+    Returns the text to show as the preview of the output: only the first
+    `max_rows` rows, each cut off after `max_characters` characters, with a
+    note of how many rows aren't shown. Only the rows shown are made, so the
+    preview stays quick however big the output is.
+    '''
+    individual_ids = genotypes['individual_ids']
+    shown = min(len(individual_ids), max_rows)
+    bodies = format_row_bodies(genotypes, make_row_layout(genotypes, spacing), 0, shown, spacing) if shown else []
+    lines = []
+    for individual_id, body in zip(individual_ids, bodies):
+        row = f"{individual_id} {body}"
+        lines.append(row if len(row) <= max_characters else row[:max_characters] + " ...")
+    if len(individual_ids) > shown:
+        lines.append(f"... ({len(individual_ids) - shown} more rows not shown)")
+    return "\n".join(lines) + "\n"
+
+
+def run_conversion_in_background(filepaths, updates, cancel_event, output_filename="Structure.str", spacing="legacy"):
+    '''
+    Does the conversion for the GUI in a background thread. It never touches
+    the window; instead it puts messages on the queue `updates` for the GUI to
+    pick up:
+
+        ('progress', files done, variable sites in the last file, bytes read so far, seconds so far)
+        ('done', output filename, preview text)
+        ('cancelled',)
+        ('error', message)
+
+    Setting `cancel_event` stops it before the next file or before writing
+    the output, so a cancelled conversion leaves no output file.
+    '''
+    try:
+        genotypes = make_genotype_table()
+        started = time.perf_counter()
+        bytes_read = 0
+        for files_done, filepath in enumerate(filepaths, start=1):
+            if cancel_event.is_set():
+                updates.put(('cancelled',))
+                return
+            variable_sites_count = process_fasta_file(filepath, genotypes, lambda x: None)
+            try:
+                bytes_read += os.path.getsize(filepath)
+            except OSError:
+                pass
+            updates.put(('progress', files_done, variable_sites_count, bytes_read, time.perf_counter() - started))
+        if cancel_event.is_set():
+            updates.put(('cancelled',))
+            return
+        write_structure_file(output_filename, genotypes, spacing=spacing)
+        updates.put(('done', output_filename, make_structure_preview(genotypes, spacing)))
+    except Exception as e:
+        logging.error(f'An error occurred: {e}')
+        traceback.print_exc()
+        updates.put(('error', str(e)))
 
 
 def browse_files():
+    import tkinter as tk
+    from tkinter import ttk
+    from tkinter import filedialog
+    import queue
     filepaths = filedialog.askopenfilenames(initialdir=os.getcwd(),
                                             title="Select FASTA file",
                                             filetypes=(("FASTA file", "*.fas"), ("All files", "*.*")))
@@ -92,45 +1809,54 @@ def browse_files():
     if not filepaths:
         return
 
-    sequence_dict = {}
-    variable_sites_per_file = []
     progress_value = tk.DoubleVar()
     progress_bar = tk.ttk.Progressbar(root, variable=progress_value, maximum=len(filepaths), mode='determinate')
     progress_bar.pack(pady=10, fill='x')
     progress_label = tk.Label(root, text="")
     progress_label.pack(pady=5)
+    cancel_event = threading.Event()
+    cancel_button = tk.Button(root, text="Cancel", command=cancel_event.set)
+    cancel_button.pack(pady=5)
 
     logging.info(f'{len(filepaths)} FASTA files selected.')
 
-    def process_files():
-        try:
-            for i, filepath in enumerate(filepaths):
-                variable_sites_count = process_fasta_file(filepath, sequence_dict, i,
-                                                          lambda value: progress_value.set(i + 1) or progress_label.configure(
-                                                              text=f"Processing file {i + 1}/{len(filepaths)} ({value} variable sites)"))
-                variable_sites_per_file.append(variable_sites_count)
-
-            pad_missing_sequences(sequence_dict, variable_sites_per_file)
-            concatenated_results = concatenate_results(sequence_dict)
-
-            preview_textbox.configure(state='normal')
-            preview_textbox.delete('1.0', tk.END)
-            preview_textbox.insert(tk.END, concatenated_results)
-            preview_textbox.configure(state='disabled')
-
-            output_filename = "Structure.str"
-
-            with open(output_filename, "w") as output_file:
-                output_file.write(concatenated_results)
-
-            output_label.configure(text=f"Converted files saved as: {output_filename}")
-            progress_label.configure(text="Conversion completed successfully!")
-        except Exception as e:
-            logging.error(f'An error occurred: {e}')
-            traceback.print_exc()
-            progress_label.configure(text="An error occurred during the conversion process.")
+    # The conversion runs in a background thread that only sends messages on
+    # this queue; the window is only ever updated here in the main thread, by
+    # checking the queue every so often with `root.after()`.
+    updates = queue.Queue()
+    poll_interval_ms = 100
 
-    threading.Thread(target=process_files).start()
+    def check_for_updates():
+        try:
+            while True:
+                message = updates.get_nowait()
+                if message[0] == 'progress':
+                    files_done, variable_sites_count, bytes_read, seconds = message[1:]
+                    progress_value.set(files_done)
+                    seconds = max(seconds, 1e-9)
+                    progress_label.configure(text=f"Processing file {files_done}/{len(filepaths)} ({variable_sites_count} variable sites) - "
+                                                  f"{files_done / seconds:.1f} files/s, {bytes_read / seconds / 1024 ** 2:.1f} MB/s")
+                    continue
+                if message[0] == 'done':
+                    output_filename, preview = message[1:]
+                    preview_textbox.configure(state='normal')
+                    preview_textbox.delete('1.0', tk.END)
+                    preview_textbox.insert(tk.END, preview)
+                    preview_textbox.configure(state='disabled')
+                    output_label.configure(text=f"Converted files saved as: {output_filename}")
+                    progress_label.configure(text="Conversion completed successfully!")
+                elif message[0] == 'cancelled':
+                    progress_label.configure(text="Conversion cancelled.")
+                else:
+                    progress_label.configure(text="An error occurred during the conversion process.")
+                cancel_button.destroy()
+                return
+        except queue.Empty:
+            pass
+        root.after(poll_interval_ms, check_for_updates)
+
+    threading.Thread(target=run_conversion_in_background, args=(filepaths, updates, cancel_event), daemon=True).start()
+    root.after(poll_interval_ms, check_for_updates)
 ###------------ END OF original top, mainly from unimproved code--------------###
 ################################################################################
 
@@ -164,14 +1890,20 @@ def make_temp_filename(filepaths):
     return "tmp{}{}.fa".format(
         os.path.splitext(os.path.basename(filepaths[0]))[0],uuid.uuid4().time)
 
-def parse_inputs(inputs):
-    fasta_files_in_directory = []
+def parse_inputs(inputs, include=(), exclude=()):
+    '''
+    Takes a list of paths to FASTA files and directories and returns the list
+    of FASTA files, with the FASTA files found under each directory (see
+    `discover_fasta_files()`) in place of it. Anything that isn't a FASTA
+    file (or locus file) or a directory is warned about & skipped.
+    '''
+    fasta_files = []
     for input_item in inputs:
         if os.path.isdir(input_item):
-            # If it's a directory, add all .fa and .fasta files in it
-            fasta_files.extend([os.path.join(input_item, f) for f in os.listdir(input_item) 
-                                if f.endswith(('.fa', '.fasta', '.fas'))])
-        elif os.path.isfile(input_item) and input_item.endswith(('.fa', '.fasta', '.fas')):
+            # If it's a directory, add all the FASTA files under it
+            fasta_files.extend(discover_fasta_files(input_item, include, exclude)[0])
+        elif os.path.isfile(input_item) and (strip_compression_extension(input_item).endswith(fasta_extensions_allowed)
+                                             or input_item.endswith(locus_file_extension)):
             # If it's a file with the correct extension, add it
             fasta_files.append(input_item)
         else:
@@ -179,55 +1911,498 @@ def parse_inputs(inputs):
     
     return fasta_files
 
-def process_multiple_fastas_together(filepaths):
-    sequence_dict = {}
-    variable_sites_per_file = []
+def process_multiple_fastas_together(filepaths, engine="numpy", spacing="legacy", buffer_size=1024 * 1024, jobs=1, reader="native",
+                                     cache_dir=None, cache_size=1024 ** 3, profile_path=None, sidecar=False,
+                                     locus_dir=None, compression=None, file_sizes=None, threads=1):
+    genotypes = make_genotype_table()
+    profile = None if profile_path is None else make_profile()
+    locus_dirs = get_locus_dirs(filepaths, locus_dir)
+
+    if jobs > 1 and len(filepaths) > 1:
+        # Parse & find variable sites for the files in worker processes. 
+        # `executor.map()` gives results back in the order of the filepaths so
+        # the loci get added just like they do when not in parallel.
+        # When the sizes of the files are known, the biggest files are handed
+        # out first so that one big file left to the end doesn't hold up the
+        # finish; the loci still get added in order.
+        with process_pool(jobs) as executor:
+            if file_sizes is None:
+                chunksize = max(1, len(filepaths) // (jobs * 4))
+                results = executor.map(read_locus_in_worker, filepaths, repeat(engine), repeat(reader), repeat(cache_dir),
+                                       repeat(profile is not None), locus_dirs, repeat(os.getcwd()), repeat(threads),
+                                       chunksize=chunksize)
+            else:
+                futures = [None] * len(filepaths)
+                for index in sorted(range(len(filepaths)), key=lambda index: -file_sizes[index]):
+                    futures[index] = executor.submit(read_locus_in_worker, filepaths[index], engine, reader, cache_dir,
+                                                     profile is not None, locus_dirs[index], os.getcwd(), threads)
+                results = (future.result() for future in futures)
+            for filepath, (locus, error, error_traceback, stages) in zip(filepaths, results):
+                add_locus_from_worker(genotypes, filepath, locus, error, error_traceback, stages, profile)
+    else:
+        for filepath, file_locus_dir in zip(filepaths, locus_dirs):
+            process_fasta_file(filepath, genotypes, lambda x: None, engine=engine, reader=reader, cache_dir=cache_dir, profile=profile,
+                               locus_dir=file_locus_dir, threads=threads)
+    if cache_dir is not None:
+        trim_locus_cache(cache_dir, cache_size)
+
+    output_filename = "Structure.str" + compression_format_extensions.get(compression, "")
+    with profile_stage(None if profile is None else profile['stages'], 'write'):
+        write_structure_file(output_filename, genotypes, spacing=spacing, buffer_size=buffer_size, jobs=jobs,
+                             compression=compression)
+    if sidecar:
+        write_structure_sidecar(output_filename, genotypes, spacing)
+    print(f"Converted files saved as: {output_filename}")
+    if profile is not None:
+        write_profile_report(profile_path, profile)
+        print(f"Profile saved as: {profile_path}")
+
+
+def process_single_fasta(filepath, engine="numpy", spacing="legacy", buffer_size=1024 * 1024, reader="native",
+                         cache_dir=None, cache_size=1024 ** 3, profile_path=None, sidecar=False,
+                         locus_dir=None, compression=None, threads=1):
+    genotypes = make_genotype_table()
+    profile = None if profile_path is None else make_profile()
+    process_fasta_file(filepath, genotypes, lambda x: None, engine=engine, reader=reader, cache_dir=cache_dir, profile=profile,
+                       locus_dir=locus_dir, threads=threads)
+    if cache_dir is not None:
+        trim_locus_cache(cache_dir, cache_size)
+    
+    output_filename = (f"{os.path.splitext(os.path.basename(strip_compression_extension(filepath)))[0]}_Structure.str"
+                       + compression_format_extensions.get(compression, ""))
+    with profile_stage(None if profile is None else profile['stages'], 'write'):
+        write_structure_file(output_filename, genotypes, spacing=spacing, buffer_size=buffer_size, compression=compression)
+    if sidecar:
+        write_structure_sidecar(output_filename, genotypes, spacing)
+    print(f"Converted file saved as: {output_filename}")
+    if profile is not None:
+        write_profile_report(profile_path, profile)
+        print(f"Profile saved as: {profile_path}")
+
+def convert(filepaths, engine="numpy", reader="native", jobs=1, cache_dir=None, locus_dir=None, threads=1):
+    '''
+    Converts the FASTA files at `filepaths` the same way as the script does,
+    but in memory, for use from Python (such as in a notebook or pipeline)
+    without running the script. Nothing gets written (unless `cache_dir` is
+    given), logged or printed, and nothing global gets set up, so it can be
+    called over & over in one process. A file that can't be processed is
+    left empty, like when running the script, and its error is given back.
+
+    Returns a dictionary with:
+    'individual_ids'  the IDs of all the individuals, in the order first seen
+    'genotypes'       the matrix of codes from `make_genotype_matrix()`, a row
+                      per individual
+    'loci'            for each file in order, a dictionary of its 'filepath',
+                      its 'variable_sites' (the positions in the alignment that
+                      each of its columns are for), the first & after-last
+                      'columns' of the matrix that are its sites, and the
+                      'error' processing it gave or None
+    '''
+    filepaths = [filepaths] if isinstance(filepaths, (str, os.PathLike)) else list(filepaths)
+    genotypes = make_genotype_table()
+    locus_dirs = get_locus_dirs(filepaths, locus_dir)
+    if jobs > 1 and len(filepaths) > 1:
+        with process_pool(jobs) as executor:
+            results = list(executor.map(read_locus_in_worker, filepaths, repeat(engine), repeat(reader),
+                                        repeat(cache_dir), repeat(False), locus_dirs, repeat(os.getcwd()),
+                                        repeat(threads)))
+    else:
+        results = []
+        for filepath, file_locus_dir in zip(filepaths, locus_dirs):
+            try:
+                results.append((read_locus(filepath, engine, reader, cache_dir, locus_dir=file_locus_dir, threads=threads), None))
+            except Exception as e:
+                results.append((None, str(e)))
+    errors = []
+    for filepath, (locus, error, *_) in zip(filepaths, results):
+        if error is None:
+            add_locus(genotypes, filepath, locus, log=False)
+        else:
+            add_failed_locus(genotypes, filepath)
+        errors.append(error)
 
-    for i, filepath in enumerate(filepaths):
-        file_sequence_dict = {}
-        variable_sites_count = process_fasta_file(filepath, file_sequence_dict, i, lambda x: None)
-        variable_sites_per_file.append(variable_sites_count)
+    matrix, columns = make_genotype_matrix(genotypes)
+    return {'individual_ids': genotypes['individual_ids'],
+            'genotypes': matrix,
+            'loci': [{'filepath': locus['filepath'], 'variable_sites': [int(site) for site in locus['variable_sites']],
+                      'columns': locus_columns, 'error': error}
+                     for locus, locus_columns, error in zip(genotypes['loci'], columns, errors)]}
 
-        # Merge file_sequence_dict into the main sequence_dict
-        for seq_id, sequences in file_sequence_dict.items():
-            if seq_id not in sequence_dict:
-                sequence_dict[seq_id] = {}
-            sequence_dict[seq_id].update(sequences)
 
-    pad_missing_sequences(sequence_dict, variable_sites_per_file)
-    concatenated_results = concatenate_results(sequence_dict)
+discovery_threads = 16
 
-    output_filename = "Structure.str"
-    with open(output_filename, "w") as output_file:
-        output_file.write(concatenated_results)
-    print(f"Converted files saved as: {output_filename}")
 
+def scan_directory_for_fasta_files(directory, relative_directory, include=(), exclude=()):
+    '''
+    Lists one directory with `os.scandir()` for `discover_fasta_files()`.
+    Returns the paths, & paths relative to where the search started, of the
+    files in it that match, and the same for the directories in it to search
+    next. Hidden directories (with names starting with '.') aren't searched.
+    '''
+    files = []
+    directories = []
+    with os.scandir(directory) as entries:
+        for entry in entries:
+            relative_path = f"{relative_directory}/{entry.name}" if relative_directory else entry.name
+            if matches_any_glob(relative_path, exclude):
+                continue
+            if entry.is_dir(follow_symlinks=False):
+                # like '.ipynb_checkpoints', where Jupyter keeps copies of the
+                # files that would otherwise get added as extra loci
+                if not entry.name.startswith('.'):
+                    directories.append((entry.path, relative_path))
+            elif include and matches_any_glob(relative_path, include):
+                files.append((entry.path, relative_path))
+            elif not include and strip_compression_extension(entry.name).endswith(fasta_extensions_allowed):
+                files.append((entry.path, relative_path))
+    return files, directories
+
+
+def matches_any_glob(relative_path, globs):
+    '''
+    Returns whether a path (relative to where the search started, with '/'
+    between the parts) matches any of the glob patterns. Like
+    `pathlib.PurePath.match()`, the patterns are matched from the end of the
+    path, so a pattern without a '/' is matched against just the name of the
+    file or directory, and '*' doesn't match across a '/'.
+    '''
+    from pathlib import PurePosixPath
+    return any(PurePosixPath(relative_path).match(glob) for glob in globs)
 
-def process_single_fasta(filepath):
-    sequence_dict = {}
-    variable_sites_count = process_fasta_file(filepath, sequence_dict, 0, lambda x: None)
-    
-    pad_missing_sequences(sequence_dict, [variable_sites_count])
-    concatenated_results = concatenate_results(sequence_dict)
 
-    output_filename = f"{os.path.splitext(os.path.basename(filepath))[0]}_Structure.str"
-    with open(output_filename, "w") as output_file:
-        output_file.write(concatenated_results)
-    print(f"Converted file saved as: {output_filename}")
+def get_file_sizes(filepaths):
+    '''
+    Returns the size in bytes of each file.
+    '''
+    return [os.path.getsize(filepath) for filepath in filepaths]
 
-###---------END OF HELPER FUNCTIONS by Wayne for non-GUI use-----------------###
-###---------END OF HELPER FUNCTIONS by Wayne for non-GUI use-----------------###
 
+def discover_fasta_files(directory, include=(), exclude=(), threads=discovery_threads):
+    '''
+    Finds the FASTA files under `directory`, searching all the directories
+    inside it too, and returns the list of their paths along with the list
+    of their sizes in bytes. The paths are sorted by their path relative to
+    `directory`, so the loci always come in the same order whatever order the
+    file system lists them in.
+
+    By default the files with the extensions in `fasta_extensions_allowed`,
+    compressed or not, are found. If `include` has glob patterns, the files
+    that match any of them are found instead. Files & directories matching
+    any glob pattern in `exclude` are skipped. (The patterns are matched as
+    `matches_any_glob()` does, against the path relative to `directory`.)
+    Hidden directories inside `directory`, such as the '.ipynb_checkpoints'
+    directories Jupyter makes, are always skipped.
+
+    Each level of directories is listed by a pool of `threads` threads at
+    once, and the files are looked up in batches by the same pool, since on
+    network file systems it is waiting for those that takes the time.
+    '''
+    from concurrent.futures import ThreadPoolExecutor
+    found = []
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        directories = [(directory, "")]
+        while directories:
+            next_directories = []
+            for files, subdirectories in executor.map(lambda item: scan_directory_for_fasta_files(*item, include, exclude),
+                                                      directories):
+                found.extend(files)
+                next_directories.extend(subdirectories)
+            directories = next_directories
+        found.sort(key=lambda item: item[1].split("/"))
+        filepaths = [filepath for filepath, relative_path in found]
+        batch_size = 1024
+        file_sizes = []
+        for sizes in executor.map(get_file_sizes, [filepaths[start:start + batch_size]
+                                                   for start in range(0, len(filepaths), batch_size)]):
+            file_sizes.extend(sizes)
+    return filepaths, file_sizes
+
+
+manifest_job_options = ('engine', 'reader', 'spacing')
+
+
+def read_manifest(manifest_path, defaults):
+    '''
+    Reads the list of jobs to run from a manifest & returns a list with a
+    dictionary for each job. A manifest ending in '.json' holds a list of jobs
+    (or an object with the list under 'jobs'), each an object like:
 
-# Decide to use GUI interface or stick to stdin, stderr, stdout as interface. Give feedback if not providing arguments
-# Check if the script is running in a terminal or situation like inside Jupyter, i.e., if Tkinter cannot connect to a graphical display. 
-# FULL DESCRIPTION OF SITUATION: Tkinter is installed and importable because it is part of the standard library, but if the original Fasta2Structure.py script (https://github.com/AdamBessa/Fasta2Structure/blob/9721bb545a8277c3ddbca74bc987e89563475bce/Fasta2Structure.py) is run on the command line with `python Fasta2Structure.py` or in Jupyter with `%run Fasta2Structure.py`,it gives `_tkinter.TclError: no display name and no $DISPLAY environment variable` because it cannot initialize a graphical window due to the absence of a display server connection." In this situatuon I then want to run using arguments to specify the file or directory to act on. If there is no arguments, then display USAGE/help via argparse.
-try:
-    root = tk.Tk()
-    Tkinter_can_connect_to_graphical_display= True
-    root.withdraw()  # Destroy the test Tk window
-except (tk.TclError): # handle the error `_tkinter.TclError: no display name and no $DISPLAY environment variable` when running in command line where Tkinter GUI cannot start up properly
-    Tkinter_can_connect_to_graphical_display = False
+        {"input": ["a.fas", "b.fas"], "output": "project1.str", "log": "project1.log", "spacing": "compact"}
+
+    Any other manifest is read as tab-separated values, with a header line
+    naming the columns. Blank lines & lines starting with '#' are skipped. In
+    that case several inputs for one job are separated with ';'.
+
+    'input' (a FASTA file, several FASTA files or a directory of them, just
+    like on the command line) & 'output' are needed for every job. 'log'
+    defaults to the output path with '.log' in place of its extension, and
+    'engine', 'reader' & 'spacing' default to the values in `defaults`.
+    '''
+    if manifest_path.endswith('.json'):
+        with open(manifest_path) as manifest_file:
+            entries = json.load(manifest_file)
+        if isinstance(entries, dict):
+            entries = entries['jobs']
+    else:
+        with open(manifest_path) as manifest_file:
+            lines = [line.rstrip('\r\n') for line in manifest_file if line.strip() and not line.startswith('#')]
+        header = [column.strip() for column in lines[0].split('\t')] if lines else []
+        entries = []
+        for line in lines[1:]:
+            entry = dict(zip(header, [value.strip() for value in line.split('\t')]))
+            entry['input'] = [path for path in entry.get('input', '').split(';') if path]
+            entries.append(entry)
+
+    allowed_values = {'engine': variable_site_engines, 'reader': fasta_readers, 'spacing': spacing_modes}
+    manifest_jobs = []
+    for job_number, entry in enumerate(entries, start=1):
+        unknown_keys = set(entry) - {'input', 'output', 'log'} - set(manifest_job_options)
+        if unknown_keys:
+            raise ValueError(f"Job {job_number} of the manifest has unknown settings: {', '.join(sorted(unknown_keys))}")
+        inputs = [entry['input']] if isinstance(entry.get('input'), str) else list(entry.get('input') or [])
+        if not inputs or not entry.get('output'):
+            raise ValueError(f"Job {job_number} of the manifest needs both 'input' and 'output'.")
+        job = {'inputs': inputs, 'output': entry['output'],
+               'log': entry.get('log') or os.path.splitext(entry['output'])[0] + '.log'}
+        for option in manifest_job_options:
+            job[option] = entry.get(option) or defaults[option]
+            if job[option] not in allowed_values[option]:
+                raise ValueError(f"Job {job_number} of the manifest has '{job[option]}' for '{option}'; it must be one of: "
+                                 f"{', '.join(allowed_values[option])}")
+        manifest_jobs.append(job)
+    return manifest_jobs
+
+
+@contextlib.contextmanager
+def log_to_file(log_path):
+    '''
+    Sends what is logged inside it to `log_path` as well, in the same format
+    as `log.log`, so each job of a manifest gets a log of its own.
+    '''
+    handler = logging.FileHandler(log_path, mode='w')
+    handler.setFormatter(logging.Formatter('%(name)s - %(levelname)s - %(message)s'))
+    root_logger = logging.getLogger()
+    previous_level = root_logger.level
+    root_logger.setLevel(logging.INFO)
+    root_logger.addHandler(handler)
+    try:
+        yield
+    finally:
+        root_logger.removeHandler(handler)
+        root_logger.setLevel(previous_level)
+        handler.close()
+
+
+def run_manifest(manifest_path, engine="numpy", spacing="legacy", buffer_size=1024 * 1024, jobs=1, reader="native",
+                 cache_dir=None, cache_size=1024 ** 3, threads=1):
+    '''
+    Runs every job listed in the manifest at `manifest_path` (see
+    `read_manifest()`) in this one run of the script, writing the output &
+    log of each job to the paths given for it. The other settings are used
+    for jobs that don't give their own.
+
+    With `jobs` above 1, the FASTA files of the jobs are handed to one pool of
+    worker processes, and each job is then put together from its results in
+    order just like `process_multiple_fastas_together()` does. The files of
+    the next job are handed out while the current one is being put together,
+    so the workers stay busy across jobs, but no further ahead than that, so
+    the loci of a long manifest don't all pile up in memory waiting their
+    turn. A job that fails is reported & skipped. Returns the number of jobs
+    that failed.
+    '''
+    manifest_jobs = read_manifest(manifest_path, {'engine': engine, 'reader': reader, 'spacing': spacing})
+    for job in manifest_jobs:
+        job['filepaths'] = job['inputs']
+        if any(os.path.isdir(input_item) for input_item in job['inputs']):
+            job['filepaths'] = parse_inputs(job['inputs'])
+
+    failed_jobs = 0
+    submitted_jobs = 0
+    with process_pool(jobs) if jobs > 1 else contextlib.nullcontext() as executor:
+        for job_number, job in enumerate(manifest_jobs, start=1):
+            # hand out the files of this job & the next one (if not already)
+            while executor is not None and submitted_jobs < min(job_number + 1, len(manifest_jobs)):
+                next_job = manifest_jobs[submitted_jobs]
+                next_job['futures'] = [executor.submit(read_locus_in_worker, filepath, next_job['engine'], next_job['reader'],
+                                                       cache_dir, directory=os.getcwd(), threads=threads)
+                                       for filepath in next_job['filepaths']]
+                submitted_jobs += 1
+            futures = job.pop('futures', None)
+            try:
+                output_directory = os.path.dirname(job['output'])
+                if output_directory:
+                    os.makedirs(output_directory, exist_ok=True)
+                with log_to_file(job['log']):
+                    logging.info(f"{len(job['filepaths'])} FASTA files selected.")
+                    genotypes = make_genotype_table()
+                    if executor is not None:
+                        for filepath, future in zip(job['filepaths'], futures):
+                            locus, error, error_traceback, stages = future.result()
+                            add_locus_from_worker(genotypes, filepath, locus, error, error_traceback)
+                    else:
+                        for filepath in job['filepaths']:
+                            process_fasta_file(filepath, genotypes, lambda x: None, engine=job['engine'], reader=job['reader'],
+                                               cache_dir=cache_dir, threads=threads)
+                    write_structure_file(job['output'], genotypes, spacing=job['spacing'], buffer_size=buffer_size,
+                                         compression=get_compression(job['output']))
+                print(f"Job {job_number}: converted files saved as: {job['output']}")
+            except Exception as e:
+                failed_jobs += 1
+                logging.error(f'An error occurred in job {job_number}: {e}')
+                print(f"Job {job_number} failed: {e}", file=sys.stderr)
+    if cache_dir is not None:
+        trim_locus_cache(cache_dir, cache_size)
+    return failed_jobs
+
+
+def get_default_socket_path():
+    '''
+    Returns the path of the socket the service listens on when no other is
+    given, one per user in the temporary directory. Kept the same as in
+    `improved_Fasta2Structure_client.py`.
+    '''
+    import tempfile
+    return os.path.join(tempfile.gettempdir(), f"fasta2structure-{getattr(os, 'getuid', lambda: 0)()}.sock")
+
+
+def run_service_job(argv, directory):
+    '''
+    Runs the script with the arguments `argv` from inside `directory`, the way
+    running it there as a new process would, for `serve()`. Returns what it
+    printed to stdout & stderr and its exit code.
+
+    If a worker process of the service's pool has died, the pool is started
+    again before the job. If one dies during the job, the pool is started
+    again & the job run once more; if that happens twice, just this job is
+    reported as failed.
+    '''
+    from concurrent.futures.process import BrokenProcessPool
+    check_shared_process_pool()
+    for attempt in range(2):
+        try:
+            return run_service_job_attempt(argv, directory)
+        except BrokenProcessPool:
+            restart_shared_process_pool()
+    return {'stdout': "", 'exit_code': 1,
+            'stderr': "A worker process of the service stopped unexpectedly (such as from running out of memory) twice "
+                      "while running this job.\n"}
+
+
+def run_service_job_attempt(argv, directory):
+    '''
+    Runs one attempt at a job for `run_service_job()`. A broken pool of worker
+    processes is raised as `BrokenProcessPool` for it to deal with, and
+    anything else that goes wrong is reported in what is returned.
+    '''
+    import io
+    from concurrent.futures.process import BrokenProcessPool
+    stdout, stderr = io.StringIO(), io.StringIO()
+    exit_code = 0
+    previous_directory = os.getcwd()
+    with contextlib.redirect_stdout(stdout), contextlib.redirect_stderr(stderr):
+        try:
+            os.chdir(directory)
+            if not argv or "--serve" in argv:
+                # there's no display to show the GUI on for the client, and
+                # no service should start another
+                parser.print_usage()
+                print("The service needs FASTA files to convert, and can't run --serve itself.", file=sys.stderr)
+                exit_code = 2
+            else:
+                main(argv)
+        except SystemExit as e:
+            exit_code = e.code if isinstance(e.code, int) else (0 if e.code is None else 1)
+            if not isinstance(e.code, (int, type(None))):
+                print(e.code, file=sys.stderr)
+        except BrokenProcessPool:
+            raise
+        except Exception:
+            traceback.print_exc()
+            exit_code = 1
+        finally:
+            # close `log.log` so the job's log is complete once the client has its answer
+            root_logger = logging.getLogger()
+            for handler in root_logger.handlers[:]:
+                root_logger.removeHandler(handler)
+                handler.close()
+            os.chdir(previous_directory)
+    return {'stdout': stdout.getvalue(), 'stderr': stderr.getvalue(), 'exit_code': exit_code}
+
+
+def serve(socket_path=None, jobs=1, memory_cache_size=1024 ** 3):
+    '''
+    Runs as a long-lived service taking conversion jobs over the Unix domain
+    socket at `socket_path`, so a workflow that converts many small inputs
+    doesn't pay to start Python & import everything for each one. It keeps a
+    pool of `jobs` worker processes running and the loci it has read in
+    memory (up to `memory_cache_size` bytes per process), so a file seen
+    before isn't read again.
+
+    Each job is a line of JSON with the 'argv' to run the script with and the
+    'cwd' to run it in, as sent by `improved_Fasta2Structure_client.py`, and
+    gets back a line of JSON with what was printed and the exit code (see
+    `run_service_job()`). Jobs are run one at a time, each with the workers
+    of the pool, as the output & log of a job go in its own directory. A
+    line of JSON with 'stop' set stops the service.
+
+    Only the user running the service can connect to the socket, and an
+    OSError is raised if another service is already listening on it.
+    '''
+    import socket
+    import socketserver
+    import stat
+    if not hasattr(socketserver, 'UnixStreamServer'):
+        raise OSError("The service needs Unix domain sockets, which aren't available here.")
+    socket_path = socket_path or get_default_socket_path()
+    if os.path.exists(socket_path) and stat.S_ISSOCK(os.stat(socket_path).st_mode):
+        # a service still answering on the socket is left alone, as taking its
+        # socket would leave it running with no way to reach or stop it; a
+        # socket left behind by a service that didn't stop cleanly is in the way
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as probe:
+            try:
+                probe.connect(socket_path)
+            except ConnectionRefusedError:
+                os.remove(socket_path)
+            else:
+                raise OSError(f"A service is already listening on {socket_path}. Stop it first with "
+                              "`python improved_Fasta2Structure_client.py --stop-server` or use another --socket.")
+    configure_locus_memory_cache(memory_cache_size)
+    if jobs > 1:
+        start_shared_process_pool(jobs, memory_cache_size)
+    stopping = []
+
+    class JobHandler(socketserver.StreamRequestHandler):
+        def handle(self):
+            request = json.loads(self.rfile.readline())
+            if request.get('stop'):
+                stopping.append(True)
+                response = {'stdout': "Service stopped.\n", 'stderr': "", 'exit_code': 0}
+            else:
+                response = run_service_job(request['argv'], request['cwd'])
+            self.wfile.write((json.dumps(response) + "\n").encode())
+
+    server = None
+    try:
+        # jobs write files as the user running the service, so only that user
+        # gets to connect to the socket
+        previous_umask = os.umask(0o077)
+        try:
+            server = socketserver.UnixStreamServer(socket_path, JobHandler)
+        finally:
+            os.umask(previous_umask)
+        with server:
+            print(f"Listening for jobs on {socket_path}", flush=True)
+            while not stopping:
+                server.handle_request()
+    finally:
+        if server is not None and os.path.exists(socket_path):
+            os.remove(socket_path)
+        if shared_process_pool['executor'] is not None:
+            shared_process_pool['executor'].shutdown()
+            shared_process_pool['executor'] = None
+
+###---------END OF HELPER FUNCTIONS by Wayne for non-GUI use-----------------###
+###---------END OF HELPER FUNCTIONS by Wayne for non-GUI use-----------------###
 
 
 # Set up for Usgae/help and handling input arguments
@@ -259,6 +2434,11 @@ description = textwrap.dedent("""\
     - Multiple FASTA files: python improved_Fasta2Structure.py Example_data/Datasets/ITS.fas Example_data/Datasets/trnD-trnT.fas Example_data/Datasets/trnH-trnK.fas 
     - Directory with FASTA files: python improved_Fasta2Structure.py Example_data/Datasets/
 
+    Python usage, to get the genotypes in memory without writing any files:
+    - from improved_Fasta2Structure import convert
+      result = convert(["file1.fa", "file2.fa"])
+      result['individual_ids'], result['genotypes'], result['loci']
+
 
 
     **** GUI & main script by Adam Bessa-Silva; CLI adaptation by Wayne Decatur (fomightez @ github) ***
@@ -271,8 +2451,104 @@ parser = argparse.ArgumentParser(
 )
 fasta_extensions_allowed = ('.fa', '.fasta', '.fas')
 fasta_extensions_allowed_text_for_help = "'" + "', '".join(fasta_extensions_allowed[:-1]) + "', or '" + fasta_extensions_allowed[-1] + "'"
-parser.add_argument("input", nargs='+', help=f"FASTA file or files or directory \
-    containing FASTA files. FASTA files in a directory (with extensions {fasta_extensions_allowed_text_for_help}) will be treated as if all of the filepaths for each had been provided when invoking the script. Multiple FASTA files provided in arguments will be processed in the same manner as if all selected at the same time by the GUI interface of the original `Fasta2Structure.py` NOTE: to get the output to match what the GUI gives, supply the filepaths as arguments left to rigth to match what the GUI would have top to bottom.", metavar="INPUT_FASTA")
+parser.add_argument("input", nargs='*', help=f"FASTA file or files or directory \
+    containing FASTA files. FASTA files in a directory (with extensions {fasta_extensions_allowed_text_for_help}, which can be followed by '.gz', '.bgz', '.xz' or '.zst' for compressed files), including those in the directories inside it (apart from hidden ones, like '.ipynb_checkpoints'), will be treated as if all of the filepaths for each had been provided when invoking the script, sorted by their path inside the directory. Multiple FASTA files provided in arguments will be processed in the same manner as if all selected at the same time by the GUI interface of the original `Fasta2Structure.py` NOTE: to get the output to match what the GUI gives, supply the filepaths as arguments left to rigth to match what the GUI would have top to bottom.", metavar="INPUT_FASTA")
+variable_site_engines = ('numpy', 'python')
+parser.add_argument("--include", action="append", default=[], metavar="GLOB", help="When a directory is given, only use the files \
+    under it that match this glob pattern (like '*.fa.gz' or 'chr1/*.fas') instead of all the FASTA files. Can be given more than \
+    once. Patterns are matched against the end of the path inside the directory, so ones without a '/' are matched against just \
+    the file name.")
+parser.add_argument("--exclude", action="append", default=[], metavar="GLOB", help="When a directory is given, skip the files & \
+    directories under it that match this glob pattern. Can be given more than once.")
+parser.add_argument("--engine", choices=variable_site_engines, default=variable_site_engines[0], help="How to find the variable sites. 'numpy' \
+    (default) loads each alignment once into an array of bytes and checks all the columns at once. 'python' is the original column by \
+    column approach of `Fasta2Structure.py`. Both give the same results.")
+fasta_readers = ('native', 'biopython', 'mmap', 'stream')
+parser.add_argument("--reader", choices=fasta_readers, default=fasta_readers[0], help="How the FASTA files get read with the 'numpy' \
+    engine. 'native' (default) is a minimal reader built in to this script that reads the files in large blocks straight into an \
+    array of bytes. 'biopython' reads them with `Bio.AlignIO` like the original does. 'mmap' memory-maps each file and copies out only \
+    the variable sites, for alignments too big to read in whole; it needs every record wrapped at the same line width and uses the \
+    'native' reader for any file that isn't, or that is compressed. 'stream' reads each file twice, one record at a time, keeping only a couple of bytes \
+    per site between the passes, for alignments of more samples than fit in memory. (The 'python' engine always uses Biopython.)")
+parser.add_argument("--spacing", choices=spacing_modes, default=spacing_modes[0], help="Spacing of the genotype calls in the output. \
+    'legacy' (default) matches the output of the original `Fasta2Structure.py` exactly, with two spaces after each base and one after \
+    missing data. 'compact' separates every genotype call by a single space.")
+parser.add_argument("--buffer-size", type=int, default=1024 * 1024, metavar="BYTES", help="Size in bytes of the buffer used when \
+    writing the output file row by row (default: %(default)s).")
+parser.add_argument("--jobs", type=int, default=1, metavar="N", help="Number of worker processes to use for reading the FASTA files & \
+    finding their variable sites when there is more than one file. The results are merged in the same order as the files are \
+    given, so the output is the same as with the default of 1, which processes the files one after another.")
+parser.add_argument("--threads", type=int, default=1, metavar="N", help="Number of threads to use within each FASTA file, for \
+    single alignments too big for one core, like whole-genome alignments. The alignment is split into blocks of columns for \
+    finding the variable sites & blocks of records for encoding them, worked on at the same time, & put back together in order, \
+    so the output is the same as with the default of 1. Works with the 'numpy' engine's 'native', 'biopython' & 'mmap' readers. \
+    With `--jobs` too, each worker process uses this many threads.")
+parser.add_argument("--cache-dir", metavar="DIRECTORY", help="Directory to keep a cache of the variable sites & encoded genotypes of \
+    each FASTA file in, keyed by a hash of the file contents. On later runs only files that are new or have changed get processed \
+    again. No cache is used if this isn't given.")
+parser.add_argument("--cache-size", type=int, default=1024 ** 3, metavar="BYTES", help="Most space in bytes the cache set with \
+    `--cache-dir` is allowed to take up; the least recently used entries are deleted at the end of a run to keep under this \
+    (default: %(default)s).")
+parser.add_argument("--compress-output", choices=compression_formats, help="Compress the output file as it is written, adding \
+    the matching extension ('.gz', '.xz' or '.zst') to its name. zstd needs the `zstandard` package. (Input FASTA files compressed \
+    with gzip, bgzip, xz or zstd, ending in '.gz', '.bgz', '.xz' or '.zst', are always read without decompressing them to disk \
+    first. In a manifest, an output path ending in one of those extensions is compressed to match.)")
+parser.add_argument("--legacy-log", action="store_true", help="Log the full list of variable sites of each FASTA file, like the \
+    original `Fasta2Structure.py`. Without this, `log.log` only gets a summary of them (the number, the first & last, and the \
+    first runs of consecutive sites) so it stays small for loci with very many variable sites.")
+parser.add_argument("--sites-file", metavar="FILE", help="Write the full list of variable sites of each FASTA file to FILE, \
+    gzipped, as one line per file with the file path, a tab & the sites separated by spaces.")
+parser.add_argument("--write-loci", metavar="DIRECTORY", help=f"Also save each FASTA file's locus (the record IDs, the positions of \
+    the variable sites & the encoded genotypes, along with a hash of the FASTA file) to DIRECTORY as a compact binary locus file \
+    named after the FASTA file & ending in '{locus_file_extension}' (FASTA files with the same name from different directories get \
+    theirs in subdirectories following those directories). Locus files can be given as INPUT_FASTA just like FASTA files, \
+    in any mix, and are loaded without reading any FASTA, so loci can be put together or exported again quickly.")
+parser.add_argument("--sidecar", action="store_true", help="Also write a small sidecar file next to the output (named after it, \
+    ending in '.loci.json') listing the individuals & the number of columns of each locus, so loci can be added to the output \
+    later with `--append-to`.")
+parser.add_argument("--append-to", metavar="STRUCTURE_FILE", help="Add the loci in INPUT_FASTA to the end of STRUCTURE_FILE, made \
+    earlier with `--sidecar`, instead of making a new output. Only the new loci are processed; the result is the same as converting \
+    all of the loci together. Uses the spacing STRUCTURE_FILE was made with.")
+parser.add_argument("--manifest", metavar="MANIFEST", help="Run all the jobs listed in MANIFEST in this one run instead of \
+    converting INPUT_FASTA. Each job gives an 'input' (FASTA file(s) or a directory, as for INPUT_FASTA), an 'output' path, and \
+    optionally a 'log' path & its own 'engine', 'reader' & 'spacing'. A manifest ending in '.json' is a list of objects with those \
+    keys; otherwise it is tab-separated values with a header line naming the columns & several inputs separated by ';'. With \
+    `--jobs`, the files of all the jobs share one pool of worker processes. The other options here apply to all the jobs.")
+parser.add_argument("--profile", action="store_true", help="Write a report, as JSON, of the wall time, CPU time & peak memory \
+    (RSS) of each stage of reading each FASTA file and of writing the output, along with the bytes read, records parsed & variable \
+    sites found for each file, the totals for the run and the slowest files.")
+parser.add_argument("--profile-report", default="profile.json", metavar="REPORT", help="File to write the report made with \
+    `--profile` to (default: %(default)s).")
+def parse_shard(text):
+    '''
+    Turns the 'I/N' given with `--shard` into the shard number & the number
+    of shards.
+    '''
+    try:
+        shard_index, shard_count = (int(number) for number in text.split("/"))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected I/N, like 3/16, not {text!r}")
+    if not 1 <= shard_index <= shard_count:
+        raise argparse.ArgumentTypeError(f"the shard number has to be from 1 to {shard_count}")
+    return shard_index, shard_count
+
+parser.add_argument("--shard", type=parse_shard, metavar="I/N", help="Only read shard I of N of the loci in INPUT_FASTA \
+    (every Nth file, starting with file I) and save them to a shard file instead of making the output, so a big project can be \
+    split across separate jobs, such as an array job on a cluster, with each given the same INPUT_FASTA. Put the shards \
+    together with `--merge`.")
+parser.add_argument("--shard-output", metavar="SHARD_FILE", help=f"Where to save the shard file made with `--shard` (default: \
+    'shard_I_of_N{shard_file_extension}').")
+parser.add_argument("--merge", action="store_true", help=f"Put together the shard files given as INPUT_FASTA (or the ones ending \
+    in '{shard_file_extension}' in a directory given), made with `--shard` for every shard of a project, into the STRUCTURE file. \
+    The output & log are the same as converting all the FASTA files in one run.")
+parser.add_argument("--serve", action="store_true", help="Run as a service that keeps a pool of `--jobs` worker processes & the \
+    loci it has read in memory, taking conversion jobs over a Unix domain socket until stopped, instead of converting INPUT_FASTA. \
+    Send jobs with `improved_Fasta2Structure_client.py`, which takes the same arguments as this script, so each job skips \
+    starting Python & importing everything.")
+parser.add_argument("--socket", metavar="PATH", help="Unix domain socket for `--serve` to listen on (default: a socket for the \
+    user in the temporary directory, which is where the client looks too).")
+parser.add_argument("--memory-cache-size", type=int, default=1024 ** 3, metavar="BYTES", help="Most memory in bytes each \
+    process of `--serve` uses to keep the loci it has read (default: %(default)s).")
 
 
 
@@ -285,63 +2561,175 @@ Other triggers for USAGE to display:
 The GUI will run if a graphical display can be connected to by Tkinter and the script is called with no arguments.
 '''
 
-# If the script is running in a terminal/on command line or in Jupyter run headlessly and so Tkinter cannot connect to a graphical display and no arguments are provided into the call to the script, then print general USAGE info and exit.
-# This should then remind user the paths of the file or files to act on need to 
-# be provided.
-if (not Tkinter_can_connect_to_graphical_display) and len(sys.argv) == 1:
-    parser.print_help()
-    print ("\n\n****---------------------------------------------------------------***")
-    print("The usage information has been printed above and the script exited\nwith an error below just to highlight that because you are running\nthis where the script can connect to a graphical display to show the\nuser interface, you need to specify files to act on as arguments in\nthe call invoking the script.\nTHAT IS THE ONLY 'ERROR' AT THIS TIME.\n****---------------------------------------------------------------***")
-    sys.exit(1)  #`sys.exit(0)` could be used to print usage and just end, but I worry what triggered that occurence may not be clear for those new to running command line scripts, and so putting error at bottom that gets highlighted in pink in Jupyter should draw attention to bottom where note above will be put. 
+def main(argv=None):
+    '''
+    Decides whether to run the GUI or the command-line mode and runs it. Kept
+    in a function called only when the file is run as a script, so that the
+    worker processes used with `--jobs` can import this file without running
+    the conversion (or opening windows) all over again. `argv` are the
+    arguments to use instead of those the script was run with, as
+    `run_service_job()` uses.
+    '''
+    global root, preview_textbox, output_label # used by `browse_files()` when GUI runs
+    argv = sys.argv[1:] if argv is None else argv
+    # `force` so each job of a service gets a new `log.log` in its own directory
+    logging.basicConfig(filename='log.log', filemode='w', format='%(name)s - %(levelname)s - %(message)s', level=logging.INFO,
+                        force=True)
+
+    # Decide to use GUI interface or stick to stdin, stderr, stdout as interface. Give feedback if not providing arguments
+    # Check if the script is running in a terminal or situation like inside Jupyter, i.e., if Tkinter cannot connect to a graphical display. 
+    # FULL DESCRIPTION OF SITUATION: Tkinter is installed and importable because it is part of the standard library, but if the original Fasta2Structure.py script (https://github.com/AdamBessa/Fasta2Structure/blob/9721bb545a8277c3ddbca74bc987e89563475bce/Fasta2Structure.py) is run on the command line with `python Fasta2Structure.py` or in Jupyter with `%run Fasta2Structure.py`,it gives `_tkinter.TclError: no display name and no $DISPLAY environment variable` because it cannot initialize a graphical window due to the absence of a display server connection." In this situatuon I then want to run using arguments to specify the file or directory to act on. If there is no arguments, then display USAGE/help via argparse.
+    # Only need to know that when there are no arguments though, so when there
+    # are, Tkinter isn't even imported & no display is probed for.
+    Tkinter_can_connect_to_graphical_display = False
+    if not argv:
+        import tkinter as tk
+        from tkinter.scrolledtext import ScrolledText
+        try:
+            root = tk.Tk()
+            Tkinter_can_connect_to_graphical_display= True
+            root.withdraw()  # Destroy the test Tk window
+        except (tk.TclError): # handle the error `_tkinter.TclError: no display name and no $DISPLAY environment variable` when running in command line where Tkinter GUI cannot start up properly
+            Tkinter_can_connect_to_graphical_display = False
+
 
+    # If the script is running in a terminal/on command line or in Jupyter run headlessly and so Tkinter cannot connect to a graphical display and no arguments are provided into the call to the script, then print general USAGE info and exit.
+    # This should then remind user the paths of the file or files to act on need to 
+    # be provided.
+    if (not Tkinter_can_connect_to_graphical_display) and not argv:
+        parser.print_help()
+        print ("\n\n****---------------------------------------------------------------***")
+        print("The usage information has been printed above and the script exited\nwith an error below just to highlight that because you are running\nthis where the script can connect to a graphical display to show the\nuser interface, you need to specify files to act on as arguments in\nthe call invoking the script.\nTHAT IS THE ONLY 'ERROR' AT THIS TIME.\n****---------------------------------------------------------------***")
+        sys.exit(1)  #`sys.exit(0)` could be used to print usage and just end, but I worry what triggered that occurence may not be clear for those new to running command line scripts, and so putting error at bottom that gets highlighted in pink in Jupyter should draw attention to bottom where note above will be put. 
 
 
 
-# If the script is called and no arguments are provided and TKINTER CAN CONNECT TO A GRAPHICAL DISPLAY, run the GUI
-if Tkinter_can_connect_to_graphical_display and len(sys.argv) == 1:
-    # The original Tkinter code from https://github.com/AdamBessa/Fasta2Structure/blob/9721bb545a8277c3ddbca74bc987e89563475bce/Fasta2Structure.py here
-    root = tk.Tk()
-    root.title("Fasta to Structure")
 
-    browse_button = tk.Button(root, text="Select FASTA files", command=browse_files)
-    browse_button.pack(pady=20)
+    # If the script is called and no arguments are provided and TKINTER CAN CONNECT TO A GRAPHICAL DISPLAY, run the GUI
+    if Tkinter_can_connect_to_graphical_display and not argv:
+        # The original Tkinter code from https://github.com/AdamBessa/Fasta2Structure/blob/9721bb545a8277c3ddbca74bc987e89563475bce/Fasta2Structure.py here
+        root = tk.Tk()
+        root.title("Fasta to Structure")
 
-    preview_label = tk.Label(root, text="Preview:")
-    preview_label.pack()
+        browse_button = tk.Button(root, text="Select FASTA files", command=browse_files)
+        browse_button.pack(pady=20)
 
-    preview_textbox = ScrolledText(root, height=10)
-    preview_textbox.pack(pady=10)
+        preview_label = tk.Label(root, text="Preview:")
+        preview_label.pack()
 
-    output_label = tk.Label(root, text="")
-    output_label.pack(pady=10)
+        preview_textbox = ScrolledText(root, height=10)
+        preview_textbox.pack(pady=10)
 
-    root.mainloop()
-# Since arguments were provided when the script, which we know because at this point we've already dealt with all the possibilities when no arguments provided, that is the file or directory the user wants to act on, and so we should continue on acting on that sticking to using stdin, stderr, and stdout for interaction. We don't need to concern ourselves with if Tkinter can connect to a graphical display because we should now have all the information that the windowed interface facilitates determining in the GUI situation.
-else:
-    # Parse the arguments
-    args = parser.parse_args()
-    # The section handling the conversion without using Tkinter GUI, i.e. CLI mode section.
-    # if more than one input file is provided, treat them as related, the way the
-    # original file iterated on them with `for i, filepath in enumerate(filepaths):`
-    # accumulating variable sites from each file.
-    # Otherwise check if provided argument is a directory and then process each FASTA in as if separate, or just process the one FASTA file as multi-sequence.
-    filepaths = sys.argv[1:]
-    if not filepaths:
-        print("No FASTA files provided. Please provide one or more FASTA file paths as command-line arguments or a path to a directory holding FASTA files to convert.")
-        sys.exit(1)
-    if len(args.input) > 1:
-        # Multiple input files, process them as the GUI does if specify three unrelated alignments 
-        logging.info(f'{len(args.input)} FASTA files selected.')
-        process_multiple_fastas_together(args.input)
-    elif os.path.isdir(args.input[0]):
-        # Input is a directory, process all FASTAs together like if each found 
-        # provided filepath
-        fasta_files = [os.path.join(args.input[0], f) for f in os.listdir(args.input[0]) 
-                       if f.endswith(fasta_extensions_allowed)]
-        logging.info(f'{len(fasta_files)} FASTA files selected.')
-        process_multiple_fastas_together(fasta_files)
+        output_label = tk.Label(root, text="")
+        output_label.pack(pady=10)
+
+        root.mainloop()
+    # Since arguments were provided when the script, which we know because at this point we've already dealt with all the possibilities when no arguments provided, that is the file or directory the user wants to act on, and so we should continue on acting on that sticking to using stdin, stderr, and stdout for interaction. We don't need to concern ourselves with if Tkinter can connect to a graphical display because we should now have all the information that the windowed interface facilitates determining in the GUI situation.
     else:
-        # Single input file, process it as a multi-sequence FASTA
-        logging.info(f'{len(args.input)} FASTA files selected.')
-        process_single_fasta(args.input[0])
+        # Parse the arguments
+        args = parser.parse_args(argv)
+        configure_variable_sites_log(legacy=args.legacy_log, sites_file=args.sites_file)
+        if args.serve:
+            try:
+                serve(args.socket, jobs=args.jobs, memory_cache_size=args.memory_cache_size)
+            except KeyboardInterrupt:
+                pass
+            except OSError as e:
+                parser.error(str(e))
+            sys.exit(0)
+        # The section handling the conversion without using Tkinter GUI, i.e. CLI mode section.
+        # if more than one input file is provided, treat them as related, the way the
+        # original file iterated on them with `for i, filepath in enumerate(filepaths):`
+        # accumulating variable sites from each file.
+        # Otherwise check if provided argument is a directory and then process each FASTA in as if separate, or just process the one FASTA file as multi-sequence.
+        if args.manifest:
+            try:
+                failed_jobs = run_manifest(args.manifest, engine=args.engine, spacing=args.spacing, buffer_size=args.buffer_size, jobs=args.jobs,
+                                           reader=args.reader, cache_dir=args.cache_dir, cache_size=args.cache_size, threads=args.threads)
+            except (OSError, ValueError, KeyError) as e:
+                parser.error(f"could not read the manifest {args.manifest}: {e}")
+            sys.exit(1 if failed_jobs else 0)
+        filepaths = args.input
+        if not filepaths:
+            print("No FASTA files provided. Please provide one or more FASTA file paths as command-line arguments or a path to a directory holding FASTA files to convert.")
+            sys.exit(1)
+        if args.merge:
+            shard_paths = []
+            for input_item in args.input:
+                if os.path.isdir(input_item):
+                    shard_paths.extend(sorted(entry.path for entry in os.scandir(input_item)
+                                              if entry.name.endswith(shard_file_extension)))
+                else:
+                    shard_paths.append(input_item)
+            output_filename = "Structure.str" + compression_format_extensions.get(args.compress_output, "")
+            try:
+                merge_shard_files(shard_paths, output_filename, spacing=args.spacing, buffer_size=args.buffer_size,
+                                  jobs=args.jobs, compression=args.compress_output, sidecar=args.sidecar)
+            except (OSError, ValueError, KeyError) as e:
+                parser.error(f"could not merge the shards: {e}")
+            print(f"Converted files saved as: {output_filename}")
+            sys.exit(0)
+        if args.shard:
+            if len(args.input) == 1 and os.path.isdir(args.input[0]):
+                filepaths, _ = discover_fasta_files(args.input[0], args.include, args.exclude)
+            elif any(os.path.isdir(input_item) for input_item in args.input):
+                filepaths = parse_inputs(args.input, args.include, args.exclude)
+            shard_index, shard_count = args.shard
+            shard_path = args.shard_output or f"shard_{shard_index}_of_{shard_count}{shard_file_extension}"
+            logging.info(f'{len(filepaths)} FASTA files selected.')
+            locus_count = write_shard_file(shard_path, filepaths, shard_index, shard_count, engine=args.engine,
+                                           reader=args.reader, jobs=args.jobs, cache_dir=args.cache_dir, threads=args.threads)
+            if args.cache_dir is not None:
+                trim_locus_cache(args.cache_dir, args.cache_size)
+            print(f"Shard {shard_index} of {shard_count} ({locus_count} of {len(filepaths)} loci) saved as: {shard_path}")
+            sys.exit(0)
+        if args.append_to:
+            if any(os.path.isdir(input_item) for input_item in args.input):
+                filepaths = parse_inputs(args.input, args.include, args.exclude)
+            logging.info(f'{len(filepaths)} FASTA files selected.')
+            try:
+                append_loci_to_structure_file(args.append_to, filepaths, engine=args.engine, reader=args.reader, cache_dir=args.cache_dir,
+                                              buffer_size=args.buffer_size, threads=args.threads)
+            except (OSError, ValueError, KeyError) as e:
+                parser.error(f"could not add to {args.append_to}: {e}")
+            if args.cache_dir is not None:
+                trim_locus_cache(args.cache_dir, args.cache_size)
+            print(f"Converted files added to: {args.append_to}")
+            sys.exit(0)
+        if len(args.input) > 1:
+            # Multiple input files, process them as the GUI does if specify three unrelated alignments 
+            # (with any directories among them replaced by the FASTA files in them)
+            filepaths = args.input
+            if any(os.path.isdir(input_item) for input_item in args.input):
+                filepaths = parse_inputs(args.input, args.include, args.exclude)
+            logging.info(f'{len(filepaths)} FASTA files selected.')
+            try:
+                get_locus_dirs(filepaths, args.write_loci)
+            except ValueError as e:
+                parser.error(str(e))
+            process_multiple_fastas_together(filepaths, engine=args.engine, spacing=args.spacing, buffer_size=args.buffer_size, jobs=args.jobs, reader=args.reader,
+                                                 cache_dir=args.cache_dir, cache_size=args.cache_size, profile_path=args.profile_report if args.profile else None, sidecar=args.sidecar, locus_dir=args.write_loci, compression=args.compress_output,
+                                                 threads=args.threads)
+        elif os.path.isdir(args.input[0]):
+            # Input is a directory, process all FASTAs together like if each found 
+            # provided filepath, in order of their paths inside the directory
+            fasta_files, file_sizes = discover_fasta_files(args.input[0], args.include, args.exclude)
+            logging.info(f'{len(fasta_files)} FASTA files selected.')
+            print(f"Found {len(fasta_files)} FASTA files ({sum(file_sizes)} bytes) in {args.input[0]}")
+            try:
+                get_locus_dirs(fasta_files, args.write_loci)
+            except ValueError as e:
+                parser.error(str(e))
+            process_multiple_fastas_together(fasta_files, engine=args.engine, spacing=args.spacing, buffer_size=args.buffer_size, jobs=args.jobs, reader=args.reader,
+                                                 cache_dir=args.cache_dir, cache_size=args.cache_size, profile_path=args.profile_report if args.profile else None, sidecar=args.sidecar, locus_dir=args.write_loci, compression=args.compress_output,
+                                                 file_sizes=file_sizes, threads=args.threads)
+        else:
+            # Single input file, process it as a multi-sequence FASTA
+            logging.info(f'{len(args.input)} FASTA files selected.')
+            process_single_fasta(args.input[0], engine=args.engine, spacing=args.spacing, buffer_size=args.buffer_size, reader=args.reader,
+                                 cache_dir=args.cache_dir, cache_size=args.cache_size, profile_path=args.profile_report if args.profile else None, sidecar=args.sidecar, locus_dir=args.write_loci, compression=args.compress_output,
+                                 threads=args.threads)
+
 
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+#!/usr/bin/env python
+# `improved_Fasta2Structure_client.py`
+####-----
+'''
+Thin client for the service run with `python improved_Fasta2Structure.py --serve`.
+It takes the same arguments as `improved_Fasta2Structure.py` and sends them,
+along with the current directory, to the service, which runs the conversion
+there just like the script would and sends back what it printed. The output
+files & `log.log` end up in the current directory the same as running the
+script. Only the standard library gets imported here, so it starts quickly.
+
+Use `--socket PATH` as the first argument to talk to a service listening
+somewhere other than the default (or set FASTA2STRUCTURE_SOCKET), and
+`--stop-server` on its own to stop the service.
+
+Run like:
+python improved_Fasta2Structure_client.py Example_data/Datasets/ITS.fas Example_data/Datasets/trnD-trnT.fas
+'''
+####-----
+import sys
+import os
+import json
+import socket
+
+
+
+###---------------------------HELPER FUNCTIONS-------------------------------###
+
+def get_default_socket_path():
+    '''
+    Returns the path of the socket the service listens on when no other is
+    given, one per user in the temporary directory. Kept the same as in
+    `improved_Fasta2Structure.py`.
+    '''
+    import tempfile
+    return os.path.join(tempfile.gettempdir(), f"fasta2structure-{getattr(os, 'getuid', lambda: 0)()}.sock")
+
+
+def send_request(socket_path, request):
+    '''
+    Sends `request` to the service at `socket_path` as a line of JSON and
+    returns the line of JSON it answers with, once the job is done.
+    '''
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as connection:
+        connection.connect(socket_path)
+        connection.sendall((json.dumps(request) + "\n").encode())
+        with connection.makefile('rb') as answer:
+            return json.loads(answer.readline())
+
+###--------------------------END OF HELPER FUNCTIONS--------------------------###
+
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    socket_path = os.environ.get("FASTA2STRUCTURE_SOCKET") or get_default_socket_path()
+    if argv[:1] == ["--socket"] and len(argv) > 1:
+        socket_path, argv = argv[1], argv[2:]
+    request = {'stop': True} if argv == ["--stop-server"] else {'argv': argv, 'cwd': os.getcwd()}
+    try:
+        response = send_request(socket_path, request)
+    except (OSError, ValueError) as e:
+        print(f"Could not reach the service at {socket_path} ({e}). Start it with "
+              "`python improved_Fasta2Structure.py --serve`.", file=sys.stderr)
+        return 2
+    sys.stdout.write(response['stdout'])
+    sys.stderr.write(response['stderr'])
+    return response['exit_code']
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -63,6 +63,29 @@ log_tests_prefix = "tests_results_log"
 tests_log = f"{log_tests_prefix}{now.strftime('%b%d%Y%H%M')}.txt" #log 
 # wtih a date/timestamp
 
+# The example datasets get run through `improved_Fasta2Structure.py` once for 
+# each of these and the results of each checked against what the original 
+# `Fasta2Structure.py` gives. Key is a tag used to keep the results apart & the
+# value is the extra arguments to add to the call to the script.
+script_variants_to_check = {
+    "python_engine": "--engine python",
+    "numpy_engine": "--engine numpy",
+    "small_write_buffer": "--buffer-size 64",
+    "parallel_jobs": "--jobs 3",
+    "biopython_reader": "--reader biopython",
+    "mmap_reader": "--reader mmap",
+    "stream_reader": "--reader stream",
+    "locus_cache": f"--cache-dir {dir_with_new_results}/locus_cache",
+    "profiled": f"--profile --profile-report {dir_with_new_results}/profile.json",
+    "threads": "--threads 3",
+    "mmap_reader_threads": "--reader mmap --threads 3",
+}
+
+
+# Added to the call to the script for every variant so `log.log` lists all the
+# variable sites, like the original, & can be compared.
+args_for_all_variants = "--legacy-log"
+
 #
 #*******************************************************************************
 #**********************END USER ADJUSTABLE VARIABLES****************************
@@ -112,6 +135,26 @@ def generate_output_file_name_AS_IMPROVED_DOES(file_name):
 def get_example_datasets_location():
     return example_datasets_location
 
+def get_script_variants_to_check():
+    return list(script_variants_to_check)
+
+# The other test files run the script from temporary directories, so they use
+# these absolute paths instead of the ones relative to the repo set up above.
+def get_repo_root():
+    return os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def get_script_path():
+    return os.path.join(get_repo_root(), "improved_Fasta2Structure.py")
+
+def get_gui_results_location():
+    return os.path.join(get_repo_root(), "tests/results_observed_from_original_with_Example_data")
+
+def get_example_datasets_path():
+    return os.path.join(get_repo_root(), example_datasets_location)
+
+def get_all_three_example_paths():
+    return [os.path.join(get_example_datasets_path(), name) for name in ("ITS.fas", "trnD-trnT.fas", "trnH-trnK.fas")]
+
 def make_temp_base_filename(filename_prefix):
     '''
     Takes a string and makes a base file name that nothing should match 
@@ -150,30 +193,34 @@ def pytest_configure(config):
     #make the results for the individual files in the `Example_data/Datasets`
     # Iterate on names in `Example_data/Datasets/` & process each one separate
     # fasta_fps = glob.glob(f'{example_datasets_location}/*.fas')
-    ind_results_noms = [] # while making collect the names
-    ind_log_noms = []
-    for filename in os.listdir(example_datasets_location):
-        if fnmatch.fnmatch(filename, '*.fas'):
-            unique_namePrefix_for_new = make_temp_base_filename(filename)
-            full_path2match = os.path.join(example_datasets_location, filename)
-            #make each result, moving to `dir_with_new_results` with better name
-            os.system(f'python improved_Fasta2Structure.py {full_path2match}')
-            result_str = generate_output_file_name_AS_IMPROVED_DOES(filename)
-            unique_result_nom = f"{unique_namePrefix_for_new}_Structure.str"
-            unique_log_nom = f"{unique_namePrefix_for_new}_log.log"
-            move(result_str, f"{dir_with_new_results}/{unique_result_nom}")
-            ind_results_noms.append(unique_result_nom)
-            move("log.log", f"{dir_with_new_results}/{unique_log_nom}")
-            ind_log_noms.append(unique_log_nom)
-    
-
-    # make the result for all three genes targeted at once
+    ind_results_noms = {} # while making collect the names, for each variant
+    ind_log_noms = {}
+    unique_prefix_for_with_three = {}
     three_nom_prefix = "from_all_three_at_once"
-    unique_prefix_for_with_three = make_temp_base_filename(three_nom_prefix)
-    os.system('python improved_Fasta2Structure.py Example_data/Datasets/ITS.fas Example_data/Datasets/trnD-trnT.fas Example_data/Datasets/trnH-trnK.fas')
-    # move the results to `dir_with_new_results` & give better name
-    move("Structure.str", f"{dir_with_new_results}/{unique_prefix_for_with_three}_Structure.str")
-    move("log.log", f"{dir_with_new_results}/{unique_prefix_for_with_three}_log.log")
+    for variant, extra_args in script_variants_to_check.items():
+        ind_results_noms[variant] = []
+        ind_log_noms[variant] = []
+        for filename in os.listdir(example_datasets_location):
+            if fnmatch.fnmatch(filename, '*.fas'):
+                unique_namePrefix_for_new = make_temp_base_filename(filename)
+                full_path2match = os.path.join(example_datasets_location, filename)
+                #make each result, moving to `dir_with_new_results` with better name
+                os.system(f'python improved_Fasta2Structure.py {args_for_all_variants} {extra_args} {full_path2match}')
+                result_str = generate_output_file_name_AS_IMPROVED_DOES(filename)
+                unique_result_nom = f"{unique_namePrefix_for_new}_Structure.str"
+                unique_log_nom = f"{unique_namePrefix_for_new}_log.log"
+                move(result_str, f"{dir_with_new_results}/{unique_result_nom}")
+                ind_results_noms[variant].append(unique_result_nom)
+                move("log.log", f"{dir_with_new_results}/{unique_log_nom}")
+                ind_log_noms[variant].append(unique_log_nom)
+        
+
+        # make the result for all three genes targeted at once
+        unique_prefix_for_with_three[variant] = make_temp_base_filename(three_nom_prefix)
+        os.system(f'python improved_Fasta2Structure.py {args_for_all_variants} {extra_args} Example_data/Datasets/ITS.fas Example_data/Datasets/trnD-trnT.fas Example_data/Datasets/trnH-trnK.fas')
+        # move the results to `dir_with_new_results` & give better name
+        move("Structure.str", f"{dir_with_new_results}/{unique_prefix_for_with_three[variant]}_Structure.str")
+        move("log.log", f"{dir_with_new_results}/{unique_prefix_for_with_three[variant]}_log.log")
 
     # To set up for making fixtures to pass information to the tests store the 
     # data in pytest cache. (Need to use pytest cache because "it's important to note that pytest_configure runs before any fixtures are created, so you can't directly use fixtures to pass data from this function.")
@@ -189,11 +236,11 @@ def pytest_configure(config):
 # available to tests
 @pytest.fixture(scope="session")
 def ind_results_noms(pytestconfig):
-    return pytestconfig.cache.get('ind_results_noms', [])
+    return pytestconfig.cache.get('ind_results_noms', {})
 
 @pytest.fixture(scope="session")
 def ind_log_noms(pytestconfig):
-    return pytestconfig.cache.get('ind_log_noms', [])
+    return pytestconfig.cache.get('ind_log_noms', {})
 
 @pytest.fixture(scope="session")
 def three_nom_prefix(pytestconfig):
@@ -201,4 +248,4 @@ def three_nom_prefix(pytestconfig):
 
 @pytest.fixture(scope="session")
 def unique_prefix_for_with_three(pytestconfig):
-    return pytestconfig.cache.get('unique_prefix_for_with_three', [])
+    return pytestconfig.cache.get('unique_prefix_for_with_three', {})
@@ -0,0 +1,45 @@
+#!/usr/bin/env python
+# `test_append_loci.py`
+# Checks adding loci to an existing output with `--append-to` gives the same
+# result as converting all of the loci together.
+# Run this file like `pytest -v tests/test_append_loci.py` 
+import pytest
+import os
+import sys
+import filecmp
+import subprocess
+
+from conftest import get_script_path, get_gui_results_location, get_all_three_example_paths
+script_path = get_script_path()
+guiFasta2StructureDOTpy_results = get_gui_results_location()
+all_three = get_all_three_example_paths()
+
+
+
+def run_script(tmp_path, *args):
+    subprocess.run([sys.executable, script_path, *args], cwd=tmp_path, check=True, capture_output=True)
+
+def test_appending_locus_matches_results_from_original(tmp_path):
+    run_script(tmp_path, "--sidecar", *all_three[:2])
+    run_script(tmp_path, "--append-to", "Structure.str", all_three[2])
+    assert filecmp.cmp(tmp_path / "Structure.str",
+                       os.path.join(guiFasta2StructureDOTpy_results, "from_all_three_at_once_Structure.str"), shallow=False)
+
+@pytest.mark.parametrize("spacing", ["legacy", "compact"])
+def test_appending_pads_missing_and_new_individuals_like_converting_together(tmp_path, spacing):
+    loci = {
+        "first.fas": ">a\nACGT\n>b\nACGA\n",
+        "no_sites.fas": ">a\nAA\n>b\nAA\n>c\nAA\n",
+        "second.fas": ">d\nAT-\n>b\nAA?\n",
+        "third.fas": ">a\nGG\n>e\nGA\n",
+    }
+    for name, text in loci.items():
+        (tmp_path / name).write_text(text)
+    names = list(loci)
+    run_script(tmp_path, "--spacing", spacing, *names)
+    together = (tmp_path / "Structure.str").read_text()
+    (tmp_path / "Structure.str").unlink()
+    run_script(tmp_path, "--spacing", spacing, "--sidecar", names[0], names[1])
+    run_script(tmp_path, "--append-to", "Structure.str", names[2])
+    run_script(tmp_path, "--append-to", "Structure.str", names[3])
+    assert (tmp_path / "Structure.str").read_text() == together
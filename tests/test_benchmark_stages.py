@@ -0,0 +1,43 @@
+#!/usr/bin/env python
+# `test_benchmark_stages.py`
+# Checks the benchmarks in `benchmarks/benchmark_stages.py` run, on a tiny
+# synthetic dataset, & that going a stage at a time there gives the same
+# STRUCTURE file as the script does.
+# Run this file like `pytest -v tests/test_benchmark_stages.py` 
+import pytest
+import os
+import sys
+
+# make the benchmarks & the script importable when pytest is run from the repo root 
+from conftest import get_repo_root
+repo_root = get_repo_root()
+sys.path.insert(0, os.path.join(repo_root, "benchmarks"))
+sys.path.insert(0, repo_root)
+from benchmark_stages import generate_synthetic_alignments, benchmark_stages, stages
+from improved_Fasta2Structure import read_fasta_alignment, make_genotype_table, process_fasta_file, write_structure_file
+
+
+
+def test_synthetic_alignments_have_settings_asked_for(tmp_path):
+    filepaths = generate_synthetic_alignments(tmp_path, samples=50, length=130, loci=2, missing_fraction=0.5)
+    assert len(filepaths) == 2
+    for filepath in filepaths:
+        record_ids, matrix = read_fasta_alignment(filepath)
+        assert matrix.shape[1] == 130
+        assert 0 < len(record_ids) < 50
+
+def test_benchmark_stages_matches_script_output(tmp_path):
+    filepaths = generate_synthetic_alignments(tmp_path, samples=20, length=200, loci=3, missing_fraction=0.2)
+    stage_results = benchmark_stages(filepaths, tmp_path / "benchmark.str")
+    assert list(stage_results) == list(stages)
+    genotypes = make_genotype_table()
+    for filepath in filepaths:
+        process_fasta_file(filepath, genotypes, lambda x: None)
+    write_structure_file(tmp_path / "script.str", genotypes)
+    assert (tmp_path / "benchmark.str").read_text() == (tmp_path / "script.str").read_text()
+
+def test_synthetic_alignments_with_few_haplotypes(tmp_path):
+    filepaths = generate_synthetic_alignments(tmp_path, samples=60, length=300, loci=1, haplotypes=4)
+    record_ids, matrix = read_fasta_alignment(filepaths[0])
+    assert len(record_ids) == 60
+    assert len({row.tobytes() for row in matrix}) <= 4
@@ -0,0 +1,67 @@
+#!/usr/bin/env python
+# `test_compressed_files.py`
+# Checks compressed FASTA files are read just like the uncompressed ones, with
+# every reader, & that the output can be written compressed.
+# Run this file like `pytest -v tests/test_compressed_files.py` 
+import pytest
+import os
+import sys
+import gzip
+import lzma
+import shutil
+import filecmp
+import subprocess
+
+from conftest import get_script_path, get_gui_results_location, get_example_datasets_path
+script_path = get_script_path()
+guiFasta2StructureDOTpy_results = get_gui_results_location()
+example_datasets_location = get_example_datasets_path()
+all_three_result = os.path.join(guiFasta2StructureDOTpy_results, "from_all_three_at_once_Structure.str")
+example_names = ("ITS.fas", "trnD-trnT.fas", "trnH-trnK.fas")
+
+
+
+def compress(source, destination, compression):
+    with open(source, "rb") as source_file:
+        data = source_file.read()
+    if compression == "gzip":
+        compressed = gzip.compress(data)
+    elif compression == "bgzip":
+        # bgzip files are many gzip members one after another
+        compressed = b"".join(gzip.compress(data[start:start + 65280]) for start in range(0, len(data), 65280))
+    elif compression == "xz":
+        compressed = lzma.compress(data)
+    else:
+        zstandard = pytest.importorskip("zstandard")
+        compressed = zstandard.ZstdCompressor().compress(data)
+    with open(destination, "wb") as destination_file:
+        destination_file.write(compressed)
+
+extensions = {"gzip": ".gz", "bgzip": ".bgz", "xz": ".xz", "zstd": ".zst"}
+
+@pytest.mark.parametrize("compression", list(extensions))
+@pytest.mark.parametrize("reader_args", [[], ["--reader", "stream"], ["--reader", "mmap"], ["--reader", "biopython"],
+                                         ["--engine", "python"]])
+def test_compressed_inputs_match_results_from_original(tmp_path, compression, reader_args):
+    for name in example_names:
+        compress(os.path.join(example_datasets_location, name), tmp_path / (name + extensions[compression]), compression)
+    inputs = [name + extensions[compression] for name in example_names]
+    subprocess.run([sys.executable, script_path, *reader_args, *inputs], cwd=tmp_path, check=True, capture_output=True)
+    assert filecmp.cmp(tmp_path / "Structure.str", all_three_result, shallow=False)
+
+def test_directory_of_compressed_files_is_found(tmp_path):
+    (tmp_path / "loci").mkdir()
+    compress(os.path.join(example_datasets_location, "ITS.fas"), tmp_path / "loci" / "ITS.fas.gz", "gzip")
+    shutil.copy(os.path.join(example_datasets_location, "trnD-trnT.fas"), tmp_path / "loci")
+    (tmp_path / "loci" / "notes.txt.gz").write_bytes(gzip.compress(b"not a FASTA file"))
+    subprocess.run([sys.executable, script_path, "--legacy-log", "loci"], cwd=tmp_path, check=True, capture_output=True)
+    assert "2 FASTA files selected." in (tmp_path / "log.log").read_text()
+
+@pytest.mark.parametrize("compression, decompress", [("gzip", gzip.decompress), ("xz", lzma.decompress)])
+def test_compressed_output(tmp_path, compression, decompress):
+    compress(os.path.join(example_datasets_location, "ITS.fas"), tmp_path / "ITS.fas.gz", "gzip")
+    subprocess.run([sys.executable, script_path, "--compress-output", compression, "ITS.fas.gz"], cwd=tmp_path, check=True,
+                   capture_output=True)
+    output_path = tmp_path / ("ITS_Structure.str" + extensions[compression])
+    with open(os.path.join(guiFasta2StructureDOTpy_results, "from_ITS.fas_Structure.str"), "rb") as expected_file:
+        assert decompress(output_path.read_bytes()) == expected_file.read()
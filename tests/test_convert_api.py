@@ -0,0 +1,53 @@
+#!/usr/bin/env python
+# `test_convert_api.py`
+# Checks `convert()` gives in memory the same genotypes as the STRUCTURE file
+# the script writes, & that it doesn't write files or set up logging.
+# Run this file like `pytest -v tests/test_convert_api.py` 
+import pytest
+import sys
+import subprocess
+import numpy as np
+
+from conftest import get_repo_root, get_script_path, get_all_three_example_paths
+repo_root = get_repo_root()
+script_path = get_script_path()
+all_three = get_all_three_example_paths()
+sys.path.insert(0, repo_root)
+from improved_Fasta2Structure import convert
+
+
+
+@pytest.mark.parametrize("jobs", [1, 2])
+def test_convert_matches_structure_file(tmp_path, jobs):
+    # an individual missing from a locus, an unrecognized base & a broken file
+    (tmp_path / "extra.fas").write_text(">new1\nACNT\n>new2\nACGA\n")
+    (tmp_path / "broken.fas").write_text(">a\nAC\n>b\nA\n")
+    filepaths = all_three + [str(tmp_path / "extra.fas"), str(tmp_path / "broken.fas")]
+    subprocess.run([sys.executable, script_path, "--spacing", "compact", *filepaths], cwd=tmp_path, check=True,
+                   capture_output=True)
+    rows = [line.split(" ") for line in (tmp_path / "Structure.str").read_text().splitlines()]
+
+    result = convert(filepaths, jobs=jobs)
+    assert result['individual_ids'] == [row[0] for row in rows]
+    assert result['genotypes'].dtype == np.int8
+    assert result['genotypes'].tolist() == [[int(code) for code in row[1:]] for row in rows]
+    loci = result['loci']
+    assert [locus['filepath'] for locus in loci] == filepaths
+    assert [locus['columns'][1] - locus['columns'][0] for locus in loci] == [len(locus['variable_sites']) for locus in loci]
+    assert loci[3]['variable_sites'] == [2, 3]
+    assert [locus['error'] is None for locus in loci] == [True] * 4 + [False]
+    assert "same length" in loci[4]['error']
+
+def test_convert_has_no_side_effects(tmp_path):
+    # run in a fresh interpreter so nothing else has set up logging already
+    code = f"""
+import os, sys, logging
+sys.path.insert(0, {repo_root!r})
+from improved_Fasta2Structure import convert
+result = convert({all_three[0]!r})
+assert not logging.getLogger().handlers
+assert os.listdir() == []
+print(len(result['individual_ids']))
+"""
+    completed = subprocess.run([sys.executable, "-c", code], cwd=tmp_path, check=True, capture_output=True, text=True)
+    assert int(completed.stdout) > 0 and completed.stderr == ""
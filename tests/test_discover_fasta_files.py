@@ -0,0 +1,67 @@
+#!/usr/bin/env python
+# `test_discover_fasta_files.py`
+# Checks finding the FASTA files under a directory searches the directories
+# inside it, gives them in a set order, follows the include & exclude glob
+# patterns & adds up their sizes.
+# Run this file like `pytest -v tests/test_discover_fasta_files.py` 
+import pytest
+import os
+import sys
+import shutil
+import filecmp
+import subprocess
+
+from conftest import get_repo_root, get_script_path, get_gui_results_location, get_example_datasets_path
+repo_root = get_repo_root()
+script_path = get_script_path()
+guiFasta2StructureDOTpy_results = get_gui_results_location()
+example_datasets_location = get_example_datasets_path()
+sys.path.insert(0, repo_root)
+from improved_Fasta2Structure import discover_fasta_files, parse_inputs
+
+
+
+def make_tree(root, relative_paths):
+    for relative_path in relative_paths:
+        path = root / relative_path
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(">a\nA\n" * (len(relative_path) % 3 + 1))
+
+def test_discovery_is_recursive_sorted_and_filtered(tmp_path):
+    make_tree(tmp_path, ["chr2/b.fas", "chr10/a.fa", "chr2/a.fasta.gz", "chr2/skip/c.fas", "notes.txt", "z.fas", "chr1/x/y/d.fa"])
+    filepaths, sizes = discover_fasta_files(tmp_path, threads=3)
+    relative = [os.path.relpath(path, tmp_path).replace(os.sep, "/") for path in filepaths]
+    assert relative == ["chr1/x/y/d.fa", "chr10/a.fa", "chr2/a.fasta.gz", "chr2/b.fas", "chr2/skip/c.fas", "z.fas"]
+    assert sizes == [os.path.getsize(path) for path in filepaths]
+    filepaths = discover_fasta_files(tmp_path, include=["*.fas"], exclude=["skip", "z.*"])[0]
+    assert [os.path.relpath(path, tmp_path).replace(os.sep, "/") for path in filepaths] == ["chr2/b.fas"]
+    filepaths = discover_fasta_files(tmp_path, include=["chr2/*"])[0]
+    assert [os.path.relpath(path, tmp_path).replace(os.sep, "/") for path in filepaths] == ["chr2/a.fasta.gz", "chr2/b.fas"]
+
+def test_discovery_skips_hidden_directories(tmp_path):
+    # Jupyter keeps '-checkpoint' copies of files in '.ipynb_checkpoints'
+    make_tree(tmp_path, ["ITS.fas", ".ipynb_checkpoints/ITS-checkpoint.fas", "chr1/a.fas", "chr1/.git/b.fas", ".c.fas"])
+    filepaths = discover_fasta_files(tmp_path)[0]
+    assert [os.path.relpath(path, tmp_path).replace(os.sep, "/") for path in filepaths] == [".c.fas", "ITS.fas", "chr1/a.fas"]
+    # a hidden directory given as the one to search is still searched
+    assert discover_fasta_files(tmp_path / ".ipynb_checkpoints")[0] == [str(tmp_path / ".ipynb_checkpoints" / "ITS-checkpoint.fas")]
+
+def test_parse_inputs_expands_directories_and_skips_others(tmp_path, capsys):
+    make_tree(tmp_path, ["loci/b.fas", "loci/a.fas", "single.fa", "other.txt"])
+    assert parse_inputs([str(tmp_path / "single.fa"), str(tmp_path / "loci"), str(tmp_path / "other.txt")]) == \
+        [str(tmp_path / "single.fa"), str(tmp_path / "loci" / "a.fas"), str(tmp_path / "loci" / "b.fas")]
+    assert "other.txt" in capsys.readouterr().out
+
+@pytest.mark.parametrize("extra_args", [[], ["--jobs", "2"]])
+def test_nested_directory_converts_in_sorted_order(tmp_path, extra_args):
+    # sorted by path these come in the same order as the results were made with the GUI
+    for folder, name in (("a_first", "ITS.fas"), ("b_second/deeper", "trnD-trnT.fas"), ("c_third", "trnH-trnK.fas")):
+        (tmp_path / "loci" / folder).mkdir(parents=True)
+        shutil.copy(os.path.join(example_datasets_location, name), tmp_path / "loci" / folder)
+    result = subprocess.run([sys.executable, script_path, *extra_args, "loci"], cwd=tmp_path, check=True, capture_output=True,
+                            text=True)
+    total_bytes = sum(os.path.getsize(os.path.join(example_datasets_location, name))
+                      for name in ("ITS.fas", "trnD-trnT.fas", "trnH-trnK.fas"))
+    assert f"Found 3 FASTA files ({total_bytes} bytes)" in result.stdout
+    assert filecmp.cmp(tmp_path / "Structure.str",
+                       os.path.join(guiFasta2StructureDOTpy_results, "from_all_three_at_once_Structure.str"), shallow=False)
@@ -0,0 +1,167 @@
+#!/usr/bin/env python
+# `test_fasta_readers.py`
+# Checks the FASTA readers built in to `improved_Fasta2Structure.py` give the
+# same record IDs & sequences, or the same errors, as reading with 
+# `Bio.AlignIO` the way the original `Fasta2Structure.py` does.
+# Run this file like `pytest -v tests/test_fasta_readers.py` 
+import pytest
+import os
+import sys
+import fnmatch
+import numpy as np
+from Bio import AlignIO
+
+# make the script importable when pytest is run from the repo root 
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from improved_Fasta2Structure import read_fasta_alignment, read_locus, read_locus_memory_mapped, read_locus_streaming, collapse_haplotypes
+from improved_Fasta2Structure import get_variable_sites_numpy, encode_variable_sites, encode_sequences
+
+from conftest import get_example_datasets_location
+example_datasets_location = get_example_datasets_location()
+
+
+
+###---------------------------HELPER FUNCTIONS-------------------------------###
+
+def read_both_ways(file_path, block_size):
+    '''
+    Read the FASTA file with the native reader & with Biopython and return the
+    IDs & sequences (as bytes) each gave, or the type & message of the error
+    each raised.
+    '''
+    try:
+        record_ids, matrix = read_fasta_alignment(file_path, block_size=block_size)
+        native = (record_ids, [row.tobytes() for row in matrix])
+    except ValueError as e:
+        native = ("ValueError", str(e).split("\n")[0][:40])
+    try:
+        alignment = AlignIO.read(file_path, "fasta")
+        biopython = ([record.id for record in alignment], [bytes(record.seq) for record in alignment])
+    except ValueError as e:
+        biopython = ("ValueError", str(e).split("\n")[0][:40])
+    return native, biopython
+
+###--------------------------END OF HELPER FUNCTIONS--------------------------###
+
+
+
+awkward_files = [
+    ">a desc here\r\nAC GT\r\n\r\nAC\r\n>b\tx\rACGTAC\r>\nAAAAAA",  # mixed line endings, descriptions, empty ID
+    ">a\nACGT\n>b\nACG\n",  # ragged
+    "\n>a\nAC\n",  # blank line before first header
+    "",
+    ">only\n",
+]
+# Small block sizes make sure headers & lines split between blocks are handled.
+@pytest.mark.parametrize("block_size", [1, 5, 64, 8 * 1024 * 1024])
+@pytest.mark.parametrize("content", awkward_files)
+def test_native_reader_matches_biopython_on_awkward_files(tmp_path, content, block_size):
+    file_path = tmp_path / "awkward.fa"
+    file_path.write_bytes(content.encode())
+    native, biopython = read_both_ways(file_path, block_size)
+    assert native == biopython, f"Native reader gave {native!r} but Biopython gave {biopython!r}."
+
+@pytest.mark.parametrize("filename", [f for f in os.listdir(example_datasets_location) if fnmatch.fnmatch(f, '*.fas')])
+def test_native_reader_matches_biopython_on_example_data(filename):
+    native, biopython = read_both_ways(os.path.join(example_datasets_location, filename), 4096)
+    assert native == biopython, f"The native reader and Biopython don't give the same records for `{filename}`."
+
+
+
+# The memory-mapped reader gives back the encoded variable sites rather than the
+# sequences, so check it against what the 'native' reader leads to, which is
+# checked against Biopython above. Small blocks & tiles exercise the stitching.
+@pytest.mark.parametrize("filename", [f for f in os.listdir(example_datasets_location) if fnmatch.fnmatch(f, '*.fas')])
+def test_memory_mapped_reader_matches_native_reader_on_example_data(filename):
+    file_path = os.path.join(example_datasets_location, filename)
+    memory_mapped = read_locus_memory_mapped(file_path, columns_per_block=100, bytes_per_tile=1000)
+    assert memory_mapped is not None, f"The line layout of `{filename}` should be regular enough for the memory-mapped reader."
+    record_ids, codes, variable_sites = read_locus(file_path, reader="native")
+    assert memory_mapped[0] == record_ids and memory_mapped[2] == variable_sites
+    assert np.array_equal(memory_mapped[1], codes)
+
+# The 'stream' reader goes through the same checks as the 'mmap' one.
+@pytest.mark.parametrize("reader", ["mmap", "stream"])
+@pytest.mark.parametrize("content", awkward_files + [
+    ">a\r\nACG\r\nT\r\n>b\r\nACG\r\nA\r\n",  # wrapped with `\r\n`
+    ">a\nAC\nGT\n>b\nACG\nT\n",  # different line widths
+    ">a\nACGT\nAC\n>b\nACGA\nAA\n\n",  # trailing blank line
+    ">a\r\nACGT\r\nAC\r\n>b\r\nACGA\r\nAA\r\n\r\n",  # trailing blank line with `\r\n`
+    ">a\nACGT\nAC\n\n>b\nACGA\nAA\n",  # blank line after one record only
+    ">a\nACGT\nACG\n>b\nACGT\nAC\n\n",  # blank line making up the length
+    ">a\nACGT\nAC\n>b\nACGA\nA\n",  # really ragged
+])
+def test_other_readers_match_native_reader_on_awkward_files(tmp_path, content, reader):
+    file_path = tmp_path / "awkward.fa"
+    file_path.write_bytes(content.encode())
+    try:
+        native = read_locus(file_path, reader="native")
+        native = (native[0], native[1].tolist(), native[2])
+    except ValueError as e:
+        native = str(e)
+    try:
+        other = read_locus(file_path, reader=reader)
+        other = (other[0], other[1].tolist(), other[2])
+    except ValueError as e:
+        other = str(e)
+    assert other == native, f"The '{reader}' reader gave {other!r} but the 'native' reader gave {native!r}."
+
+@pytest.mark.parametrize("filename", [f for f in os.listdir(example_datasets_location) if fnmatch.fnmatch(f, '*.fas')])
+def test_streaming_reader_matches_native_reader_on_example_data(filename):
+    file_path = os.path.join(example_datasets_location, filename)
+    record_ids, codes, variable_sites = read_locus_streaming(file_path, block_size=4096)
+    native = read_locus(file_path, reader="native")
+    assert record_ids == native[0] and variable_sites == native[2]
+    assert np.array_equal(codes, native[1])
+
+def test_collapse_haplotypes_keeps_first_of_each_in_order():
+    matrix = np.frombuffer(b"ACGTACGTTTTTACGTAAAA", dtype=np.uint8).reshape(5, 4)
+    haplotypes, haplotype_of_record = collapse_haplotypes(matrix)
+    assert [row.tobytes() for row in haplotypes] == [b"ACGT", b"TTTT", b"AAAA"]
+    assert haplotype_of_record.tolist() == [0, 0, 1, 0, 2]
+    assert np.array_equal(haplotypes[haplotype_of_record], matrix)
+
+# Alignments with only a few distinct haplotypes among many records get
+# collapsed, and the codes fanned back out have to match the python engine.
+@pytest.mark.parametrize("reader", ["native", "stream", "biopython"])
+def test_repeated_haplotypes_give_same_locus_as_python_engine(tmp_path, reader):
+    haplotypes = ["ACGT-A", "ACTT?A", "GCGTNA"]
+    file_path = tmp_path / "repeated.fa"
+    file_path.write_text("".join(f">s{i}\n{haplotypes[(i * 7) % 3 if i % 4 else 0]}\n" for i in range(40)))
+    expected = read_locus(file_path, engine="python")
+    record_ids, codes, variable_sites = read_locus(file_path, reader=reader)
+    assert record_ids == expected[0] and list(variable_sites) == list(expected[2])
+    assert codes.tolist() == expected[1].tolist()
+
+# Splitting one alignment into blocks for threads has to give back the same
+# sites & codes, in the same order, including blocks without any variable sites
+# and more threads than records.
+@pytest.mark.parametrize("threads", [2, 3, 8])
+@pytest.mark.parametrize("shape", [(1, 0), (3, 5), (7, 130001), (40, 200000)])
+def test_threads_give_same_sites_and_codes(shape, threads):
+    rng = np.random.default_rng(0)
+    matrix = rng.choice(np.frombuffer(b"AAAAAAAAAAAAACGT-?N", dtype=np.uint8), size=shape)
+    matrix[:, :70000] = matrix[0, :70000]
+    matrix[::3] = matrix[0]
+    variable_sites = get_variable_sites_numpy(matrix)
+    assert get_variable_sites_numpy(matrix, threads=threads) == variable_sites
+    assert np.array_equal(encode_variable_sites(matrix, variable_sites, threads=threads),
+                          encode_sequences(matrix[:, variable_sites]))
+    haplotypes, haplotype_of_record = collapse_haplotypes(matrix, threads=threads)
+    assert np.array_equal(haplotypes[haplotype_of_record], matrix)
+
+@pytest.mark.parametrize("reader", ["native", "mmap"])
+def test_threads_give_same_locus_on_long_alignment(tmp_path, reader):
+    rng = np.random.default_rng(1)
+    rows = rng.choice(np.frombuffer(b"AAAAAAAAACGT-", dtype=np.uint8), size=(5, 300000))
+    file_path = tmp_path / "long.fa"
+    file_path.write_text("".join(f">s{i}\n" + "\n".join(row.tobytes().decode()[start:start + 60]
+                                                       for start in range(0, rows.shape[1], 60)) + "\n"
+                                 for i, row in enumerate(rows)))
+    expected = read_locus(file_path, reader=reader)
+    record_ids, codes, variable_sites = read_locus(file_path, reader=reader, threads=4)
+    assert record_ids == expected[0] and list(variable_sites) == list(expected[2])
+    assert np.array_equal(codes, expected[1])
+    if reader == "mmap":
+        threaded = read_locus_memory_mapped(file_path, columns_per_block=1000, bytes_per_tile=1000, threads=3)
+        assert list(threaded[2]) == list(expected[2]) and np.array_equal(threaded[1], expected[1])
@@ -0,0 +1,105 @@
+#!/usr/bin/env python
+# `test_genotype_table.py`
+# Checks the table of genotypes `improved_Fasta2Structure.py` gathers the loci
+# into gives the same rows as the original way of padding the strings for each
+# individual.
+# Run this file like `pytest -v tests/test_genotype_table.py` 
+import pytest
+import os
+import sys
+import contextlib
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+
+# make the script importable when pytest is run from the repo root 
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import improved_Fasta2Structure
+from improved_Fasta2Structure import (make_genotype_table, process_fasta_file, iterate_structure_rows,
+                                      convert_to_binary, add_locus, add_failed_locus, make_pad_strings,
+                                      format_genotypes, join_locus_segments, write_structure_file)
+
+
+
+def test_missing_and_repeated_individuals_match_original_padding(tmp_path):
+    first = tmp_path / "first.fas"
+    first.write_text(">a\nACGT\n>b\nACGA\n>a\nTCGA\n")
+    second = tmp_path / "second.fas"
+    second.write_text(">c\nAA\n>b\nAT\n")
+    broken = tmp_path / "broken.fas"
+    broken.write_text(">d\nAA\n>e\nA\n")
+    genotypes = make_genotype_table()
+    for filepath in (first, broken, second):
+        process_fasta_file(str(filepath), genotypes, lambda x: None)
+    # done by hand the way the original pads: 'a' repeats & its last record wins
+    expected = [
+        f"a {convert_to_binary('TA')} {' '} {'-9 '}\n",
+        f"b {convert_to_binary('AA')} {' '} {convert_to_binary('T')}\n",
+        f"c {'-9 -9 '} {' '} {convert_to_binary('A')}\n",
+    ]
+    assert list(iterate_structure_rows(genotypes)) == expected
+
+def make_rows_like_original(genotypes, spacing):
+    '''
+    Makes the rows the way the original does, with the text of each locus for
+    each individual & a padding string for each missing one, to check the rows
+    made from the whole matrix at once against.
+    '''
+    loci = genotypes['loci']
+    pad_strings = make_pad_strings([len(locus['variable_sites']) for locus in loci], spacing)
+    rows = []
+    for index, individual_id in enumerate(genotypes['individual_ids']):
+        segments = []
+        for locus, pad_string in zip(loci, pad_strings):
+            locus_rows = np.flatnonzero(locus['individuals'] == index)
+            segments.append(format_genotypes(locus['codes'][locus_rows[0]], spacing) if len(locus_rows) else pad_string)
+        rows.append(f"{individual_id} {join_locus_segments(segments, spacing)}\n")
+    return rows
+
+@pytest.mark.parametrize("spacing", ["legacy", "compact"])
+@pytest.mark.parametrize("jobs", [1, 2])
+def test_rows_from_blocks_match_original_padding(tmp_path, spacing, jobs):
+    rng = np.random.default_rng(7)
+    genotypes = make_genotype_table()
+    for locus_number in range(12):
+        sites = [0, 0, 3, 1, 5][locus_number % 5]
+        present = rng.random(40) < 0.6
+        record_ids = [f"ind{i}" for i in rng.permutation(np.flatnonzero(present))]
+        codes = rng.choice(np.array([-10, -9, 0, 1, 2, 3], dtype=np.int8), size=(len(record_ids), sites))
+        add_locus(genotypes, f"locus{locus_number}", (record_ids, codes, list(range(sites))))
+        if locus_number == 4:
+            add_failed_locus(genotypes, "failed")
+    expected = make_rows_like_original(genotypes, spacing)
+    # blocks of a few rows so there are many blocks to put together in order
+    write_structure_file(tmp_path / "Structure.str", genotypes, spacing, jobs=jobs, cells_per_block=64)
+    assert (tmp_path / "Structure.str").read_text() == "".join(expected)
+    assert list(iterate_structure_rows(genotypes, spacing, cells_per_block=64)) == expected
+
+def test_writing_with_jobs_keeps_few_blocks_waiting(tmp_path, monkeypatch):
+    # writing slower than making the text mustn't let the text of every block
+    # pile up waiting to be written
+    genotypes = make_genotype_table()
+    record_ids = [f"ind{i}" for i in range(200)]
+    add_locus(genotypes, "locus", (record_ids, np.zeros((200, 4), dtype=np.int8), [0, 1, 2, 3]))
+    waiting = []
+    written = []
+
+    class CountedFuture:
+        def __init__(self, future):
+            self.future = future
+        def result(self):
+            written.append(True)
+            return self.future.result()
+
+    class RecordingExecutor(ThreadPoolExecutor):
+        def submit(self, *args, **kwargs):
+            waiting.append(len(waiting) + 1 - len(written))
+            return CountedFuture(super().submit(*args, **kwargs))
+
+    @contextlib.contextmanager
+    def recording_process_pool(jobs):
+        with RecordingExecutor(jobs) as executor:
+            yield executor
+    monkeypatch.setattr(improved_Fasta2Structure, "process_pool", recording_process_pool)
+    write_structure_file(tmp_path / "Structure.str", genotypes, jobs=2, cells_per_block=8)
+    assert len(waiting) == 100 and max(waiting) <= 4
+    assert (tmp_path / "Structure.str").read_text() == "".join(iterate_structure_rows(genotypes))
@@ -0,0 +1,58 @@
+#!/usr/bin/env python
+# `test_gui_conversion.py`
+# Checks the conversion the GUI runs in the background, & the preview it shows,
+# without needing a display: the messages it sends, that it can be cancelled,
+# and that the preview stays small.
+# Run this file like `pytest -v tests/test_gui_conversion.py` 
+import pytest
+import os
+import sys
+import queue
+import filecmp
+import threading
+
+from conftest import get_repo_root, get_gui_results_location, get_all_three_example_paths
+repo_root = get_repo_root()
+guiFasta2StructureDOTpy_results = get_gui_results_location()
+all_three = get_all_three_example_paths()
+sys.path.insert(0, repo_root)
+from improved_Fasta2Structure import (run_conversion_in_background, make_structure_preview, make_genotype_table,
+                                      process_fasta_file)
+
+
+
+def get_messages(updates):
+    messages = []
+    while not updates.empty():
+        messages.append(updates.get_nowait())
+    return messages
+
+def test_background_conversion_reports_progress_and_matches_original(tmp_path):
+    updates = queue.Queue()
+    output_filename = tmp_path / "Structure.str"
+    run_conversion_in_background(all_three, updates, threading.Event(), output_filename)
+    messages = get_messages(updates)
+    assert [message[0] for message in messages] == ['progress'] * 3 + ['done']
+    assert [message[1] for message in messages[:3]] == [1, 2, 3]
+    assert messages[2][3] == sum(os.path.getsize(path) for path in all_three)
+    assert filecmp.cmp(output_filename, os.path.join(guiFasta2StructureDOTpy_results, "from_all_three_at_once_Structure.str"),
+                       shallow=False)
+
+def test_cancelled_background_conversion_writes_nothing(tmp_path):
+    updates = queue.Queue()
+    cancel_event = threading.Event()
+    cancel_event.set()
+    run_conversion_in_background(all_three, updates, cancel_event, tmp_path / "Structure.str")
+    assert get_messages(updates) == [('cancelled',)]
+    assert not (tmp_path / "Structure.str").exists()
+
+def test_preview_is_bounded():
+    genotypes = make_genotype_table()
+    for filepath in all_three:
+        process_fasta_file(filepath, genotypes, lambda x: None)
+    with open(os.path.join(guiFasta2StructureDOTpy_results, "from_all_three_at_once_Structure.str")) as full_file:
+        full_rows = full_file.read().splitlines()
+    preview_rows = make_structure_preview(genotypes, max_rows=5, max_characters=30).splitlines()
+    assert len(preview_rows) == 6 and preview_rows[-1] == f"... ({len(full_rows) - 5} more rows not shown)"
+    for preview_row, full_row in zip(preview_rows[:-1], full_rows):
+        assert preview_row == full_row[:30] + " ..."
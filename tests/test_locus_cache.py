@@ -0,0 +1,47 @@
+#!/usr/bin/env python
+# `test_locus_cache.py`
+# Checks the cache of loci `improved_Fasta2Structure.py` can keep with 
+# `--cache-dir` gives back what processing the FASTA file would, notices when a
+# file changes & keeps to the size it is allowed.
+# Run this file like `pytest -v tests/test_locus_cache.py` 
+import pytest
+import os
+import sys
+import shutil
+import numpy as np
+
+# make the script importable when pytest is run from the repo root 
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from improved_Fasta2Structure import read_fasta_alignment, read_locus, trim_locus_cache
+
+from conftest import get_example_datasets_location
+example_datasets_location = get_example_datasets_location()
+
+
+
+def test_cached_locus_matches_processed_locus_and_changes_with_file(tmp_path):
+    fasta_path = tmp_path / "ITS.fas"
+    shutil.copy(os.path.join(example_datasets_location, "ITS.fas"), fasta_path)
+    cache_dir = tmp_path / "cache"
+    processed = read_locus(fasta_path)
+    first = read_locus(fasta_path, cache_dir=cache_dir)
+    from_cache = read_locus(fasta_path, cache_dir=cache_dir)
+    assert len(os.listdir(cache_dir)) == 1
+    for locus in (first, from_cache):
+        assert locus[0] == processed[0] and locus[2] == processed[2]
+        assert np.array_equal(locus[1], processed[1])
+    # changing the file should give a new entry & not the old result
+    alignment_length = read_fasta_alignment(fasta_path)[1].shape[1]
+    with open(fasta_path, "a") as fasta_file:
+        fasta_file.write(">new_one\n" + "A" * alignment_length + "\n")
+    changed = read_locus(fasta_path, cache_dir=cache_dir)
+    assert changed[0][-1] == "new_one"
+    assert len(os.listdir(cache_dir)) == 2
+
+def test_trimming_cache_removes_least_recently_used_first(tmp_path):
+    for age, name in enumerate(["newest", "middle", "oldest"]):
+        entry = tmp_path / f"{name}.npz"
+        entry.write_bytes(b"x" * 100)
+        os.utime(entry, (1000 - age, 1000 - age))
+    trim_locus_cache(tmp_path, 250)
+    assert sorted(os.listdir(tmp_path)) == ["middle.npz", "newest.npz"]
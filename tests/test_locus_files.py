@@ -0,0 +1,85 @@
+#!/usr/bin/env python
+# `test_locus_files.py`
+# Checks the binary locus files `improved_Fasta2Structure.py` saves with
+# `--write-loci` give back the locus they were made from & convert to the same
+# output as the FASTA files do.
+# Run this file like `pytest -v tests/test_locus_files.py` 
+import pytest
+import os
+import sys
+import filecmp
+import subprocess
+import numpy as np
+
+from conftest import get_repo_root, get_script_path, get_gui_results_location, get_all_three_example_paths
+repo_root = get_repo_root()
+script_path = get_script_path()
+guiFasta2StructureDOTpy_results = get_gui_results_location()
+all_three = get_all_three_example_paths()
+sys.path.insert(0, repo_root)
+from improved_Fasta2Structure import (read_locus, write_locus_file, read_locus_file, read_locus_file_header,
+                                      subset_locus, hash_file_contents, get_locus_dirs)
+
+
+
+@pytest.mark.parametrize("fasta_path", all_three)
+def test_locus_file_gives_back_locus(tmp_path, fasta_path):
+    locus = read_locus(fasta_path)
+    locus_path = tmp_path / "locus.f2sl"
+    write_locus_file(locus_path, locus, source=fasta_path)
+    record_ids, codes, variable_sites = read_locus_file(locus_path)
+    assert record_ids == locus[0] and variable_sites == locus[2]
+    assert isinstance(codes, np.memmap) and np.array_equal(codes, locus[1])
+    header = read_locus_file_header(locus_path)
+    assert header['source_sha256'] == hash_file_contents(fasta_path)
+    assert header['codes_offset'] % 64 == 0
+
+def test_locus_file_without_sites_or_records(tmp_path):
+    for locus in ((["a", "b"], np.zeros((2, 0), dtype=np.int8), []), ([], np.zeros((0, 3), dtype=np.int8), [1, 4, 7])):
+        write_locus_file(tmp_path / "locus.f2sl", locus)
+        record_ids, codes, variable_sites = read_locus_file(tmp_path / "locus.f2sl")
+        assert record_ids == locus[0] and codes.shape == locus[1].shape and variable_sites == locus[2]
+
+def test_subset_locus_keeps_order_and_columns():
+    locus = (["a", "b", "c"], np.array([[0, 1], [2, 3], [1, 1]], dtype=np.int8), [4, 9])
+    record_ids, codes, variable_sites = subset_locus(locus, ["c", "a"])
+    assert record_ids == ["a", "c"] and codes.tolist() == [[0, 1], [1, 1]] and variable_sites == [4, 9]
+
+@pytest.mark.parametrize("extra_args", [[], ["--jobs", "3"]])
+def test_converting_locus_files_matches_results_from_original(tmp_path, extra_args):
+    subprocess.run([sys.executable, script_path, "--write-loci", "loci", *extra_args, *all_three], cwd=tmp_path, check=True,
+                   capture_output=True)
+    fasta_log = (tmp_path / "log.log").read_text()
+    (tmp_path / "Structure.str").unlink()
+    locus_paths = [os.path.join("loci", os.path.splitext(os.path.basename(path))[0] + ".f2sl") for path in all_three]
+    # mixing locus files & FASTA files is fine too
+    subprocess.run([sys.executable, script_path, *extra_args, locus_paths[0], all_three[1], locus_paths[2]], cwd=tmp_path,
+                   check=True, capture_output=True)
+    assert filecmp.cmp(tmp_path / "Structure.str",
+                       os.path.join(guiFasta2StructureDOTpy_results, "from_all_three_at_once_Structure.str"), shallow=False)
+    fasta_sites = [line.split(": ", 1)[1] for line in fasta_log.splitlines() if "Variable sites" in line]
+    locus_sites = [line.split(": ", 1)[1] for line in (tmp_path / "log.log").read_text().splitlines() if "Variable sites" in line]
+    assert locus_sites == fasta_sites
+
+@pytest.mark.parametrize("extra_args", [[], ["--jobs", "2"]])
+def test_fasta_files_with_same_name_get_separate_locus_files(tmp_path, extra_args):
+    # 'd/chr1/locus.fas' & 'd/chr2/locus.fas' must not both end up as 'loci/locus.f2sl'
+    for subdirectory, fasta_path in (("chr1", all_three[0]), ("chr2", all_three[1])):
+        (tmp_path / "d" / subdirectory).mkdir(parents=True)
+        (tmp_path / "d" / subdirectory / "locus.fas").write_bytes(open(fasta_path, 'rb').read())
+    (tmp_path / "d" / "other.fas").write_bytes(open(all_three[2], 'rb').read())
+    subprocess.run([sys.executable, script_path, "--write-loci", "loci", *extra_args, "d"], cwd=tmp_path, check=True,
+                   capture_output=True)
+    assert sorted(os.path.relpath(os.path.join(root, name), tmp_path / "loci")
+                  for root, _, names in os.walk(tmp_path / "loci") for name in names) == [
+        os.path.join("chr1", "locus.f2sl"), os.path.join("chr2", "locus.f2sl"), "other.f2sl"]
+    for subdirectory, fasta_path in (("chr1", all_three[0]), ("chr2", all_three[1])):
+        record_ids, codes, variable_sites = read_locus_file(tmp_path / "loci" / subdirectory / "locus.f2sl")
+        assert variable_sites == read_locus(fasta_path)[2]
+
+def test_same_locus_file_for_different_files_is_an_error(tmp_path):
+    assert get_locus_dirs(["a/x.fas", "b/y.fas"], "loci") == ["loci", "loci"]
+    assert get_locus_dirs(["a/x.fas", "a/x.fas"], "loci") == ["loci", "loci"]
+    assert get_locus_dirs(["x.fas"], None) == [None]
+    with pytest.raises(ValueError):
+        get_locus_dirs(["a/x.fas", "a/x.fas.gz"], "loci")
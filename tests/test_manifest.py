@@ -0,0 +1,86 @@
+#!/usr/bin/env python
+# `test_manifest.py`
+# Checks running the jobs listed in a manifest with `--manifest` gives each job
+# the same output & log as converting it on its own does.
+# Run this file like `pytest -v tests/test_manifest.py` 
+import pytest
+import os
+import sys
+import json
+import filecmp
+import subprocess
+import contextlib
+from concurrent.futures import ThreadPoolExecutor
+
+from conftest import get_repo_root, get_script_path, get_gui_results_location, get_all_three_example_paths
+repo_root = get_repo_root()
+script_path = get_script_path()
+guiFasta2StructureDOTpy_results = get_gui_results_location()
+all_three = get_all_three_example_paths()
+sys.path.insert(0, repo_root)
+import improved_Fasta2Structure
+
+
+
+@pytest.mark.parametrize("manifest_format", ["tsv", "json"])
+@pytest.mark.parametrize("extra_args", [[], ["--jobs", "3"]])
+def test_manifest_jobs_match_results_from_original(tmp_path, manifest_format, extra_args):
+    jobs = [
+        {"input": all_three, "output": "together/Structure.str"},
+        {"input": [all_three[1]], "output": "trnD-trnT.str", "log": "trnD-trnT_job.log"},
+        {"input": [all_three[0]], "output": "ITS_compact.str", "spacing": "compact"},
+    ]
+    if manifest_format == "json":
+        manifest_path = tmp_path / "manifest.json"
+        manifest_path.write_text(json.dumps(jobs))
+    else:
+        manifest_path = tmp_path / "manifest.tsv"
+        lines = ["input\toutput\tlog\tspacing", "# comments & blank lines are skipped", ""]
+        lines += [f"{';'.join(job['input'])}\t{job['output']}\t{job.get('log', '')}\t{job.get('spacing', '')}" for job in jobs]
+        manifest_path.write_text("\n".join(lines) + "\n")
+    subprocess.run([sys.executable, script_path, "--manifest", str(manifest_path), *extra_args],
+                   cwd=tmp_path, check=True, capture_output=True)
+    assert filecmp.cmp(tmp_path / "together/Structure.str",
+                       os.path.join(guiFasta2StructureDOTpy_results, "from_all_three_at_once_Structure.str"), shallow=False)
+    assert filecmp.cmp(tmp_path / "trnD-trnT.str",
+                       os.path.join(guiFasta2StructureDOTpy_results, "from_trnD-trnT.fas_Structure.str"), shallow=False)
+    # each job gets its own log, with only its own files in it
+    together_log = (tmp_path / "together/Structure.log").read_text()
+    assert "3 FASTA files selected." in together_log and together_log.count("Variable sites for") == 3
+    job_log = (tmp_path / "trnD-trnT_job.log").read_text()
+    assert "1 FASTA files selected." in job_log and job_log.count("Variable sites for") == 1
+    compact = (tmp_path / "ITS_compact.str").read_text()
+    assert "  " not in compact
+
+def test_manifest_with_bad_job_fails_before_running(tmp_path):
+    manifest_path = tmp_path / "manifest.json"
+    manifest_path.write_text(json.dumps([{"input": all_three[0], "output": "a.str", "spacing": "wide"}]))
+    result = subprocess.run([sys.executable, script_path, "--manifest", str(manifest_path)],
+                            cwd=tmp_path, capture_output=True, text=True)
+    assert result.returncode != 0 and "spacing" in result.stderr
+    assert not (tmp_path / "a.str").exists()
+
+def test_manifest_hands_out_files_only_one_job_ahead(tmp_path, monkeypatch):
+    # with many jobs, the files of a job shouldn't be handed out until the job
+    # two before it is written, so the results don't all pile up in memory
+    jobs = [{"input": [all_three[index % 3]], "output": f"job{index}.str"} for index in range(6)]
+    (tmp_path / "manifest.json").write_text(json.dumps(jobs))
+    outputs_written_at_submit = []
+
+    class RecordingExecutor(ThreadPoolExecutor):
+        def submit(self, *args, **kwargs):
+            outputs_written_at_submit.append(sum((tmp_path / job["output"]).exists() for job in jobs))
+            return super().submit(*args, **kwargs)
+
+    @contextlib.contextmanager
+    def recording_process_pool(pool_jobs):
+        with RecordingExecutor(pool_jobs) as executor:
+            yield executor
+    monkeypatch.setattr(improved_Fasta2Structure, "process_pool", recording_process_pool)
+    monkeypatch.chdir(tmp_path)
+    assert improved_Fasta2Structure.run_manifest("manifest.json", jobs=2) == 0
+    assert outputs_written_at_submit == [0, 0] + list(range(1, 5))
+    for index, job in enumerate(jobs):
+        assert filecmp.cmp(tmp_path / job["output"],
+                           os.path.join(guiFasta2StructureDOTpy_results, f"from_{os.path.basename(job['input'][0])}_Structure.str"),
+                           shallow=False)
@@ -5,6 +5,8 @@ import pytest
 import os
 import fnmatch
 import filecmp
+import subprocess
+import sys
 
 # Run this file like `pytest -v tests/test_no_changes_introduced_to_results.py` 
 
@@ -207,6 +209,10 @@ def compare_file_number_and_variable_sites_in_log(file1_path, file2_path, msg="F
 # that seemed incompatible with fixtures
 from conftest import get_example_datasets_location
 example_datasets_location = get_example_datasets_location()
+# same for the variants of calling `improved_Fasta2Structure.py` (like the 
+# engine used) that each get checked
+from conftest import get_script_variants_to_check
+script_variants_to_check = get_script_variants_to_check()
 
 ###--------------------------END OF HELPER FUNCTIONS--------------------------###
 ###--------------------------END OF HELPER FUNCTIONS--------------------------###
@@ -232,12 +238,13 @@ test_current_result_matches_results_in_my_fork()
 
 # Next check if the results from each one used as input individually matches 
 # because probably the main test will fail if even simplest one do.
+@pytest.mark.parametrize("variant", script_variants_to_check)
 @pytest.mark.parametrize("filename", [f for f in os.listdir(example_datasets_location) if fnmatch.fnmatch(f, '*.fas')])
-def test_old_script_results_vs_new_results_from_new_script(filename,dir_with_new_results_set_inCONFTEST, ind_results_noms):    # call the variables coming over from conftest.py in the function
+def test_old_script_results_vs_new_results_from_new_script(variant, filename,dir_with_new_results_set_inCONFTEST, ind_results_noms):    # call the variables coming over from conftest.py in the function
     dir_with_new_results = dir_with_new_results_set_inCONFTEST # need because cannot name the function same as this one for some reason the fixture is set up in module. Tried a lot of tricks to not have it be that way but nothing seemed to work. Because strign getting confused with fixture function.
     GUI_results_name = make_corresponding_GUIobtained_filename(filename)
     GUI_results_path = os.path.join(guiFasta2StructureDOTpy_results, GUI_results_name)
-    correspond_name_for_new = [item for item in ind_results_noms if item.startswith(f"tmp_{filename}")][0]
+    correspond_name_for_new = [item for item in ind_results_noms[variant] if item.startswith(f"tmp_{filename}")][0]
     correspond_path_for_new = os.path.join(dir_with_new_results, correspond_name_for_new)
     assert filecmp.cmp(GUI_results_path, correspond_path_for_new), f"The results in the file `{GUI_results_name}` generated by Fasta2Structure.py (GUI) and `{correspond_name_for_new}` generated by improved_Fasta2Structure.py were expected to match; however, THEY DON'T MATCH!"
 '''Claude.ai said that above using pytest's parametrize decorator was better approach then what I had, which is below, because it will automatically make a test for each one that way whereas mine had a single test, like the following earlier draft:
@@ -271,16 +278,18 @@ def test_AdamBessa_has_not_changed_provided_results_file():
 # `Fasta2Structure.py (GUI-based)` handling spacing around `-9` in my hands and 
 # so I cannot easily go from them embedded in tabs to the spacing versions I find 
 # with `Fasta2Structure.py (GUI-based)` in my hand. So do not consider whitespace.
-def test_provided_has_same_content_as_new_results_with_data_where_all_three_genes_targeted_as_input_at_same_time(dir_with_new_results_set_inCONFTEST, unique_prefix_for_with_three):   #`unique_prefix_for_with_three` comes from conftest, passing into here via pytest fixture
+@pytest.mark.parametrize("variant", script_variants_to_check)
+def test_provided_has_same_content_as_new_results_with_data_where_all_three_genes_targeted_as_input_at_same_time(variant, dir_with_new_results_set_inCONFTEST, unique_prefix_for_with_three):   #`unique_prefix_for_with_three` comes from conftest, passing into here via pytest fixture
     dir_with_new_results = dir_with_new_results_set_inCONFTEST # need because cannot name the function same as this one for some reason the fixture is set up in module. Tried a lot of tricks to not have it be that way but nothing seemed to work. Because strign getting confused with fixture function.
-    compare_file_content_equality(provided_example_adjusted_to_match_what_I_expect, f"{dir_with_new_results}/{unique_prefix_for_with_three}_Structure.str", f"The results in the file `{os.path.basename(provided_example_adjusted_to_match_what_I_expect)}` (located in `{os.path.dirname(provided_example_adjusted_to_match_what_I_expect)}`) provided as 'Result' by Fasta2Structure.py developer Adam Bessa (but processed slightly to match more of what I'm seeing in my hands) and `{unique_prefix_for_with_three}_Structure.str` (located in `{dir_with_new_results}`) generated by improved_Fasta2Structure.py with `Example_data/Datasets/ITS.fas Example_data/Datasets/trnD-trnT.fas Example_data/Datasets/trnH-trnK.fas` were expected to match; however, THEY DON'T HAVE SAME CONTENT, ignoring whitespace! THIS IS VERY, VERY BAD!!! THIS IS BIG PROBLEM!!!")
+    compare_file_content_equality(provided_example_adjusted_to_match_what_I_expect, f"{dir_with_new_results}/{unique_prefix_for_with_three[variant]}_Structure.str", f"The results in the file `{os.path.basename(provided_example_adjusted_to_match_what_I_expect)}` (located in `{os.path.dirname(provided_example_adjusted_to_match_what_I_expect)}`) provided as 'Result' by Fasta2Structure.py developer Adam Bessa (but processed slightly to match more of what I'm seeing in my hands) and `{unique_prefix_for_with_three[variant]}_Structure.str` (located in `{dir_with_new_results}`) generated by improved_Fasta2Structure.py with `Example_data/Datasets/ITS.fas Example_data/Datasets/trnD-trnT.fas Example_data/Datasets/trnH-trnK.fas` were expected to match; however, THEY DON'T HAVE SAME CONTENT, ignoring whitespace! THIS IS VERY, VERY BAD!!! THIS IS BIG PROBLEM!!!")
 # Check if the results when give all three examples at the same time matches 
 # what I myself had obtained from Fasta2Structure.py (GUI-based) previously in the case of the combined data.
-def test_old_vs_new_results_with_data_where_all_three_genes_targeted_as_input_at_same_time(dir_with_new_results_set_inCONFTEST, unique_prefix_for_with_three, three_nom_prefix):   #`unique_prefix_for_with_three` comes from conftest, passing into here via pytest fixture
+@pytest.mark.parametrize("variant", script_variants_to_check)
+def test_old_vs_new_results_with_data_where_all_three_genes_targeted_as_input_at_same_time(variant, dir_with_new_results_set_inCONFTEST, unique_prefix_for_with_three, three_nom_prefix):   #`unique_prefix_for_with_three` comes from conftest, passing into here via pytest fixture
     dir_with_new_results = dir_with_new_results_set_inCONFTEST # need because cannot name the function same as this one for some reason the fixture is set up in module. Tried a lot of tricks to not have it be that way but nothing seemed to work. Because strign getting confused with fixture function.
     GUI_results_name_all_three = f"{three_nom_prefix}_Structure.str"
     GUI_results_path_all_three = os.path.join(guiFasta2StructureDOTpy_results, GUI_results_name_all_three)
-    assert filecmp.cmp(GUI_results_path_all_three, f"{dir_with_new_results}/{unique_prefix_for_with_three}_Structure.str"), f"The results in the file `{os.path.basename(provided_example_adjusted_to_match_what_I_expect)}` (located in `{os.path.dirname(provided_example_adjusted_to_match_what_I_expect)}`) generated by Fasta2Structure.py (GUI-based) after selecting all three genes at same time and `{unique_prefix_for_with_three}_Structure.str` (located in `{dir_with_new_results}`) generated by improved_Fasta2Structure.py with `Example_data/Datasets/ITS.fas Example_data/Datasets/trnD-trnT.fas Example_data/Datasets/trnH-trnK.fas` were expected to match; however, THEY DON'T MATCH! THIS IS VERY, VERY BAD!!! THIS IS BIG PROBLEM!!!"
+    assert filecmp.cmp(GUI_results_path_all_three, f"{dir_with_new_results}/{unique_prefix_for_with_three[variant]}_Structure.str"), f"The results in the file `{os.path.basename(provided_example_adjusted_to_match_what_I_expect)}` (located in `{os.path.dirname(provided_example_adjusted_to_match_what_I_expect)}`) generated by Fasta2Structure.py (GUI-based) after selecting all three genes at same time and `{unique_prefix_for_with_three[variant]}_Structure.str` (located in `{dir_with_new_results}`) generated by improved_Fasta2Structure.py with `Example_data/Datasets/ITS.fas Example_data/Datasets/trnD-trnT.fas Example_data/Datasets/trnH-trnK.fas` were expected to match; however, THEY DON'T MATCH! THIS IS VERY, VERY BAD!!! THIS IS BIG PROBLEM!!!"
 
 
 # Use code to check the INFO (number FASTA files selected & the elements in 
@@ -290,24 +299,42 @@ def test_old_vs_new_results_with_data_where_all_three_genes_targeted_as_input_at
 # check the individual logs where each input used individually matches 
 # because probably the main log where all three targeted will fail if even 
 # simplest logs fail.
+@pytest.mark.parametrize("variant", script_variants_to_check)
 @pytest.mark.parametrize("filename", [f for f in os.listdir(example_datasets_location) if fnmatch.fnmatch(f, '*.fas')])
-def test_old_script_logs_vs_new_logs_from_new_script(filename,dir_with_new_results_set_inCONFTEST, ind_log_noms):    # call the variables coming over from conftest.py in the function
+def test_old_script_logs_vs_new_logs_from_new_script(variant, filename,dir_with_new_results_set_inCONFTEST, ind_log_noms):    # call the variables coming over from conftest.py in the function
     dir_with_new_results = dir_with_new_results_set_inCONFTEST # need because cannot name the function same as this one for some reason the fixture is set up in module. Tried a lot of tricks to not have it be that way but nothing seemed to work. Because strign getting confused with fixture function.
     GUI_log_name = make_corresponding_GUIobtained_logname(filename)
     GUI_log_path = os.path.join(guiFasta2StructureDOTpy_results, GUI_log_name)
-    correspond_name_for_newlog = [item for item in ind_log_noms if item.startswith(f"tmp_{filename}")][0]
+    correspond_name_for_newlog = [item for item in ind_log_noms[variant] if item.startswith(f"tmp_{filename}")][0]
     correspond_path_for_newlog = os.path.join(dir_with_new_results, correspond_name_for_newlog)
     compare_file_number_and_variable_sites_in_log(GUI_log_path, correspond_path_for_newlog, f"The log in the file `{GUI_log_name}` generated by Fasta2Structure.py (GUI) and `{correspond_name_for_newlog}` generated by improved_Fasta2Structure.py were expected to match; however, THEY DON'T MATCH!")
 
 # check the log with all three at once matches the data in the `provided_log_file`
-def test_log_Adam_Bessa_provided_matches_current_for_all_three_at_once(dir_with_new_results_set_inCONFTEST, three_nom_prefix, unique_prefix_for_with_three):    # call the variables coming over from conftest.py in the function
+@pytest.mark.parametrize("variant", script_variants_to_check)
+def test_log_Adam_Bessa_provided_matches_current_for_all_three_at_once(variant, dir_with_new_results_set_inCONFTEST, three_nom_prefix, unique_prefix_for_with_three):    # call the variables coming over from conftest.py in the function
     dir_with_new_results = dir_with_new_results_set_inCONFTEST # need because cannot name the function same as this one for some reason the fixture is set up in module. Tried a lot of tricks to not have it be that way but nothing seemed to work. Because strign getting confused with fixture function.
-    current_log_all_three = f"{dir_with_new_results}/{unique_prefix_for_with_three}_log.log"
+    current_log_all_three = f"{dir_with_new_results}/{unique_prefix_for_with_three[variant]}_log.log"
     compare_file_number_and_variable_sites_in_log(provided_log_file,current_log_all_three)
 
 # check the log with all three at once also matches the content in `from_all_three_at_once_log.log`, which is the log obtained when I give all three examples at the same time matches to Fasta2Structure.py (GUI-based) previous times in the case of the combined data.
-def test_log_I_got_previously_with_all_three_at_once_matches_current_for_all_three_at_once(dir_with_new_results_set_inCONFTEST, three_nom_prefix, unique_prefix_for_with_three):    # call the variables coming over from conftest.py in the function
+@pytest.mark.parametrize("variant", script_variants_to_check)
+def test_log_I_got_previously_with_all_three_at_once_matches_current_for_all_three_at_once(variant, dir_with_new_results_set_inCONFTEST, three_nom_prefix, unique_prefix_for_with_three):    # call the variables coming over from conftest.py in the function
     dir_with_new_results = dir_with_new_results_set_inCONFTEST # need because cannot name the function same as this one for some reason the fixture is set up in module. Tried a lot of tricks to not have it be that way but nothing seemed to work. Because strign getting confused with fixture function.
-    current_log_all_three = f"{dir_with_new_results}/{unique_prefix_for_with_three}_log.log"
+    current_log_all_three = f"{dir_with_new_results}/{unique_prefix_for_with_three[variant]}_log.log"
     compare_file_number_and_variable_sites_in_log(log_I_observe_Fasta2StructureDOTpy_give_for_all_three_example_datasets,current_log_all_three)
 
+
+
+
+# Check the 'compact' spacing option gives the same genotype calls as the 
+# original, just with single spaces between every one of them.
+#--------------------------------------------------------------------------#
+def test_compact_spacing_has_same_content_as_old_results_with_all_three_at_once(tmp_path, three_nom_prefix):
+    example_fps = [os.path.abspath(os.path.join(example_datasets_location, f)) for f in ("ITS.fas", "trnD-trnT.fas", "trnH-trnK.fas")]
+    subprocess.run([sys.executable, os.path.abspath("improved_Fasta2Structure.py"), "--spacing", "compact"] + example_fps, cwd=tmp_path, check=True)
+    GUI_results_path_all_three = os.path.join(guiFasta2StructureDOTpy_results, f"{three_nom_prefix}_Structure.str")
+    compact_result_path = os.path.join(tmp_path, "Structure.str")
+    compare_file_content_equality(GUI_results_path_all_three, compact_result_path, "The results made with `--spacing compact` don't have the same content as the results from Fasta2Structure.py (GUI-based), ignoring whitespace.")
+    with open(compact_result_path) as compact_result:
+        for line in compact_result:
+            assert "  " not in line and not line.endswith(" \n"), f"With `--spacing compact` there should only be single spaces between entries, but found: {line[:80]}..."
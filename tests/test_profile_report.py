@@ -0,0 +1,38 @@
+#!/usr/bin/env python
+# `test_profile_report.py`
+# Checks the report `improved_Fasta2Structure.py` writes with `--profile` has
+# each stage of each locus & totals that add up.
+# Run this file like `pytest -v tests/test_profile_report.py` 
+import pytest
+import os
+import sys
+import json
+import subprocess
+
+from conftest import get_script_path, get_example_datasets_path
+script_path = get_script_path()
+example_datasets_location = get_example_datasets_path()
+
+
+
+@pytest.mark.parametrize("extra_args", [[], ["--jobs", "2"]])
+def test_profile_report_has_stages_per_locus_and_totals(tmp_path, extra_args):
+    fasta_paths = [os.path.join(example_datasets_location, name) for name in ("ITS.fas", "trnD-trnT.fas")]
+    broken = tmp_path / "broken.fas"
+    broken.write_text(">a\nAC\n>b\nA\n")
+    subprocess.run([sys.executable, script_path, "--profile", *extra_args,
+                    *fasta_paths, str(broken)], cwd=tmp_path, check=True, capture_output=True)
+    with open(tmp_path / "profile.json") as report_file:
+        report = json.load(report_file)
+    loci = report['loci']
+    assert [locus_profile['filepath'] for locus_profile in loci] == fasta_paths + [str(broken)]
+    for locus_profile in loci[:2]:
+        assert set(locus_profile['stages']) == {'parse', 'collapse_haplotypes', 'get_variable_sites', 'encode', 'add_locus'}
+        assert locus_profile['bytes_read'] == os.path.getsize(locus_profile['filepath'])
+    assert "same length" in loci[2]['error']
+    aggregate = report['aggregate']
+    assert aggregate['failed_loci'] == 1
+    assert aggregate['records'] == sum(locus_profile.get('records', 0) for locus_profile in loci)
+    assert aggregate['variable_sites'] == sum(locus_profile.get('variable_sites', 0) for locus_profile in loci)
+    assert 'write' in aggregate['stages']
+    assert len(report['slowest_loci']) == 3
@@ -0,0 +1,122 @@
+#!/usr/bin/env python
+# `test_service.py`
+# Checks jobs sent with `improved_Fasta2Structure_client.py` to the service
+# run with `--serve` give the same output, log & exit code as running the
+# script itself, including when run again with the loci kept in memory.
+# Run this file like `pytest -v tests/test_service.py` 
+import pytest
+import os
+import sys
+import time
+import signal
+import socket
+import filecmp
+import subprocess
+
+from conftest import get_repo_root, get_script_path, get_gui_results_location, get_all_three_example_paths
+repo_root = get_repo_root()
+script_path = get_script_path()
+guiFasta2StructureDOTpy_results = get_gui_results_location()
+all_three = get_all_three_example_paths()
+client_path = os.path.join(repo_root, "improved_Fasta2Structure_client.py")
+
+pytestmark = pytest.mark.skipif(not hasattr(__import__("socket"), "AF_UNIX"), reason="needs Unix domain sockets")
+
+
+
+def start_service(tmp_path, jobs):
+    socket_path = str(tmp_path / "service.sock")
+    server = subprocess.Popen([sys.executable, script_path, "--serve", "--socket", socket_path, "--jobs", str(jobs)],
+                              cwd=tmp_path, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    for _ in range(200):
+        if os.path.exists(socket_path) or server.poll() is not None:
+            break
+        time.sleep(0.05)
+    return server, socket_path
+
+@pytest.fixture(params=[1, 3], ids=["serial", "pool"])
+def service(tmp_path, request):
+    server, socket_path = start_service(tmp_path, request.param)
+    yield socket_path
+    if server.poll() is None:
+        subprocess.run([sys.executable, client_path, "--socket", socket_path, "--stop-server"], check=True, capture_output=True)
+    server.wait(timeout=30)
+    assert not os.path.exists(socket_path)
+
+def run_client(socket_path, args, cwd):
+    return subprocess.run([sys.executable, client_path, "--socket", socket_path, *args], cwd=cwd, capture_output=True, text=True)
+
+def test_service_jobs_match_running_script(tmp_path, service):
+    broken = tmp_path / "broken.fas"
+    broken.write_text(">a\nAC\n>b\nA\n")
+    for attempt in range(2):
+        job_dir = tmp_path / f"job{attempt}"
+        job_dir.mkdir()
+        completed = run_client(service, ["--jobs", "2", *all_three], job_dir)
+        assert completed.returncode == 0 and "Structure.str" in completed.stdout
+        assert filecmp.cmp(job_dir / "Structure.str",
+                           os.path.join(guiFasta2StructureDOTpy_results, "from_all_three_at_once_Structure.str"), shallow=False)
+        # relative paths are taken from the directory the client is run in
+        completed = run_client(service, ["--legacy-log", os.path.relpath(all_three[1], job_dir), str(broken)], job_dir)
+        script_dir = tmp_path / f"script{attempt}"
+        script_dir.mkdir()
+        subprocess.run([sys.executable, script_path, "--legacy-log", os.path.relpath(all_three[1], script_dir), str(broken)],
+                       cwd=script_dir, check=True, capture_output=True)
+        assert (job_dir / "Structure.str").read_text() == (script_dir / "Structure.str").read_text()
+        assert (job_dir / "log.log").read_text() == (script_dir / "log.log").read_text()
+        assert "same length" in completed.stderr
+
+def test_service_reports_errors_with_exit_code(tmp_path, service):
+    completed = run_client(service, ["--spacing", "nonsense", *all_three], tmp_path)
+    assert completed.returncode == 2 and "invalid choice" in completed.stderr
+    completed = run_client(service, [], tmp_path)
+    assert completed.returncode == 2
+
+def test_second_service_on_same_socket_is_refused(tmp_path, service):
+    second = subprocess.run([sys.executable, script_path, "--serve", "--socket", service], cwd=tmp_path, capture_output=True,
+                            text=True, timeout=60)
+    assert second.returncode == 2 and "already listening" in second.stderr
+    # the first service can still be reached (& stopped by the fixture)
+    assert run_client(service, ["--spacing", "compact", all_three[0]], tmp_path).returncode == 0
+    # & only the user running it can connect
+    assert os.stat(service).st_mode & 0o077 == 0
+
+def test_service_replaces_socket_left_behind(tmp_path):
+    socket_path = str(tmp_path / "service.sock")
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as stale:
+        stale.bind(socket_path)
+    server, socket_path = start_service(tmp_path, 1)
+    try:
+        assert server.stdout.readline().startswith(b"Listening for jobs")
+        assert run_client(socket_path, [all_three[0]], tmp_path).returncode == 0
+    finally:
+        subprocess.run([sys.executable, client_path, "--socket", socket_path, "--stop-server"], capture_output=True)
+        server.wait(timeout=30)
+
+def test_client_without_service(tmp_path):
+    completed = run_client(str(tmp_path / "missing.sock"), all_three, tmp_path)
+    assert completed.returncode == 2 and "--serve" in completed.stderr
+
+# A worker killed between jobs (like by the kernel for running out of memory)
+# breaks the pool, so the service has to start a new one for the next job.
+@pytest.mark.skipif(not os.path.exists("/proc/self/task"), reason="needs /proc to find the worker processes")
+def test_service_recovers_from_killed_worker(tmp_path):
+    server, socket_path = start_service(tmp_path, 2)
+    try:
+        assert run_client(socket_path, ["--jobs", "2", *all_three], tmp_path).returncode == 0
+        workers = []
+        for task in os.listdir(f"/proc/{server.pid}/task"):
+            with open(f"/proc/{server.pid}/task/{task}/children") as children:
+                workers += [int(pid) for pid in children.read().split()]
+        assert workers
+        os.kill(workers[0], signal.SIGKILL)
+        time.sleep(0.5)
+        for _ in range(2):
+            (tmp_path / "Structure.str").unlink()
+            completed = run_client(socket_path, ["--jobs", "2", *all_three], tmp_path)
+            assert completed.returncode == 0, completed.stderr
+            assert filecmp.cmp(tmp_path / "Structure.str",
+                               os.path.join(guiFasta2StructureDOTpy_results, "from_all_three_at_once_Structure.str"), shallow=False)
+    finally:
+        subprocess.run([sys.executable, client_path, "--socket", socket_path, "--stop-server"], capture_output=True)
+        server.wait(timeout=30)
@@ -0,0 +1,60 @@
+#!/usr/bin/env python
+# `test_shards.py`
+# Checks splitting the loci into shards with `--shard`, run as separate
+# processes, & putting them together with `--merge` gives the same output &
+# log as converting all the FASTA files in one go.
+# Run this file like `pytest -v tests/test_shards.py` 
+import pytest
+import os
+import sys
+import shutil
+import subprocess
+
+from conftest import get_repo_root, get_script_path, get_all_three_example_paths
+repo_root = get_repo_root()
+script_path = get_script_path()
+all_three = get_all_three_example_paths()
+sys.path.insert(0, repo_root)
+from improved_Fasta2Structure import select_shard_loci
+
+
+
+def test_select_shard_loci_covers_every_locus_once():
+    shards = [select_shard_loci(10, shard_index, 4) for shard_index in range(1, 5)]
+    assert shards[0] == [0, 4, 8]
+    assert sorted(sum(shards, [])) == list(range(10))
+
+@pytest.mark.parametrize("shard_count", [1, 2, 4])
+@pytest.mark.parametrize("extra_args", [[], ["--jobs", "2"]])
+def test_merged_shards_match_one_run(tmp_path, shard_count, extra_args):
+    # individuals missing from some loci, a broken file & an ID in only one
+    # shard make sure the padding & the order of the individuals come out right
+    inputs = tmp_path / "inputs"
+    inputs.mkdir()
+    for number, filepath in enumerate(all_three):
+        shutil.copy(filepath, inputs / f"{number}_{os.path.basename(filepath)}")
+    (inputs / "3_broken.fas").write_text(">a\nAC\n>b\nA\n")
+    (inputs / "4_extra.fas").write_text(">newcomer\nACGT\n>other\nACGA\n")
+    shards = tmp_path / "shards"
+    shards.mkdir()
+    processes = [subprocess.Popen([sys.executable, script_path, "--shard", f"{shard_index}/{shard_count}", *extra_args,
+                                   "--shard-output", str(shards / f"{shard_index}.f2ss"), str(inputs)],
+                                  cwd=tmp_path, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+                 for shard_index in range(1, shard_count + 1)]
+    assert all(process.wait() == 0 for process in processes)
+    merged = tmp_path / "merged"
+    merged.mkdir()
+    subprocess.run([sys.executable, script_path, "--merge", "--legacy-log", str(shards)], cwd=merged, check=True,
+                   capture_output=True)
+    one_run = tmp_path / "one_run"
+    one_run.mkdir()
+    subprocess.run([sys.executable, script_path, "--legacy-log", str(inputs)], cwd=one_run, check=True, capture_output=True)
+    assert (merged / "Structure.str").read_text() == (one_run / "Structure.str").read_text()
+    assert (merged / "log.log").read_text() == (one_run / "log.log").read_text()
+
+def test_merge_reports_missing_shards(tmp_path):
+    subprocess.run([sys.executable, script_path, "--shard", "2/3", *all_three], cwd=tmp_path, check=True, capture_output=True)
+    completed = subprocess.run([sys.executable, script_path, "--merge", "shard_2_of_3.f2ss"], cwd=tmp_path,
+                               capture_output=True, text=True)
+    assert completed.returncode == 2 and "Shards 1, 3 of 3 are missing" in completed.stderr
+    assert not (tmp_path / "Structure.str").exists()
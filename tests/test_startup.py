@@ -0,0 +1,51 @@
+#!/usr/bin/env python
+# `test_startup.py`
+# Checks running `improved_Fasta2Structure.py` with arguments doesn't load the
+# GUI or Biopython or probe for a display, & that loading the script stays
+# quick, since workflows can call it thousands of times.
+# Run this file like `pytest -v tests/test_startup.py` 
+import pytest
+import os
+import sys
+import subprocess
+
+from conftest import get_repo_root, get_script_path, get_example_datasets_path
+repo_root = get_repo_root()
+script_path = get_script_path()
+example_datasets_location = get_example_datasets_path()
+
+# Most time in milliseconds importing the script is allowed to take on top of
+# importing NumPy, which it can't start without.
+startup_target_ms = 150
+
+
+
+def test_run_with_arguments_skips_gui_and_biopython(tmp_path):
+    # a bad display setting would make probing for a display fail or hang
+    environment = dict(os.environ, DISPLAY="bad-display-host:99")
+    code = ("import sys, runpy; "
+            f"sys.argv = [{script_path!r}, {os.path.join(example_datasets_location, 'ITS.fas')!r}]; "
+            f"runpy.run_path({script_path!r}, run_name='__main__'); "
+            "print(sorted(name for name in sys.modules if name.split('.')[0] in ('tkinter', '_tkinter', 'Bio')))")
+    result = subprocess.run([sys.executable, "-c", code], cwd=tmp_path, env=environment, capture_output=True,
+                            text=True, check=True, timeout=60)
+    assert result.stdout.splitlines()[-1] == "[]"
+    assert (tmp_path / "ITS_Structure.str").exists()
+
+def get_import_time_ms(module_name):
+    '''
+    Returns the cumulative time in milliseconds `python -X importtime` reports
+    for importing `module_name` in a fresh interpreter.
+    '''
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module_name}"], cwd=repo_root,
+                            capture_output=True, text=True, check=True)
+    for line in result.stderr.splitlines():
+        fields = [field.strip() for field in line.split("|")]
+        if len(fields) == 3 and fields[2] == module_name:
+            return int(fields[1]) / 1000
+    raise ValueError(f"no import time reported for {module_name}")
+
+def test_import_meets_startup_target():
+    # best of a few runs so a busy machine doesn't make it fail
+    overheads = [get_import_time_ms("improved_Fasta2Structure") - get_import_time_ms("numpy") for _ in range(3)]
+    assert min(overheads) < startup_target_ms
@@ -0,0 +1,39 @@
+#!/usr/bin/env python
+# `test_variable_sites_log.py`
+# Checks `log.log` gets a short summary of the variable sites by default, the
+# full lists with `--legacy-log`, & that `--sites-file` has the full lists.
+# Run this file like `pytest -v tests/test_variable_sites_log.py` 
+import pytest
+import sys
+import ast
+import gzip
+import subprocess
+
+from conftest import get_repo_root, get_script_path, get_all_three_example_paths
+repo_root = get_repo_root()
+script_path = get_script_path()
+all_three = get_all_three_example_paths()
+sys.path.insert(0, repo_root)
+from improved_Fasta2Structure import summarize_variable_sites
+
+
+
+def test_summarize_variable_sites():
+    assert summarize_variable_sites([3, 4, 5, 9, 12, 13]) == "6 sites, range 3-13, runs 3-5,9,12-13"
+    assert summarize_variable_sites([]) == "0 sites"
+    assert summarize_variable_sites([0, 2, 4, 6], max_runs=2) == "4 sites, range 0-6, runs 0,2 ... (2 more runs)"
+
+def get_logged_sites(log_path):
+    with open(log_path) as log_file:
+        return [line.split(": ", 1)[1] for line in log_file.read().splitlines() if "Variable sites for" in line]
+
+def test_summary_log_by_default_and_full_lists_in_sites_file(tmp_path):
+    subprocess.run([sys.executable, script_path, "--legacy-log", *all_three], cwd=tmp_path, check=True, capture_output=True)
+    full_lists = [ast.literal_eval(sites) for sites in get_logged_sites(tmp_path / "log.log")]
+    subprocess.run([sys.executable, script_path, "--sites-file", "sites.tsv.gz", *all_three], cwd=tmp_path, check=True,
+                   capture_output=True)
+    assert get_logged_sites(tmp_path / "log.log") == [summarize_variable_sites(sites) for sites in full_lists]
+    with gzip.open(tmp_path / "sites.tsv.gz", "rt") as sites_file:
+        rows = [line.rstrip("\n").split("\t") for line in sites_file]
+    assert [row[0] for row in rows] == all_three
+    assert [[int(site) for site in row[1].split()] for row in rows] == full_lists